@@ -24,6 +24,7 @@ class ConversationSerializer(serializers.ModelSerializer):
 
 class MessageInputSerializer(serializers.Serializer):
     content = serializers.CharField(required=True)
+    bypass_cache = serializers.BooleanField(required=False, default=False)
 
 
 class MessageFeedbackSerializer(serializers.ModelSerializer):
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     # Conversation endpoints
     path('send', views.send_message, name='send_message'),
+    path('send/async', views.send_message_async, name='send_message_async'),
+    path('send/stream', views.send_message_stream, name='send_message_stream'),
     path('conversations', views.get_recent_conversations, name='get_recent_conversations'),
     path('new', views.create_new_conversation, name='create_new_conversation'),
     path('conversation/<str:conversation_id>/messages', views.get_conversation_messages, name='get_conversation_messages'),
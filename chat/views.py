@@ -1,12 +1,55 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.shortcuts import get_object_or_404
 from .models import Conversation, Message
 from .serializers import MessageSerializer, MessageInputSerializer
-from documents.RAGService import RAGService
+from documents.services import get_rag_service
+
+
+def _start_exchange(request, content):
+    """Get or create the conversation and store the user's message"""
+    conversation_id = request.data.get('conversation_id')
+
+    # Get or create conversation
+    if conversation_id:
+        conversation = get_object_or_404(
+            Conversation,
+            id=conversation_id,
+            user=request.user
+        )
+    else:
+        # Create a new conversation if none specified
+        conversation = Conversation.objects.create(
+            user=request.user,
+            title=f"Conversation on {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+        )
+
+    # Create user message
+    Message.objects.create(
+        conversation=conversation,
+        role='user',
+        content=content
+    )
+
+    # Update conversation timestamp
+    conversation.updated_at = timezone.now()
+    conversation.save()
+
+    return conversation
+
+
+def _sse_event(event, data):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @api_view(['POST'])
@@ -17,37 +60,14 @@ def send_message(request):
 
     if serializer.is_valid():
         content = serializer.validated_data['content']
-        conversation_id = request.data.get('conversation_id')
-
-        # Get or create conversation
-        if conversation_id:
-            conversation = get_object_or_404(
-                Conversation,
-                id=conversation_id,
-                user=request.user
-            )
-        else:
-            # Create a new conversation if none specified
-            conversation = Conversation.objects.create(
-                user=request.user,
-                title=f"Conversation on {timezone.now().strftime('%Y-%m-%d %H:%M')}"
-            )
-
-        # Create user message
-        user_message = Message.objects.create(
-            conversation=conversation,
-            role='user',
-            content=content
-        )
-
-        # Update conversation timestamp
-        conversation.updated_at = timezone.now()
-        conversation.save()
+        conversation = _start_exchange(request, content)
 
-        # Initialize RAG service and generate response
-        rag_service = RAGService()
+        # Generate response with the worker's shared RAG service
+        rag_service = get_rag_service()
         response_text = rag_service.generate_response(
-            query=content
+            query=content,
+            scope=request.user.id,
+            use_cache=not serializer.validated_data['bypass_cache']
         )
 
         # Create assistant message
@@ -68,6 +88,145 @@ def send_message(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def send_message_stream(request):
+    """Send a message and stream the response as server-sent events
+
+    Events: ``sources`` (retrieved documents), ``token`` (response text as it is
+    generated, or a cached answer in one event), ``error`` (generation failed)
+    and finally ``done`` with the id of the persisted assistant message.
+    """
+    serializer = MessageInputSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    content = serializer.validated_data['content']
+    conversation = _start_exchange(request, content)
+    rag_service = get_rag_service()
+
+    def event_stream():
+        parts = []
+        finished = False
+        try:
+            events = rag_service.stream_response(
+                query=content,
+                scope=request.user.id,
+                use_cache=not serializer.validated_data['bypass_cache']
+            )
+            for event, data in events:
+                if event == 'sources':
+                    yield _sse_event('sources', {'conversation_id': conversation.id, 'sources': data})
+                elif event == 'token':
+                    parts.append(data)
+                    yield _sse_event('token', {'content': data})
+                elif event == 'error':
+                    parts = [data]
+                    yield _sse_event('error', {'content': data})
+            finished = True
+        finally:
+            # Persist whatever was generated, even if the client went away mid-stream
+            assistant_message = None
+            if parts:
+                assistant_message = Message.objects.create(
+                    conversation=conversation,
+                    role='assistant',
+                    content=''.join(parts)
+                )
+        if finished:
+            yield _sse_event('done', {
+                'id': assistant_message.id if assistant_message else None,
+                'timestamp': assistant_message.created_at.isoformat() if assistant_message else None,
+                'conversation_id': conversation.id
+            })
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def send_message_async(request):
+    """Async (ASGI) variant of ``send_message``
+
+    DRF function views are sync-only, so this is a plain Django async view that
+    authenticates with the same JWT backend. Storing the user message, touching
+    the conversation and answering (answer cache, retrieval, LLM call) run
+    concurrently, and the LLM call uses the async Groq client so a worker can
+    hold many in-flight requests.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if auth is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    user = auth[0]
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid JSON body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = MessageInputSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    content = serializer.validated_data['content']
+    conversation_id = data.get('conversation_id')
+
+    # Get or create conversation
+    if conversation_id:
+        try:
+            conversation = await Conversation.objects.aget(id=conversation_id, user=user)
+        except (Conversation.DoesNotExist, ValueError):
+            raise Http404('No Conversation matches the given query.')
+    else:
+        conversation = await Conversation.objects.acreate(
+            user=user,
+            title=f"Conversation on {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+        )
+
+    # Store the user message, touch the conversation and answer concurrently
+    rag_service = get_rag_service()
+    conversation.updated_at = timezone.now()
+    _, _, response_text = await asyncio.gather(
+        Message.objects.acreate(conversation=conversation, role='user', content=content),
+        conversation.asave(update_fields=['updated_at']),
+        rag_service.agenerate_response(
+            query=content,
+            scope=user.id,
+            use_cache=not serializer.validated_data['bypass_cache']
+        )
+    )
+
+    # Create assistant message
+    assistant_message = await Message.objects.acreate(
+        conversation=conversation,
+        role='assistant',
+        content=response_text
+    )
+
+    return JsonResponse({
+        'id': assistant_message.id,
+        'content': assistant_message.content,
+        'timestamp': assistant_message.created_at.isoformat(),
+        'conversation_id': conversation.id
+    })
+
+
+# Django 4.2's csrf_exempt/require_POST wrappers are not async-aware, so mark it directly
+send_message_async.csrf_exempt = True
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_conversation_messages(request, conversation_id):
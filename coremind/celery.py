@@ -0,0 +1,11 @@
+# coremind/celery.py
+import os
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'coremind.settings')
+
+app = Celery('coremind')
+
+# All CELERY_* settings in coremind/settings.py configure the app
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
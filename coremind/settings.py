@@ -116,6 +116,43 @@ OPENAI_API_KEY = config('OPENAI_API_KEY'),
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# Celery (document ingestion queue)
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True  # a task lost with its worker is redelivered
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# Redis redelivers unacked tasks after the visibility timeout, even while they still run, so it
+# must outlast the longest ingestion. Lost workers are recovered sooner by the dispatcher's
+# stale check (INGESTION_STALE_SECONDS).
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': config('CELERY_VISIBILITY_TIMEOUT', default=86400, cast=int),
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # long tasks: don't let one worker hoard the queue
+CELERY_WORKER_CONCURRENCY = config('CELERY_WORKER_CONCURRENCY', default=4, cast=int)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-ingestion': {
+        'task': 'documents.tasks.dispatch_ingestion',
+        'schedule': config('INGESTION_DISPATCH_INTERVAL', default=30.0, cast=float),
+    },
+    'expire-upload-sessions': {
+        'task': 'documents.tasks.expire_upload_sessions',
+        'schedule': 3600.0,
+    },
+    'flush-vector-deletions': {
+        'task': 'documents.tasks.flush_vector_deletions',
+        'schedule': config('VECTOR_GC_INTERVAL', default=60.0, cast=float),
+    },
+    'reconcile-vectors': {
+        'task': 'documents.tasks.reconcile_vectors',
+        'schedule': config('VECTOR_RECONCILE_INTERVAL', default=86400.0, cast=float),
+    },
+    'compact-ann-indexes': {
+        'task': 'documents.tasks.compact_ann_indexes',
+        'schedule': config('ANN_COMPACT_INTERVAL', default=600.0, cast=float),
+    },
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
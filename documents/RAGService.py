@@ -1,102 +1,400 @@
 import logging
-from typing import List, Dict, Any
-from groq import Groq
+from typing import List, Dict, Any, Iterator, Tuple
+from asgiref.sync import sync_to_async
+from groq import Groq, AsyncGroq
 from .pinecone_vector_store import PineconeVectorStore
+from .lexical_index import tokenize, is_identifier
+from .context_builder import ContextBuilder
 from decouple import config
 
 logger = logging.getLogger(__name__)
 
 
 class RAGService:
-    def __init__(self):
-        """Initialize the RAG service with vector store and LLM client"""
-        self.vector_store = PineconeVectorStore()
-        self.groq_client = Groq(api_key=config('GROQ_API_KEY'))
+    def __init__(self, vector_store=None, groq_client=None, async_groq_client=None, answer_cache=None,
+                 lexical_index=None):
+        """Initialize the RAG service with vector store and LLM client
+
+        Request handlers should not build this directly; use
+        ``documents.services.get_rag_service()`` so clients are shared per worker.
+        """
+        self.vector_store = vector_store or PineconeVectorStore()
+        self.groq_client = groq_client or Groq(api_key=config('GROQ_API_KEY'))
+        self.async_groq_client = async_groq_client or AsyncGroq(api_key=config('GROQ_API_KEY'))
+        self.answer_cache = answer_cache
+        self.lexical_index = lexical_index
         self.model = config('GROQ_MODEL', default="llama3-70b-8192")  # Default model
-        self.max_tokens = 4096
+        self.context_window = config('GROQ_CONTEXT_WINDOW', default=8192, cast=int)
+        self.max_tokens = config('GROQ_MAX_TOKENS', default=4096, cast=int)
+        # Upper bound for retrieved context; the window left after the answer also caps it
+        self.context_token_budget = config('CONTEXT_TOKEN_BUDGET', default=3000, cast=int)
+        self.context_builder = ContextBuilder()
         self.temperature = 0.3
         self.top_k = 5  # Number of chunks to retrieve
         self.similarity_threshold = 0.7
+        self.rrf_k = 60  # Reciprocal rank fusion constant
+
+    def _lexical_chunks(self, query: str) -> List[Dict[str, Any]]:
+        """BM25 matches hydrated with chunk text and metadata, best first."""
+        from .models import DocumentChunk
+        matches = self.lexical_index.search(query, top_k=self.top_k)
+        if not matches:
+            return []
+
+        rows = DocumentChunk.objects.filter(id__in=[chunk_id for chunk_id, _ in matches]).values(
+            'id', 'content', 'metadata'
+        )
+        by_id = {row['id']: row for row in rows}
+        return [
+            {
+                "chunk_id": chunk_id,
+                "similarity": None,
+                "lexical_score": score,
+                "metadata": by_id[chunk_id]['metadata'] or {},
+                "content": by_id[chunk_id]['content'],
+            }
+            for chunk_id, score in matches
+            if chunk_id in by_id
+        ]
+
+    def _is_exact_match(self, query: str, lexical_chunks: List[Dict[str, Any]]) -> bool:
+        """True when the query names identifiers (codes, part numbers) that the best lexical hit contains."""
+        identifiers = {token for token in tokenize(query) if is_identifier(token)}
+        if not identifiers or not lexical_chunks:
+            return False
+        return identifiers.issubset(tokenize(lexical_chunks[0]["content"]))
+
+    def _fuse(self, *rankings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: score = sum of 1 / (k + rank) over the rankings a chunk appears in."""
+        fused = {}
+        for ranking in rankings:
+            for rank, chunk in enumerate(ranking):
+                entry = fused.setdefault(chunk["chunk_id"], dict(chunk, score=0.0))
+                entry["score"] += 1.0 / (self.rrf_k + rank + 1)
+                if chunk.get("similarity") is not None:
+                    entry["similarity"] = chunk["similarity"]
+        results = sorted(fused.values(), key=lambda x: x["score"], reverse=True)
+        return results[:self.top_k]
+
+    def _vector_chunks(self, query_embedding) -> List[Dict[str, Any]]:
+        """Vector search hits above ``similarity_threshold``, best first."""
+        results = self.vector_store.search(
+            query_embedding=query_embedding,
+            top_k=self.top_k
+        )
+
+        filtered_results = [
+            {
+                "chunk_id": chunk_id,
+                "similarity": similarity,
+                "metadata": metadata,
+                "content": metadata.get("text", "")  # Extract text content
+            }
+            for chunk_id, similarity, metadata in results
+            if similarity >= self.similarity_threshold
+        ]
 
-    def retrieve_relevant_chunks(self, query: str) -> List[Dict[str, Any]]:
-        """Retrieve relevant chunks from the vector store."""
+        # Sort by similarity score (highest first)
+        filtered_results.sort(key=lambda x: x["similarity"], reverse=True)
+        return filtered_results
+
+    def _merge(self, vector_results, lexical_results) -> List[Dict[str, Any]]:
+        if lexical_results:
+            return self._fuse(vector_results, lexical_results)
+        return vector_results
+
+    def retrieve_relevant_chunks(self, query: str, query_embedding=None) -> List[Dict[str, Any]]:
+        """Retrieve relevant chunks, fusing BM25 and vector results when lexical search is enabled."""
+        lexical_results = []
         try:
-            # Generate query embedding
-            query_embedding = self.vector_store.generate_embedding(query)
-            results = self.vector_store.search(
-                query_embedding=query_embedding,
-                top_k=self.top_k
-            )
+            if self.lexical_index is not None:
+                lexical_results = self._lexical_chunks(query)
+                # Exact identifier lookups are answered locally, skipping the remote vector search
+                if self._is_exact_match(query, lexical_results):
+                    return lexical_results
 
-            filtered_results = [
-                {
-                    "chunk_id": chunk_id,
-                    "similarity": similarity,
-                    "metadata": metadata,
-                    "content": metadata.get("text", "")  # Extract text content
-                }
-                for chunk_id, similarity, metadata in results
-                if similarity >= self.similarity_threshold
-            ]
-
-            # Sort by similarity score (highest first)
-            filtered_results.sort(key=lambda x: x["similarity"], reverse=True)
-
-            return filtered_results
+            # Generate query embedding
+            if query_embedding is None:
+                query_embedding = self.vector_store.generate_embedding(query)
+            return self._merge(self._vector_chunks(query_embedding), lexical_results)
         except Exception as e:
             logger.error(f"Error retrieving relevant chunks: {e}")
-            return []
+            # The local lexical results are still useful when the vector search is down
+            return lexical_results
 
-    def format_context(self, chunks: List[Dict[str, Any]]) -> str:
-        """Format retrieved chunks into a readable context for the model."""
+    def format_context(self, chunks: List[Dict[str, Any]], token_budget: int = None) -> str:
+        """Format retrieved chunks into a readable context for the model, within ``token_budget`` tokens."""
         if not chunks:
             return ""  # No relevant information found
 
-        context = ""
-        for i, chunk in enumerate(chunks):
-            doc_id = chunk["metadata"].get("document_id", "Unknown")
-            title = chunk["metadata"].get("title", "Untitled")
+        segments, _ = self.context_builder.pack(chunks, token_budget or self.context_token_budget)
 
-            context += f"--- DOCUMENT {i + 1}: {title} (ID: {doc_id}) ---\n"
-            context += chunk["content"] + "\n\n"
+        context = ""
+        for segment in segments:
+            context += segment["header"]
+            context += segment["content"] + "\n\n"
 
         return context
 
-    def generate_response(self, query: str) -> str:
-        """Generate a response using RAG when context is available, else use open-ended generation."""
-        try:
-            # Step 1: Retrieve relevant document chunks
-            chunks = self.retrieve_relevant_chunks(query)
+    def build_messages(self, query: str, chunks: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Build the chat messages for the LLM, with retrieved context when available."""
+        messages = []
+        system_message = "You are an AI assistant capable of answering general and document-based queries."
+        messages.append({"role": "system", "content": system_message})
+
+        context = ""
+        if chunks:
+            # Leave room in the model window for the answer and the rest of the prompt
+            counter = self.context_builder.token_counter
+            overhead = counter.count(system_message) + counter.count(query) + 64
+            token_budget = min(self.context_token_budget, self.context_window - self.max_tokens - overhead)
+
+            # Format chunks into context
+            context = self.format_context(chunks, token_budget=max(token_budget, 0))
+
+        if context:
+            # If relevant information is found, use it
+            user_message = f"""Use the following retrieved information to answer the question:\n\n
+            {context}\n
+            Question: {query}
+            """
+        else:
+            # If no context is found, allow open-ended generation
+            user_message = f"Answer the following question based on your general knowledge: {query}"
+
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def completion_max_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Answer length capped so prompt plus answer stay inside the model window."""
+        counter = self.context_builder.token_counter
+        prompt_tokens = sum(counter.count(message["content"]) + 4 for message in messages)
+        return max(min(self.max_tokens, self.context_window - prompt_tokens), 256)
+
+    def format_sources(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Summarize retrieved chunks for clients (no chunk text)."""
+        return [
+            {
+                "chunk_id": chunk["chunk_id"],
+                "document_id": chunk["metadata"].get("document_id"),
+                "title": chunk["metadata"].get("title", "Untitled"),
+                "similarity": chunk["similarity"],
+            }
+            for chunk in chunks
+        ]
 
-            # Step 2: Format chunks into context
-            context = self.format_context(chunks)
+    def _document_versions(self, document_ids) -> Dict[str, str]:
+        """Current version (last processing time) of each document, keyed by id"""
+        from .models import Document
+        ids = [int(doc_id) for doc_id in document_ids if str(doc_id).isdigit()]
+        return {
+            str(doc_id): updated_at.isoformat()
+            for doc_id, updated_at in Document.objects.filter(id__in=ids).values_list('id', 'updated_at')
+        }
 
-            # Step 3: Construct messages dynamically
-            messages = []
-            system_message = "You are an AI assistant capable of answering general and document-based queries."
-            messages.append({"role": "system", "content": system_message})
+    def _documents_version(self) -> str:
+        """Version of the whole document set; changes when any document is added, reprocessed or deleted"""
+        from django.db.models import Count, Max
+        from .models import Document
+        stats = Document.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+        latest = stats['latest'].isoformat() if stats['latest'] else ''
+        return f"{stats['count']}:{latest}"
 
-            if chunks:
-                # If relevant information is found, use it
-                user_message = f"""Use the following retrieved information to answer the question:\n\n
-                {context}\n
-                Question: {query}
-                """
-            else:
-                # If no context is found, allow open-ended generation
-                user_message = f"Answer the following question based on your general knowledge: {query}"
+    def _cached_answer(self, scope, query_embedding):
+        """Return a cached answer if a near-identical query used documents that are still current."""
+        entry = self.answer_cache.lookup(scope, query_embedding)
+        if entry is None:
+            return None
+        versions = entry["document_versions"]
+        # Answers that used no documents are checked against the whole set, since
+        # ingestion in another process (e.g. a Celery worker) may now answer them
+        if versions:
+            stale = self._document_versions(versions.keys()) != versions
+        else:
+            stale = self._documents_version() != entry["documents_version"]
+        if stale:
+            self.answer_cache.discard(entry)
+            return None
+        self.answer_cache.record_hit()
+        return entry["answer"]
 
-            messages.append({"role": "user", "content": user_message})
+    def _store_answer(self, scope, query_embedding, answer, chunks, documents_version):
+        """Cache ``answer``; ``documents_version`` must be taken before retrieval"""
+        document_ids = {chunk["metadata"].get("document_id") for chunk in chunks}
+        versions = self._document_versions(document_ids)
+        self.answer_cache.store(scope, query_embedding, answer, versions, None if versions else documents_version)
+
+    def generate_response(self, query: str, scope=None, use_cache: bool = True) -> str:
+        """Generate a response using RAG when context is available, else use open-ended generation.
+
+        ``scope`` (e.g. ``(user_id, agent_id)``) partitions the semantic answer
+        cache; pass ``use_cache=False`` to bypass it.
+        """
+        try:
+            use_cache = use_cache and self.answer_cache is not None
+            query_embedding = None
+
+            # Step 1: Answer near-duplicate questions from the semantic cache
+            if use_cache:
+                try:
+                    query_embedding = self.vector_store.generate_embedding(query)
+                except Exception as e:
+                    # Retrieval falls back on its own; answer without the cache
+                    logger.error(f"Error embedding query for the answer cache: {e}")
+                    use_cache = False
+            if use_cache:
+                cached = self._cached_answer(scope, query_embedding)
+                if cached is not None:
+                    return cached
+                documents_version = self._documents_version()
+
+            # Step 2: Retrieve relevant document chunks
+            chunks = self.retrieve_relevant_chunks(query, query_embedding=query_embedding)
+
+            # Step 3: Build messages with the formatted context
+            messages = self.build_messages(query, chunks)
 
             # Step 4: Generate response using Groq API
             response = self.groq_client.chat.completions.create(
                 messages=messages,
                 model=self.model,
                 temperature=self.temperature,
-                max_tokens=self.max_tokens
+                max_tokens=self.completion_max_tokens(messages)
+            )
+            answer = response.choices[0].message.content
+
+            if use_cache:
+                self._store_answer(scope, query_embedding, answer, chunks, documents_version)
+            return answer
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return f"I'm sorry, I encountered an error while processing your request. Technical details: {str(e)}"
+
+    def stream_response(self, query: str, scope=None, use_cache: bool = True) -> Iterator[Tuple[str, Any]]:
+        """Stream a response as ``(event, data)`` pairs.
+
+        Yields a single ``("sources", [...])`` event once retrieval is done, then
+        ``("token", text)`` events as Groq produces them. On failure an
+        ``("error", message)`` event is yielded instead of raising. Goes through
+        the semantic answer cache like ``generate_response``: a cached answer
+        is sent as one ``token`` event after empty sources, and a completed
+        stream is cached.
+        """
+        use_cache = use_cache and self.answer_cache is not None
+        query_embedding = None
+        if use_cache:
+            try:
+                query_embedding = self.vector_store.generate_embedding(query)
+                cached = self._cached_answer(scope, query_embedding)
+                if cached is not None:
+                    yield "sources", []
+                    yield "token", cached
+                    return
+                documents_version = self._documents_version()
+            except Exception as e:
+                logger.error(f"Error consulting the answer cache: {e}")
+                use_cache = False
+
+        chunks = self.retrieve_relevant_chunks(query, query_embedding=query_embedding)
+        yield "sources", self.format_sources(chunks)
+
+        try:
+            messages = self.build_messages(query, chunks)
+            stream = self.groq_client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.completion_max_tokens(messages),
+                stream=True
             )
-            return response.choices[0].message.content
+            parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    parts.append(token)
+                    yield "token", token
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            yield "error", f"I'm sorry, I encountered an error while processing your request. Technical details: {str(e)}"
+            return
+
+        if use_cache and parts:
+            try:
+                self._store_answer(scope, query_embedding, "".join(parts), chunks, documents_version)
+            except Exception as e:
+                logger.error(f"Error caching streamed answer: {e}")
+
+    async def aretrieve_relevant_chunks(self, query: str, query_embedding=None) -> List[Dict[str, Any]]:
+        """Async variant of ``retrieve_relevant_chunks``.
+
+        The pinned Pinecone SDK has no asyncio client, so the embed and query
+        calls run on worker threads without blocking the event loop. ORM reads
+        (lexical hydration, and searches of stores backed by the database) stay
+        on the request's sync thread, whose connection Django closes.
+        """
+        lexical_results = []
+        try:
+            if self.lexical_index is not None:
+                lexical_results = await sync_to_async(self._lexical_chunks)(query)
+                if self._is_exact_match(query, lexical_results):
+                    return lexical_results
+
+            if query_embedding is None:
+                query_embedding = await sync_to_async(
+                    self.vector_store.generate_embedding, thread_sensitive=False
+                )(query)
+            reads_database = getattr(self.vector_store, 'reads_database', False)
+            vector_results = await sync_to_async(self._vector_chunks, thread_sensitive=reads_database)(query_embedding)
+            return self._merge(vector_results, lexical_results)
+        except Exception as e:
+            logger.error(f"Error retrieving relevant chunks: {e}")
+            return lexical_results
+
+    async def agenerate_response(self, query: str, scope=None, use_cache: bool = True,
+                                 chunks: List[Dict[str, Any]] = None) -> str:
+        """Async variant of ``generate_response`` using the async Groq client.
+
+        Goes through the same semantic answer cache (``scope``, ``use_cache``).
+        Pass ``chunks`` when retrieval was already done; the cache is then skipped.
+        """
+        try:
+            use_cache = use_cache and self.answer_cache is not None and chunks is None
+            query_embedding = None
+
+            if use_cache:
+                try:
+                    query_embedding = await sync_to_async(
+                        self.vector_store.generate_embedding, thread_sensitive=False
+                    )(query)
+                except Exception as e:
+                    logger.error(f"Error embedding query for the answer cache: {e}")
+                    use_cache = False
+            if use_cache:
+                # Checks document versions with the ORM: stays on the sync thread
+                cached = await sync_to_async(self._cached_answer)(scope, query_embedding)
+                if cached is not None:
+                    return cached
+                documents_version = await sync_to_async(self._documents_version)()
+
+            if chunks is None:
+                chunks = await self.aretrieve_relevant_chunks(query, query_embedding=query_embedding)
+
+            messages = self.build_messages(query, chunks)
+            response = await self.async_groq_client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.completion_max_tokens(messages)
+            )
+            answer = response.choices[0].message.content
+
+            if use_cache:
+                await sync_to_async(self._store_answer)(scope, query_embedding, answer, chunks, documents_version)
+            return answer
 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return f"I'm sorry, I encountered an error while processing your request. Technical details: {str(e)}"
\ No newline at end of file
+            return f"I'm sorry, I encountered an error while processing your request. Technical details: {str(e)}"
@@ -1,12 +1,14 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from django import forms
 from django.contrib import messages
+from django.db.models import BooleanField, ExpressionWrapper, Q
 import traceback
 import logging
-from .models import Document, DocumentChunk
-from .document_processor import process_document
-import threading
+from .models import Document, DocumentChunk, IngestionFailure, UploadSession
+from .artifacts import file_sha256
+from .ingestion_queue import enqueue_documents
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +21,7 @@ class DocumentAdminForm(forms.ModelForm):
 
 class DocumentChunkInline(admin.TabularInline):
     model = DocumentChunk
-    readonly_fields = ['chunk_index', 'content', 'metadata']
+    readonly_fields = ['chunk_index', 'content', 'content_hash', 'indexed_namespaces', 'metadata']
     extra = 0
     can_delete = False
     max_num = 0
@@ -33,7 +35,8 @@ class DocumentAdmin(admin.ModelAdmin):
     list_display = ['title', 'file_type', 'user', 'status_badge', 'total_chunks', 'created_at']  # Removed 'agent'
     list_filter = ['status', 'file_type', 'created_at', 'user']  # Removed 'agent'
     search_fields = ['title', 'user__email']  # Removed 'agent__name'
-    readonly_fields = ['file_type', 'status', 'total_chunks', 'created_at', 'updated_at']
+    readonly_fields = ['file_type', 'content_hash', 'status', 'total_chunks', 'ingestion_attempts', 'queued_at', 'started_at',
+                       'created_at', 'updated_at']
     form = DocumentAdminForm
     inlines = [DocumentChunkInline]
     actions = ['process_documents_now', 'process_documents_debug']
@@ -42,6 +45,7 @@ class DocumentAdmin(admin.ModelAdmin):
         """Display status as a colored badge"""
         colors = {
             'pending': '#FFA500',  # Orange
+            'queued': '#9370DB',  # Purple
             'processing': '#1E90FF',  # Blue
             'completed': '#32CD32',  # Green
             'failed': '#FF0000'  # Red
@@ -55,7 +59,7 @@ class DocumentAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
 
     def save_model(self, request, obj, form, change):
-        """Extract file type on save"""
+        """Extract file type and content hash on save"""
         if not change:  # Only for new documents
             # Extract file type from the file extension
             file = obj.file
@@ -64,46 +68,29 @@ class DocumentAdmin(admin.ModelAdmin):
                 file_extension = filename.split('.')[-1].lower()
                 obj.file_type = file_extension
 
+        if obj.file and (not change or 'file' in form.changed_data):
+            # Hashed once here; identical files then share one parsed artifact
+            obj.content_hash = file_sha256(obj.file)
+
         super().save_model(request, obj, form, change)
         self.message_user(
             request,
-            f"Document '{obj.title}' saved. Use the 'Process documents now' action to start processing.",
+            f"Document '{obj.title}' saved. Use the 'Queue selected documents for processing' action to start processing.",
             level=messages.INFO
         )
 
     def process_documents_now(self, request, queryset):
-        """Process selected documents synchronously with detailed error handling"""
-        for document in queryset:
-            try:
-                self.message_user(request, f"Starting processing for document: {document.title}")
-
-                # Update status to processing manually to confirm status changes work
-                document.status = 'processing'
-                document.save(update_fields=['status'])
-
-                # Process the document
-                result = process_document(document.id)
-
-                # Get the updated document to check status
-                updated_doc = Document.objects.get(id=document.id)
-                self.message_user(
-                    request,
-                    f"Document '{document.title}' processing complete. Status: {updated_doc.status}. Result: {result}",
-                    level=messages.SUCCESS if updated_doc.status == 'completed' else messages.ERROR
-                )
-            except Exception as e:
-                error_msg = traceback.format_exc()
-                logger.error(f"Error processing document {document.id}: {error_msg}")
-                self.message_user(
-                    request,
-                    f"Error processing document '{document.title}': {str(e)}. Check server logs for details.",
-                    level=messages.ERROR
-                )
-                # Ensure status is updated to failed
-                document.status = 'failed'
-                document.save(update_fields=['status'])
+        """Queue selected documents for background processing"""
+        queued = enqueue_documents(list(queryset.values_list('id', flat=True)))
+        skipped = queryset.count() - queued
+        self.message_user(
+            request,
+            f"Queued {queued} document(s) for processing."
+            + (f" {skipped} already queued or processing were skipped." if skipped else ""),
+            level=messages.SUCCESS if queued else messages.WARNING
+        )
 
-    process_documents_now.short_description = "Process documents now (with detailed feedback)"
+    process_documents_now.short_description = "Queue selected documents for processing"
 
     def process_documents_debug(self, request, queryset):
         """Debug version that only updates status to verify status changes work"""
@@ -111,7 +98,8 @@ class DocumentAdmin(admin.ModelAdmin):
             try:
                 # Just update status to verify status changes work
                 document.status = 'processing'
-                document.save(update_fields=['status'])
+                document.started_at = timezone.now()
+                document.save(update_fields=['status', 'started_at'])
 
                 self.message_user(
                     request,
@@ -145,13 +133,68 @@ class DocumentChunkAdmin(admin.ModelAdmin):
     list_display = ['id', 'document', 'chunk_index', 'has_embedding']
     list_filter = ['document']
     search_fields = ['document__title', 'content']
-    readonly_fields = ['document', 'chunk_index', 'content', 'metadata', 'embedding']
+    readonly_fields = ['document', 'chunk_index', 'content', 'metadata', 'embedding_summary']
+
+    def get_queryset(self, request):
+        # Vectors stay deferred; the list only needs to know whether one is stored
+        return super().get_queryset(request).annotate(
+            embedding_stored=ExpressionWrapper(Q(embedding__isnull=False), output_field=BooleanField())
+        )
 
     def has_embedding(self, obj):
-        return obj.embedding is not None
+        return obj.embedding_stored
 
     has_embedding.boolean = True
     has_embedding.short_description = 'Has Embedding'
+    has_embedding.admin_order_field = 'embedding_stored'
+
+    def embedding_summary(self, obj):
+        if not obj.embedding_stored:
+            return "-"
+        embedding = obj.embedding
+        return f"{embedding.size} dimensions, norm {float((embedding @ embedding) ** 0.5):.4f}"
+
+    embedding_summary.short_description = 'Embedding'
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(IngestionFailure)
+class IngestionFailureAdmin(admin.ModelAdmin):
+    list_display = ['document', 'attempts', 'error', 'resolved', 'created_at']
+    list_filter = ['resolved', 'created_at']
+    search_fields = ['document__title', 'error']
+    readonly_fields = ['document', 'task_id', 'attempts', 'error', 'traceback', 'created_at']
+    actions = ['requeue_documents']
+
+    def requeue_documents(self, request, queryset):
+        """Put the failed documents back on the ingestion queue"""
+        document_ids = set(queryset.values_list('document_id', flat=True))
+        # enqueue_documents skips these; their failures stay unresolved
+        in_flight = set(Document.objects.filter(
+            id__in=document_ids, status__in=['queued', 'processing']
+        ).values_list('id', flat=True))
+        queued = enqueue_documents(list(document_ids - in_flight))
+        queryset.exclude(document_id__in=in_flight).update(resolved=True)
+        message = f"Requeued {queued} document(s)."
+        if in_flight:
+            message += f" {len(in_flight)} already queued or processing were left unresolved."
+        self.message_user(request, message, level=messages.SUCCESS)
+
+    requeue_documents.short_description = "Requeue failed documents"
 
     def has_add_permission(self, request):
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'user', 'status', 'offset', 'size', 'document', 'updated_at']
+    list_filter = ['status', 'file_type', 'created_at']
+    search_fields = ['filename', 'title', 'user__email']
+    readonly_fields = ['id', 'user', 'title', 'filename', 'file_type', 'size', 'offset', 'checksum', 'status',
+                       'document', 'created_at', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,457 @@
+# documents/ann_index.py
+"""Approximate nearest neighbour (IVF) index persisted to memory-mapped files.
+
+Layout of one namespace directory::
+
+    <ANN_INDEX_ROOT>/<namespace>/
+        CURRENT                 name of the live generation, swapped atomically
+        .lock                   flock() taken by writers
+        gen-000001/
+            centroids.npy       (nlist, dim) float32 unit vectors
+            vectors.npy         (n, dim) float32 unit vectors, grouped by list
+            ids.npy             (n,) int64 chunk ids, same order as vectors
+            offsets.npy         (nlist + 1,) int64 start of each list in vectors
+            meta.json
+            delta.vec           appended float32 rows inserted after the build
+            delta.ids           appended int64 ids for delta.vec
+            tombstones.ids      appended int64 (id, delta_length) pairs
+
+The base arrays are immutable and opened with ``mmap_mode='r'``, so every
+gunicorn worker on a host shares one copy of the pages through the OS page
+cache. Inserts and deletes only append to the small delta/tombstone logs, which
+readers tail incrementally; ``compact()`` folds them into a new generation.
+A rebuild from the database marks the logs first (``log_position()``) and
+replays everything appended after the mark into the generation it writes, so
+writes that land while it runs are not lost.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+
+
+def _normalize(vectors):
+    """L2-normalize rows so a dot product is a cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def train_centroids(vectors, nlist, iterations=10, sample_size=None, seed=0):
+    """Spherical k-means on a sample of ``vectors``; returns (nlist, dim) unit centroids"""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample_size = sample_size or min(n, max(nlist * 64, 10000))
+    sample = vectors[rng.choice(n, size=min(sample_size, n), replace=False)]
+    centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = np.bincount(assignments, minlength=nlist) == 0
+        # Re-seed empty lists from random sample points
+        sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def assign_lists(vectors, centroids, batch_size=8192):
+    """Index of the closest centroid for each row, computed in bounded-memory batches"""
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], batch_size):
+        scores = vectors[start:start + batch_size] @ centroids.T
+        assignments[start:start + batch_size] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def _count_items(path, itemsize):
+    try:
+        return os.path.getsize(path) // itemsize
+    except FileNotFoundError:
+        return 0
+
+
+def _read_tail(path, dtype, start_items, width=1):
+    """Read items appended to ``path`` after the first ``start_items`` complete records"""
+    itemsize = np.dtype(dtype).itemsize * width
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return np.empty((0, width) if width > 1 else 0, dtype=dtype)
+    total = size // itemsize
+    if total <= start_items:
+        return np.empty((0, width) if width > 1 else 0, dtype=dtype)
+    data = np.fromfile(path, dtype=dtype, count=(total - start_items) * width, offset=start_items * itemsize)
+    return data.reshape(-1, width) if width > 1 else data
+
+
+class IVFIndex:
+    """Reader/writer for one namespace directory (see module docstring)."""
+
+    def __init__(self, path, dimension, refresh_seconds=1.0):
+        self.path = path
+        self.dimension = dimension
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._checked_at = 0.0
+        self._generation = None
+        self._reset_state()
+
+    def _reset_state(self):
+        self.centroids = np.empty((0, self.dimension), dtype=np.float32)
+        self.vectors = np.empty((0, self.dimension), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.delta_vectors = np.empty((0, self.dimension), dtype=np.float32)
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.tombstones = np.empty((0, 2), dtype=np.int64)
+
+    # -- files -------------------------------------------------------------
+
+    def _generation_path(self, generation=None):
+        return os.path.join(self.path, generation or self._generation)
+
+    def _read_current(self):
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def exists(self):
+        return self._read_current() is not None
+
+    # -- reading -----------------------------------------------------------
+
+    def refresh(self, force=False):
+        """Pick up a new generation and any appended deltas/tombstones"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            self._checked_at = now
+            generation = self._read_current()
+            if generation is None:
+                self._generation = None
+                self._reset_state()
+                return
+
+            if generation != self._generation:
+                gen_path = self._generation_path(generation)
+                self._reset_state()
+                self.centroids = np.load(os.path.join(gen_path, "centroids.npy"), mmap_mode="r")
+                self.vectors = np.load(os.path.join(gen_path, "vectors.npy"), mmap_mode="r")
+                self.ids = np.load(os.path.join(gen_path, "ids.npy"), mmap_mode="r")
+                self.offsets = np.load(os.path.join(gen_path, "offsets.npy"))
+                self._generation = generation
+
+            gen_path = self._generation_path()
+            # ids are appended after their vectors, so they bound how many rows are complete
+            new_ids = _read_tail(os.path.join(gen_path, "delta.ids"), np.int64, len(self.delta_ids))
+            if len(new_ids):
+                new_vectors = _read_tail(
+                    os.path.join(gen_path, "delta.vec"), np.float32, len(self.delta_ids), self.dimension
+                )[:len(new_ids)]
+                self.delta_ids = np.concatenate([self.delta_ids, new_ids[:len(new_vectors)]])
+                self.delta_vectors = np.concatenate([self.delta_vectors, new_vectors])
+            new_tombstones = _read_tail(os.path.join(gen_path, "tombstones.ids"), np.int64, len(self.tombstones), 2)
+            if len(new_tombstones):
+                self.tombstones = np.concatenate([self.tombstones, new_tombstones])
+
+    def _live_delta_mask(self):
+        """Which delta rows are current: latest write per id and not deleted afterwards"""
+        count = len(self.delta_ids)
+        if count == 0:
+            return np.zeros(0, dtype=bool)
+        # Keep only the last occurrence of each id
+        _, last_from_end = np.unique(self.delta_ids[::-1], return_index=True)
+        mask = np.zeros(count, dtype=bool)
+        mask[count - 1 - last_from_end] = True
+        if len(self.tombstones):
+            # A tombstone hides delta rows written before it (position < delta_length)
+            tombstoned, inverse = np.unique(self.tombstones[:, 0], return_inverse=True)
+            deleted_before = np.zeros(len(tombstoned), dtype=np.int64)
+            np.maximum.at(deleted_before, inverse, self.tombstones[:, 1])
+            slot = np.minimum(np.searchsorted(tombstoned, self.delta_ids), len(tombstoned) - 1)
+            deleted = (tombstoned[slot] == self.delta_ids) & (np.arange(count) < deleted_before[slot])
+            mask &= ~deleted
+        return mask
+
+    def _hidden_base_ids(self):
+        """Base ids that were deleted or superseded by a delta write"""
+        hidden = self.tombstones[:, 0] if len(self.tombstones) else np.empty(0, dtype=np.int64)
+        return np.union1d(hidden, self.delta_ids)
+
+    def search(self, query_vector, top_k, nprobe):
+        """Return ``[(chunk_id, similarity)]`` for the best ``top_k`` matches"""
+        self.refresh()
+        with self._lock:
+            query_vector = _normalize(query_vector)
+            candidate_ids, candidate_scores = [], []
+
+            nlist = self.centroids.shape[0]
+            if nlist and len(self.ids):
+                probe = min(nprobe, nlist)
+                centroid_scores = self.centroids @ query_vector
+                lists = np.argpartition(-centroid_scores, probe - 1)[:probe]
+                for list_id in lists:
+                    start, end = self.offsets[list_id], self.offsets[list_id + 1]
+                    if start == end:
+                        continue
+                    candidate_scores.append(self.vectors[start:end] @ query_vector)
+                    candidate_ids.append(np.asarray(self.ids[start:end]))
+
+            if candidate_ids:
+                ids = np.concatenate(candidate_ids)
+                scores = np.concatenate(candidate_scores)
+                hidden = self._hidden_base_ids()
+                if len(hidden):
+                    keep = ~np.isin(ids, hidden)
+                    ids, scores = ids[keep], scores[keep]
+            else:
+                ids = np.empty(0, dtype=np.int64)
+                scores = np.empty(0, dtype=np.float32)
+
+            # Deltas are small until the next compaction, so scan them exhaustively
+            live = self._live_delta_mask()
+            if live.any():
+                ids = np.concatenate([ids, self.delta_ids[live]])
+                scores = np.concatenate([scores, self.delta_vectors[live] @ query_vector])
+
+            if len(ids) == 0:
+                return []
+            k = min(top_k, len(ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def stats(self):
+        self.refresh()
+        return {
+            "generation": self._generation,
+            "nlist": int(self.centroids.shape[0]),
+            "base_count": int(len(self.ids)),
+            "delta_count": int(len(self.delta_ids)),
+            "tombstone_count": int(len(self.tombstones)),
+        }
+
+    def live_ids(self):
+        """Ids currently searchable: base rows not hidden plus live delta rows"""
+        self.refresh(force=True)
+        with self._lock:
+            base = np.setdiff1d(np.asarray(self.ids), self._hidden_base_ids())
+            return np.union1d(base, self.delta_ids[self._live_delta_mask()])
+
+    def log_position(self):
+        """``(generation, delta rows, tombstones)`` written so far; pass to ``build(since=...)``"""
+        with self._write_lock():
+            generation = self._read_current()
+            if generation is None:
+                return None, 0, 0
+            gen_path = self._generation_path(generation)
+            return (
+                generation,
+                _count_items(os.path.join(gen_path, "delta.ids"), 8),
+                _count_items(os.path.join(gen_path, "tombstones.ids"), 16),
+            )
+
+    def needs_compaction(self, ratio):
+        """True when the logs are large relative to the base generation"""
+        self.refresh(force=True)
+        pending = len(self.delta_ids) + len(self.tombstones)
+        return pending > 0 and pending >= ratio * max(len(self.ids), 1000)
+
+    # -- writing -----------------------------------------------------------
+
+    def _replay_sources(self, previous, since):
+        """Log segments written after ``since``, as ``(generation, delta start, tombstone start)``"""
+        generation, delta_start, tombstone_start = since
+        if previous is None:
+            return []
+        if generation is None:
+            return [(previous, 0, 0)]  # the index was created while the rebuild ran
+        if generation == previous:
+            return [(previous, delta_start, tombstone_start)]
+        if os.path.isdir(self._generation_path(generation)):
+            # Compacted meanwhile: its base holds the marked generation's deltas, which are replayed anyway
+            return [(generation, delta_start, tombstone_start), (previous, 0, 0)]
+        logger.warning(f"ANN generation {generation} is gone; writes during the rebuild of {self.path} may be lost")
+        return [(previous, 0, 0)]
+
+    def _replay(self, target_path, sources):
+        """Append the given log segments to the delta and tombstone logs of ``target_path``"""
+        replayed = 0
+        for generation, delta_start, tombstone_start in sources:
+            gen_path = self._generation_path(generation)
+            delta_ids = _read_tail(os.path.join(gen_path, "delta.ids"), np.int64, delta_start)
+            delta_vectors = _read_tail(
+                os.path.join(gen_path, "delta.vec"), np.float32, delta_start, self.dimension
+            )[:len(delta_ids)]
+            tombstones = _read_tail(os.path.join(gen_path, "tombstones.ids"), np.int64, tombstone_start, 2)
+            if len(tombstones):
+                # Tombstones hide delta rows written before them: rebase onto the new log
+                tombstones = tombstones.copy()
+                tombstones[:, 1] = replayed + np.maximum(tombstones[:, 1] - delta_start, 0)
+                with open(os.path.join(target_path, "tombstones.ids"), "ab") as f:
+                    f.write(tombstones.tobytes())
+            if len(delta_ids):
+                with open(os.path.join(target_path, "delta.vec"), "ab") as f:
+                    f.write(np.ascontiguousarray(delta_vectors).tobytes())
+                with open(os.path.join(target_path, "delta.ids"), "ab") as f:
+                    f.write(delta_ids.tobytes())
+            replayed += len(delta_ids)
+        return replayed
+
+    def _write_generation(self, ids, vectors, centroids, since=None):
+        """Write a new immutable generation and atomically make it current
+
+        With ``since`` (a ``log_position()``), log entries appended after it
+        are carried over into the new generation's logs.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        nlist = centroids.shape[0]
+
+        if nlist and len(ids):
+            assignments = assign_lists(vectors, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=nlist)
+            vectors, ids = vectors[order], ids[order]
+        else:
+            counts = np.zeros(nlist, dtype=np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        previous = self._read_current()
+        number = int(previous.split("-")[1]) + 1 if previous else 1
+        generation = f"gen-{number:06d}"
+        gen_path = self._generation_path(generation)
+        tmp_path = gen_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        np.save(os.path.join(tmp_path, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_path, "vectors.npy"), vectors)
+        np.save(os.path.join(tmp_path, "ids.npy"), ids)
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({
+                "dimension": self.dimension,
+                "nlist": int(nlist),
+                "count": int(len(ids)),
+                "built_at": time.time(),
+            }, f)
+        replayed = self._replay(tmp_path, self._replay_sources(previous, since)) if since is not None else 0
+        os.rename(tmp_path, gen_path)
+
+        current_tmp = os.path.join(self.path, CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(self.path, CURRENT_FILE))
+
+        # Keep the previous generation: other workers may still have it mapped
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in (generation, previous):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+        logger.info(
+            f"Wrote ANN generation {generation} at {self.path}: {len(ids)} vectors, {nlist} lists"
+            + (f", {replayed} replayed writes" if replayed else "")
+        )
+        self.refresh(force=True)
+        return generation
+
+    def build(self, ids, vectors, nlist=None, since=None):
+        """Replace the index with a freshly trained one over ``vectors``
+
+        Pass the ``log_position()`` taken before ``vectors`` were read to keep
+        inserts and deletes that happened since.
+        """
+        vectors = _normalize(vectors) if len(ids) else np.empty((0, self.dimension), dtype=np.float32)
+        if not nlist:
+            # Common IVF heuristic: about 4 * sqrt(n) lists
+            nlist = int(4 * np.sqrt(len(ids))) if len(ids) else 0
+        nlist = min(nlist, len(ids))
+        centroids = (
+            train_centroids(vectors, nlist) if nlist
+            else np.empty((0, self.dimension), dtype=np.float32)
+        )
+        with self._write_lock():
+            return self._write_generation(ids, vectors, centroids, since=since)
+
+    def insert(self, ids, vectors):
+        """Append vectors to the delta log of the live generation"""
+        vectors = _normalize(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._write_lock():
+            if self._read_current() is None:
+                self._write_generation([], np.empty((0, self.dimension), dtype=np.float32),
+                                       np.empty((0, self.dimension), dtype=np.float32))
+            gen_path = self._generation_path(self._read_current())
+            with open(os.path.join(gen_path, "delta.vec"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(os.path.join(gen_path, "delta.ids"), "ab") as f:
+                f.write(ids.tobytes())
+        self.refresh(force=True)
+
+    def delete(self, ids):
+        """Tombstone ids; they disappear from results immediately and from disk at compaction"""
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._write_lock():
+            generation = self._read_current()
+            if generation is None:
+                return
+            gen_path = self._generation_path(generation)
+            delta_length = os.path.getsize(os.path.join(gen_path, "delta.ids")) // 8 \
+                if os.path.exists(os.path.join(gen_path, "delta.ids")) else 0
+            records = np.column_stack([ids, np.full(len(ids), delta_length, dtype=np.int64)])
+            with open(os.path.join(gen_path, "tombstones.ids"), "ab") as f:
+                f.write(records.astype(np.int64).tobytes())
+        self.refresh(force=True)
+
+    def compact(self, retrain_growth=2.0):
+        """Fold deltas and tombstones into a new generation.
+
+        Centroids are reused unless the index grew by ``retrain_growth`` times
+        since they were trained, in which case they are retrained.
+        """
+        with self._write_lock():
+            self.refresh(force=True)
+            with self._lock:
+                hidden = self._hidden_base_ids()
+                keep = ~np.isin(self.ids, hidden) if len(hidden) else np.ones(len(self.ids), dtype=bool)
+                live = self._live_delta_mask()
+                ids = np.concatenate([np.asarray(self.ids)[keep], self.delta_ids[live]])
+                vectors = np.concatenate([np.asarray(self.vectors)[keep], self.delta_vectors[live]])
+                centroids = np.asarray(self.centroids)
+                base_count = len(self.ids)
+
+            target_nlist = int(4 * np.sqrt(len(ids))) if len(ids) else 0
+            if len(ids) and (centroids.shape[0] == 0 or len(ids) >= retrain_growth * max(base_count, 1)):
+                centroids = train_centroids(vectors, min(target_nlist, len(ids)))
+            return self._write_generation(ids, vectors, centroids)
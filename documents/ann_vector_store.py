@@ -0,0 +1,229 @@
+# documents/ann_vector_store.py
+import logging
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from decouple import config
+from .ann_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+
+class AnnVectorStore:
+    """Vector store backed by per-namespace ``IVFIndex`` files on local disk.
+
+    Same API as ``PineconeVectorStore``. Indexes are built from
+    ``DocumentChunk.embedding`` by the ``build_ann_index`` management command;
+    ``add_documents`` appends to them incrementally and ``delete_document``
+    tombstones ids until the next compaction. ``ANN_NPROBE`` (or the ``nprobe``
+    argument to ``search``) trades recall for latency: more probed lists means
+    better recall and a slower query.
+    """
+
+    # Metadata is joined from DocumentChunk at search time, never stored in the index
+    stores_metadata = False
+    reads_database = True
+
+    def __init__(self, embedder=None, embedding_dimension=1024):
+        self._embedder = embedder
+        self.embedding_dimension = embedding_dimension
+        self.root = config('ANN_INDEX_ROOT', default=os.path.join(settings.BASE_DIR, 'ann_indexes'))
+        self.nprobe = config('ANN_NPROBE', default=16, cast=int)
+        self.refresh_seconds = config('ANN_REFRESH_SECONDS', default=1.0, cast=float)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        # Created on first use so index maintenance commands need no API key
+        if self._embedder is None:
+            from .embeddings import PineconeEmbedder
+            self._embedder = PineconeEmbedder(dimension=self.embedding_dimension)
+        return self._embedder
+
+    def _get_user_namespace(self, user_id=None):
+        """Get namespace for user-specific vectors"""
+        if user_id:
+            return f"user_{user_id}"
+        return "global"
+
+    def get_index(self, namespace):
+        """Return the (cached) index reader/writer for a namespace"""
+        index = self._indexes.get(namespace)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(namespace)
+                if index is None:
+                    index = IVFIndex(
+                        os.path.join(self.root, namespace),
+                        self.embedding_dimension,
+                        refresh_seconds=self.refresh_seconds
+                    )
+                    self._indexes[namespace] = index
+        return index
+
+    def namespace_queryset(self, namespace):
+        """DocumentChunk rows that belong to a namespace"""
+        from .models import DocumentChunk
+        queryset = DocumentChunk.objects.filter(embedding__isnull=False)
+        if namespace.startswith("user_"):
+            queryset = queryset.filter(document__user_id=int(namespace[len("user_"):]))
+        return queryset
+
+    def build_namespace(self, namespace, nlist=None):
+        """Rebuild a namespace index from the embeddings stored in the database
+
+        Inserts and deletes that reach the index while the database is read
+        and the index trained are replayed into the new generation.
+        """
+        index = self.get_index(namespace)
+        since = index.log_position()
+        queryset = self.namespace_queryset(namespace)
+        count = queryset.count()
+        ids = np.empty(count, dtype=np.int64)
+        vectors = np.empty((count, self.embedding_dimension), dtype=np.float32)
+
+        loaded = 0
+        rows = queryset.order_by('id').values_list('id', 'embedding').iterator(chunk_size=2000)
+        for chunk_id, embedding in rows:
+            if loaded == len(ids):
+                # Embedded after the count: also in the replayed logs, keeping it is harmless
+                ids = np.concatenate([ids, np.empty(max(loaded, 1024), dtype=np.int64)])
+                vectors = np.concatenate([vectors, np.empty((max(loaded, 1024), self.embedding_dimension),
+                                                            dtype=np.float32)])
+            ids[loaded] = chunk_id
+            vectors[loaded] = embedding
+            loaded += 1
+
+        return index.build(ids[:loaded], vectors[:loaded], nlist=nlist, since=since)
+
+    def generate_embedding(self, text):
+        """Generate an embedding for a query"""
+        try:
+            return self.embedder.embed_query(text)
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            raise
+
+    def add_document(self, chunk_id, text, user_id=None, metadata=None):
+        """Add a single document to the index with generated embedding"""
+        return self.add_documents([chunk_id], [text], user_id=user_id,
+                                  metadatas=[metadata or {}])[0]
+
+    def add_documents(self, chunk_ids, texts, user_id=None, metadatas=None, embeddings=None, namespaces=None,
+                      on_embedded=None, on_indexed=None):
+        """Add multiple documents to the index with generated embeddings
+
+        Metadata lives in ``DocumentChunk`` and is joined in at search time, so
+        only ids and vectors are written to the index. Pass ``embeddings`` to skip
+        embedding, and ``namespaces`` to write to several namespaces at once.
+        ``on_embedded(indexes, embeddings)`` and ``on_indexed(namespace, indexes)``
+        report progress as in ``PineconeVectorStore.add_documents``.
+        """
+        if namespaces is None:
+            namespaces = [self._get_user_namespace(user_id)]
+        try:
+            if embeddings is None:
+                embeddings = self.embedder.embed_documents(texts, on_batch=on_embedded)
+            ids = [int(chunk_id) for chunk_id in chunk_ids]
+            for namespace in namespaces:
+                self.get_index(namespace).insert(ids, embeddings)
+                if on_indexed is not None:
+                    on_indexed(namespace, list(range(len(ids))))
+            return embeddings
+        except Exception as e:
+            logger.error(f"Error batch processing documents: {e}")
+            raise
+
+    def _hydrate(self, matches):
+        """Attach chunk text and metadata to ``[(chunk_id, score)]`` matches"""
+        from .models import DocumentChunk
+        rows = DocumentChunk.objects.filter(id__in=[chunk_id for chunk_id, _ in matches]).values(
+            'id', 'content', 'metadata'
+        )
+        by_id = {row['id']: row for row in rows}
+
+        results = []
+        for chunk_id, score in matches:
+            row = by_id.get(chunk_id)
+            if row is None:
+                continue  # chunk deleted after it was indexed
+            metadata = dict(row['metadata'] or {})
+            metadata["chunk_id"] = str(chunk_id)
+            metadata["text"] = row['content']
+            results.append((chunk_id, score, metadata))
+        return results
+
+    def search(self, query_text=None, query_embedding=None, top_k=5, user_id=None, filter_dict=None, nprobe=None):
+        """Search for similar documents using text or embedding
+
+        Metadata filters are not supported by the local index.
+        """
+        if filter_dict:
+            raise ValueError("AnnVectorStore does not support metadata filters")
+
+        # Generate embedding if text is provided
+        if query_text and query_embedding is None:
+            query_embedding = self.generate_embedding(query_text)
+
+        if query_embedding is None:
+            raise ValueError("Either query_text or query_embedding must be provided")
+
+        nprobe = nprobe or self.nprobe
+
+        # First try user-specific namespace, then fall back to global (same as Pinecone)
+        matches = []
+        if user_id:
+            matches = self.get_index(self._get_user_namespace(user_id)).search(query_embedding, top_k, nprobe)
+        if not matches:
+            matches = self.get_index("global").search(query_embedding, top_k, nprobe)
+
+        return self._hydrate(matches)
+
+    def delete_document(self, chunk_id, user_id=None):
+        """Delete a document from the index"""
+        self.get_index(self._get_user_namespace(user_id)).delete([int(chunk_id)])
+
+    def delete_documents(self, chunk_ids, user_id=None, namespaces=None):
+        """Tombstone many documents in the given namespaces"""
+        if namespaces is None:
+            namespaces = [self._get_user_namespace(user_id)]
+        ids = [int(chunk_id) for chunk_id in chunk_ids]
+        for namespace in namespaces:
+            self.get_index(namespace).delete(ids)
+
+    def delete_user_documents(self, user_id):
+        """Delete all documents for a user"""
+        index = self.get_index(self._get_user_namespace(user_id))
+        index.build(np.empty(0, dtype=np.int64), np.empty((0, self.embedding_dimension), dtype=np.float32))
+
+    def list_ids(self, namespace, page_size=1000):
+        """Yield pages of the chunk ids indexed in ``namespace``"""
+        ids = self.get_index(namespace).live_ids()
+        for i in range(0, len(ids), page_size):
+            yield [int(chunk_id) for chunk_id in ids[i:i + page_size]]
+
+    def compact(self, ratio=None):
+        """Compact every namespace on disk whose logs have grown past ``ratio`` of the base"""
+        ratio = ratio if ratio is not None else config('ANN_COMPACT_RATIO', default=0.2, cast=float)
+        compacted = []
+        for namespace in self.list_namespaces():
+            index = self.get_index(namespace)
+            if index.needs_compaction(ratio):
+                index.compact()
+                compacted.append(namespace)
+        return compacted
+
+    def list_namespaces(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def health_check(self):
+        """Return per-namespace index stats"""
+        namespaces = {name: self.get_index(name).stats() for name in self.list_namespaces()}
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(stats["base_count"] + stats["delta_count"] for stats in namespaces.values()),
+        }
@@ -0,0 +1,164 @@
+# documents/answer_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """Caches LLM answers keyed by the query embedding.
+
+    A lookup returns a cached answer when a previous query in the same scope
+    (e.g. user/agent) is within ``max_distance`` cosine distance of the new one
+    and none of the documents that answer drew on have been reprocessed since
+    (for answers that drew on none, no document at all has changed).
+    Entries are evicted LRU across all scopes and expire after ``ttl_seconds``.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, max_distance=0.05):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # entry id -> entry dict, in LRU order
+        self._scopes = {}  # scope -> {"ids": [...], "matrix": ndarray or None}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_config(cls):
+        """Build the cache from environment settings; returns None when disabled"""
+        max_entries = config('ANSWER_CACHE_SIZE', default=1024, cast=int)
+        if max_entries <= 0:
+            return None
+        return cls(
+            max_entries=max_entries,
+            ttl_seconds=config('ANSWER_CACHE_TTL', default=3600, cast=int),
+            max_distance=config('ANSWER_CACHE_MAX_DISTANCE', default=0.05, cast=float),
+        )
+
+    def _scope_matrix(self, scope):
+        """Stacked unit query vectors for a scope, rebuilt lazily after changes"""
+        state = self._scopes.get(scope)
+        if not state or not state["ids"]:
+            return None, []
+        if state["matrix"] is None:
+            state["matrix"] = np.stack([self._entries[entry_id]["vector"] for entry_id in state["ids"]])
+        return state["matrix"], state["ids"]
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        state = self._scopes.get(entry["scope"])
+        if state:
+            state["ids"].remove(entry_id)
+            state["matrix"] = None
+            if not state["ids"]:
+                del self._scopes[entry["scope"]]
+
+    def lookup(self, scope, query_vector):
+        """Return the closest live entry within ``max_distance``, or None.
+
+        The caller still has to confirm the entry's documents are current,
+        see ``RAGService``.
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        now = time.monotonic()
+
+        with self._lock:
+            matrix, ids = self._scope_matrix(scope)
+            if matrix is not None:
+                scores = matrix @ query_vector
+                best = int(np.argmax(scores))
+                if 1.0 - float(scores[best]) <= self.max_distance:
+                    entry_id = ids[best]
+                    entry = self._entries[entry_id]
+                    if entry["expires_at"] > now:
+                        self._entries.move_to_end(entry_id)
+                        return entry
+                    self._remove(entry_id)
+            self.misses += 1
+            return None
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def discard(self, entry):
+        """Drop an entry whose documents turned out to be stale"""
+        with self._lock:
+            self._remove(entry["id"])
+            self.misses += 1
+            self.invalidations += 1
+
+    def store(self, scope, query_vector, answer, document_versions, documents_version=None):
+        """Cache ``answer``; ``document_versions`` maps document id -> version string.
+
+        ``documents_version`` versions the whole document set, for answers
+        that used no documents.
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "id": entry_id,
+                "scope": scope,
+                "vector": query_vector,
+                "answer": answer,
+                "document_versions": document_versions,
+                "documents_version": documents_version,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            state = self._scopes.setdefault(scope, {"ids": [], "matrix": None})
+            state["ids"].append(entry_id)
+            state["matrix"] = None
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_document(self, document_id):
+        """Drop answers that used ``document_id``, and answers that used no documents
+        (the new content may now answer them)"""
+        document_id = str(document_id)
+        with self._lock:
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if not entry["document_versions"] or document_id in entry["document_versions"]
+            ]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+        if stale:
+            logger.info(f"Answer cache: invalidated {len(stale)} entries for document {document_id}")
+
+    def on_document_changed(self, sender, document_id, **kwargs):
+        """Receiver for the ``document_chunks_changed`` signal"""
+        self.invalidate_document(document_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,110 @@
+# documents/artifacts.py
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import numpy as np
+from decouple import config
+from .extraction import EXTRACTION_VERSION, ExtractedDocument, Piece
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file, block_size=1024 * 1024):
+    """sha256 of an uploaded or stored file, read in blocks; leaves the file rewound"""
+    hasher = hashlib.sha256()
+    if hasattr(file, 'chunks'):
+        for block in file.chunks(block_size):
+            hasher.update(block)
+    else:
+        for block in iter(lambda: file.read(block_size), b''):
+            hasher.update(block)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+class ParsedArtifactStore:
+    """On-disk cache of extracted document text, keyed by the file's sha256.
+
+    An artifact is a directory holding ``text.bin`` (the UTF-8 text of every
+    piece, back to back), ``pieces.npy`` (int64 rows of page, byte start, byte
+    end; page -1 for formats without pages) and ``meta.json`` (the file
+    metadata). Reading memory-maps the text and decodes one piece at a time,
+    so replaying a 1,000 page PDF costs no parsing and little memory.
+
+    Artifacts are written as a side effect of the first extraction and moved
+    into place atomically once it completes; identical files uploaded by
+    different users share one artifact.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def from_config(cls):
+        """Build the store from environment settings; returns None when disabled"""
+        if not config('PARSED_ARTIFACTS', default=True, cast=bool):
+            return None
+        from django.conf import settings
+        return cls(config('PARSED_ARTIFACT_ROOT', default=os.path.join(settings.BASE_DIR, 'parsed_artifacts')))
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.v{EXTRACTION_VERSION}")
+
+    def exists(self, digest):
+        return os.path.exists(os.path.join(self.path(digest), "meta.json"))
+
+    def open(self, digest):
+        """Replay a stored extraction"""
+        path = self.path(digest)
+        with open(os.path.join(path, "meta.json")) as f:
+            metadata = json.load(f)
+        rows = np.load(os.path.join(path, "pieces.npy"))
+
+        def pieces():
+            with open(os.path.join(path, "text.bin"), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+                    for page, start, end in rows:
+                        yield Piece(int(page) if page >= 0 else None, text[start:end].decode('utf-8'))
+
+        return ExtractedDocument(metadata, pieces())
+
+    def record(self, digest, extracted):
+        """Wrap ``extracted`` so that reading it through also stores the artifact"""
+        final_path = self.path(digest)
+
+        def pieces():
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(final_path))
+            try:
+                rows = []
+                offset = 0
+                with open(os.path.join(tmp_path, "text.bin"), "wb") as f:
+                    for piece in extracted.pieces():
+                        data = piece.text.encode('utf-8')
+                        f.write(data)
+                        rows.append((piece.page if piece.page is not None else -1, offset, offset + len(data)))
+                        offset += len(data)
+                        yield piece
+                np.save(os.path.join(tmp_path, "pieces.npy"), np.array(rows, dtype=np.int64).reshape(-1, 3))
+                with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                    json.dump(extracted.metadata, f, default=str)
+                try:
+                    os.rename(tmp_path, final_path)
+                    tmp_path = None
+                    logger.info(f"Stored parsed artifact {digest[:12]} ({offset} bytes, {len(rows)} pieces)")
+                except OSError:
+                    pass  # another worker stored the same file first
+            finally:
+                if tmp_path:
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+
+        return ExtractedDocument(extracted.metadata, pieces())
+
+    def delete(self, digest):
+        shutil.rmtree(self.path(digest), ignore_errors=True)
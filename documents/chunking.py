@@ -0,0 +1,331 @@
+# documents/chunking.py
+import bisect
+import math
+import re
+from collections import deque
+from typing import NamedTuple, Optional
+from decouple import config
+
+# Chunks are embedded with multilingual-e5-large, so they are sized in its tokens
+DEFAULT_CHUNK_TOKENIZER = 'intfloat/multilingual-e5-large'
+
+
+class Chunk(NamedTuple):
+    index: int
+    text: str
+    start: int  # character offsets into the full document text
+    end: int
+    page_start: Optional[int]
+    page_end: Optional[int]
+
+
+class _PageMap:
+    """Maps character offsets of a text stream to page numbers, forgetting consumed pages"""
+
+    def __init__(self):
+        self.starts = []
+        self.pages = []
+
+    def add(self, offset, page):
+        if page is not None and (not self.pages or self.pages[-1] != page):
+            self.starts.append(offset)
+            self.pages.append(page)
+
+    def page_at(self, offset):
+        position = bisect.bisect_right(self.starts, offset) - 1
+        return self.pages[position] if position >= 0 else None
+
+    def forget_before(self, offset):
+        position = bisect.bisect_right(self.starts, offset) - 1
+        if position > 0:
+            del self.starts[:position]
+            del self.pages[:position]
+
+
+def iter_chunks(pieces, chunk_size=1000, overlap=200):
+    """Split a stream of ``(page, text)`` pieces into overlapping chunks.
+
+    Splits the concatenated text with a fixed ``chunk_size`` window that
+    prefers to end after a sentence ('. '), but reads only as far ahead as the
+    current window needs, so memory stays bounded by the chunk size and the
+    largest piece. Each chunk carries its
+    exact character offsets and the pages it spans.
+    """
+    pieces = iter(pieces)
+    page_map = _PageMap()
+    buffer = ""
+    base = 0  # offset of buffer[0] in the full text
+    start = 0
+    index = 0
+    exhausted = False
+
+    while True:
+        # Read until the window is complete or the stream ends
+        while not exhausted and base + len(buffer) < start + chunk_size:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            elif piece[1]:
+                page_map.add(base + len(buffer), piece[0])
+                buffer += piece[1]
+
+        text_length = base + len(buffer)
+        if start >= text_length:
+            return
+
+        end = min(start + chunk_size, text_length)
+
+        # Try to find a sentence break for clean chunking
+        sentence_break = buffer.rfind('. ', start - base, end - base)
+        if sentence_break != -1 and sentence_break + base > start + chunk_size // 2:
+            end = sentence_break + base + 2
+
+        yield Chunk(
+            index=index,
+            text=buffer[start - base:end - base],
+            start=start,
+            end=end,
+            page_start=page_map.page_at(start),
+            page_end=page_map.page_at(end - 1),
+        )
+        index += 1
+        if exhausted and end >= text_length:
+            return
+        # Overlap from the actual end, so a sentence break never leaves a gap
+        start = max(end - overlap, start + 1)
+
+        # Drop consumed text once it dominates the buffer (keeps trimming linear)
+        consumed = min(start, text_length) - base
+        if consumed > len(buffer) // 2:
+            buffer = buffer[consumed:]
+            base += consumed
+            page_map.forget_before(base)
+
+
+class Unit(NamedTuple):
+    start: int
+    end: int
+    size: int
+    boundary: bool = False  # a chunk must start here (e.g. a heading)
+
+
+WORD_RE = re.compile(r"\S+\s*")
+SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+|\n[ \t]*\n\s*")
+PARAGRAPH_END_RE = re.compile(r"\n[ \t]*\n\s*")
+HEADING_RE = re.compile(r"(#{1,6}\s+\S|(\d+\.)+\d*\s+[A-Z]|(chapter|section|part|appendix)\s+\w+)", re.IGNORECASE)
+
+
+def _is_heading(text):
+    line = text.strip()
+    if not line or "\n" in line or len(line) > 120 or line.endswith(('.', ',', ';', ':')):
+        return False
+    return bool(HEADING_RE.match(line)) or (line.isupper() and len(line) <= 80)
+
+
+def _split_by(pattern, text, start, end, final):
+    """Spans ending after each ``pattern`` match in ``text[start:end]``; the
+    unterminated tail is included only when ``final``"""
+    spans = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if match.end() > position:
+            spans.append((position, match.end()))
+            position = match.end()
+    if final:
+        if position < end:
+            spans.append((position, end))
+    elif spans and spans[-1][1] == end:
+        spans.pop()  # may continue in text not read yet
+    return spans
+
+
+class _StreamBuffer:
+    """Sliding window over a stream of ``(page, text)`` pieces, addressed by absolute offsets"""
+
+    def __init__(self, pieces):
+        self.pieces = iter(pieces)
+        self.page_map = _PageMap()
+        self.text = ""
+        self.base = 0
+        self.exhausted = False
+
+    @property
+    def end(self):
+        return self.base + len(self.text)
+
+    def fill(self, until):
+        parts = []
+        length = self.end
+        while not self.exhausted and length < until:
+            piece = next(self.pieces, None)
+            if piece is None:
+                self.exhausted = True
+            elif piece[1]:
+                self.page_map.add(length, piece[0])
+                parts.append(piece[1])
+                length += len(piece[1])
+        if parts:
+            self.text += "".join(parts)
+
+    def slice(self, start, end):
+        return self.text[start - self.base:end - self.base]
+
+    def trim(self, before):
+        consumed = before - self.base
+        if consumed > len(self.text) // 2:
+            self.text = self.text[consumed:]
+            self.base = before
+            self.page_map.forget_before(before)
+
+
+class Chunker:
+    """Streaming document chunker with pluggable strategies.
+
+    ``characters``
+        The original fixed window of ``chunk_size`` characters preferring to
+        end after '. ' (see ``iter_chunks``); sizes are in characters.
+    ``tokens``
+        Windows of ``chunk_size`` tokens made of whole words.
+    ``sentences``
+        Whole sentences packed up to ``chunk_size`` tokens.
+    ``structure``
+        Whole paragraphs packed up to ``chunk_size`` tokens; a heading always
+        starts a new chunk. Oversized paragraphs fall back to sentences, then
+        words, then characters.
+
+    Token sizes use ``CHUNK_TOKENIZER`` (default: the embedding model's
+    tokenizer); the ``TokenCounter`` estimate is only a logged fallback.
+    Overlap (``overlap``, same unit as the size) repeats the trailing units of
+    a chunk at the start of the next, except across headings. Every strategy reads the input once, in bounded windows,
+    and records exact character offsets and pages for each chunk.
+    """
+
+    strategies = ('characters', 'tokens', 'sentences', 'structure')
+    defaults = {'characters': (1000, 200), 'tokens': (300, 50), 'sentences': (300, 50), 'structure': (300, 50)}
+    read_ahead = 64 * 1024
+    max_pending = 256 * 1024  # an unterminated unit this long is cut rather than rescanned
+
+    def __init__(self, strategy='characters', chunk_size=None, overlap=None, token_counter=None):
+        if strategy not in self.strategies:
+            raise ValueError(f"Unsupported chunking strategy: {strategy}")
+        default_size, default_overlap = self.defaults[strategy]
+        self.strategy = strategy
+        self.chunk_size = chunk_size or default_size
+        self.overlap = default_overlap if overlap is None else overlap
+        if self.overlap >= self.chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        if token_counter is None and strategy != 'characters':
+            from .context_builder import TokenCounter
+            token_counter = TokenCounter(config('CHUNK_TOKENIZER', default=DEFAULT_CHUNK_TOKENIZER) or None)
+        self.token_counter = token_counter
+
+    @classmethod
+    def from_config(cls):
+        """Chunker for ``CHUNK_STRATEGY``; ``CHUNK_SIZE``/``CHUNK_OVERLAP`` override the strategy defaults"""
+        overlap = config('CHUNK_OVERLAP', default='')
+        return cls(
+            strategy=config('CHUNK_STRATEGY', default='characters'),
+            chunk_size=config('CHUNK_SIZE', default=0, cast=int) or None,
+            overlap=int(overlap) if overlap != '' else None,
+        )
+
+    def chunks(self, pieces):
+        """Yield ``Chunk`` objects for a stream of ``(page, text)`` pieces"""
+        if self.strategy == 'characters':
+            return iter_chunks(pieces, chunk_size=self.chunk_size, overlap=self.overlap)
+        return self._pack(pieces)
+
+    # Segmentation
+
+    def _segment(self, buffer, start, end, final):
+        """Complete top-level units in ``[start, end)`` as spans"""
+        if self.strategy == 'tokens':
+            return _split_by(WORD_RE, buffer.text, start - buffer.base, end - buffer.base, final)
+        if self.strategy == 'sentences':
+            return _split_by(SENTENCE_END_RE, buffer.text, start - buffer.base, end - buffer.base, final)
+        return _split_by(PARAGRAPH_END_RE, buffer.text, start - buffer.base, end - buffer.base, final)
+
+    def _units(self, buffer, spans, level):
+        """Size spans (relative to the buffer) and split those over ``chunk_size`` at the next level down"""
+        texts = [buffer.text[s:e].strip() for s, e in spans]
+        sizes = self.token_counter.count_many(texts)
+        units = []
+        for (s, e), text, size in zip(spans, texts, sizes):
+            start, end = s + buffer.base, e + buffer.base
+            if size <= self.chunk_size:
+                boundary = level == 'paragraph' and _is_heading(text)
+                units.append(Unit(start, end, size, boundary))
+            elif level == 'paragraph':
+                units.extend(self._units(buffer, _split_by(SENTENCE_END_RE, buffer.text, s, e, True), 'sentence'))
+            elif level == 'sentence':
+                units.extend(self._units(buffer, _split_by(WORD_RE, buffer.text, s, e, True), 'word'))
+            else:
+                # A single "word" longer than a chunk (tables, base64, ...): cut it evenly
+                parts = math.ceil(size / self.chunk_size)
+                step = math.ceil((e - s) / parts)
+                for offset in range(s, e, step):
+                    piece_end = min(offset + step, e)
+                    units.append(Unit(offset + buffer.base, piece_end + buffer.base,
+                                      math.ceil(size * (piece_end - offset) / (e - s))))
+        return units
+
+    # Packing
+
+    def _pack(self, pieces):
+        buffer = _StreamBuffer(pieces)
+        level = {'tokens': 'word', 'sentences': 'sentence', 'structure': 'paragraph'}[self.strategy]
+        current = deque()
+        state = {'size': 0, 'fresh': 0, 'index': 0}
+        position = 0
+        wanted = self.read_ahead
+
+        def emit():
+            state['fresh'] = 0
+            start = current[0].start
+            text = buffer.slice(start, current[-1].end).rstrip()
+            if not text.strip():
+                return None
+            end = start + len(text)
+            chunk = Chunk(
+                index=state['index'],
+                text=text,
+                start=start,
+                end=end,
+                page_start=buffer.page_map.page_at(start),
+                page_end=buffer.page_map.page_at(max(start, end - 1)),
+            )
+            state['index'] += 1
+            return chunk
+
+        while True:
+            buffer.fill(wanted)
+            final = buffer.exhausted
+            spans = self._segment(buffer, position, buffer.end, final)
+            if not spans and not final and buffer.end - position > self.max_pending:
+                spans = [(position - buffer.base, buffer.end - buffer.base)]
+            if spans:
+                position = spans[-1][1] + buffer.base
+                wanted = position + self.read_ahead
+            else:
+                wanted = buffer.end + self.read_ahead  # no complete unit yet: read further
+
+            for unit in self._units(buffer, spans, level):
+                if current and (unit.boundary or state['size'] + unit.size > self.chunk_size):
+                    chunk = emit() if state['fresh'] else None
+                    if chunk is not None:
+                        yield chunk
+                    if unit.boundary:
+                        current.clear()
+                        state['size'] = 0
+                    while current and (state['size'] > self.overlap or state['size'] + unit.size > self.chunk_size):
+                        state['size'] -= current.popleft().size
+                current.append(unit)
+                state['size'] += unit.size
+                state['fresh'] += 1
+
+            if final and position >= buffer.end:
+                chunk = emit() if current and state['fresh'] else None
+                if chunk is not None:
+                    yield chunk
+                return
+            buffer.trim(min(current[0].start, position) if current else position)
@@ -0,0 +1,165 @@
+# documents/context_builder.py
+import hashlib
+import logging
+import math
+import threading
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer shared by the Llama 3 models behind the default GROQ_MODEL
+DEFAULT_CONTEXT_TOKENIZER = 'NousResearch/Meta-Llama-3-8B'
+
+
+class TokenCounter:
+    """Counts tokens with a Hugging Face ``tokenizers`` tokenizer.
+
+    ``name`` is a path to a ``tokenizer.json`` or a hub model name (downloaded
+    once, then read from the local Hugging Face cache). Only when no name is
+    given or the tokenizer cannot be loaded is a conservative estimate of one
+    token per ``chars_per_token`` characters used, and a warning logged.
+    """
+
+    def __init__(self, name=None, chars_per_token=3.5):
+        self.name = name
+        self.chars_per_token = chars_per_token
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return self._tokenizer
+            self._loaded = True
+            if not self.name:
+                logger.warning("No tokenizer configured, estimating token counts")
+                return None
+            try:
+                from tokenizers import Tokenizer
+                if self.name.endswith('.json'):
+                    self._tokenizer = Tokenizer.from_file(self.name)
+                else:
+                    self._tokenizer = Tokenizer.from_pretrained(self.name)
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer {self.name}, estimating token counts: {e}")
+            return self._tokenizer
+
+    def count(self, text):
+        tokenizer = self._tokenizer if self._loaded else self._load()
+        if tokenizer is None:
+            return int(len(text) / self.chars_per_token) + 1
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_many(self, texts):
+        """Token counts for many short texts (one batched tokenizer call)"""
+        tokenizer = self._tokenizer if self._loaded else self._load()
+        if tokenizer is None:
+            return [math.ceil(len(text) / self.chars_per_token) for text in texts]
+        return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    def truncate(self, text, max_tokens):
+        """Longest prefix of ``text`` that fits in ``max_tokens``"""
+        tokenizer = self._tokenizer if self._loaded else self._load()
+        if tokenizer is None:
+            return text[:int(max_tokens * self.chars_per_token)]
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= max_tokens:
+            return text
+        return text[:encoding.offsets[max_tokens - 1][1]]
+
+
+def _merge_overlap(first, second, max_overlap=400, probe=40):
+    """Join two consecutive chunks, dropping the text they share at the seam"""
+    head = second[:probe]
+    if head:
+        search_from = max(0, len(first) - max_overlap)
+        position = first.find(head, search_from)
+        while position != -1:
+            if second.startswith(first[position:]):
+                return first[:position] + second
+            position = first.find(head, position + 1)
+    return first + "\n" + second
+
+
+class ContextBuilder:
+    """Turns retrieved chunks into a prompt context that fits a token budget.
+
+    Chunks from the same document with consecutive ``chunk`` indexes are merged
+    and their overlapping text is dropped, exact duplicates (e.g. the same file
+    uploaded twice) are removed, and segments are then packed greedily,
+    best-scored first, until the budget is spent. The last segment is truncated
+    to fit when at least ``min_segment_tokens`` remain.
+    """
+
+    def __init__(self, token_counter=None, min_segment_tokens=64):
+        self.token_counter = token_counter or TokenCounter(
+            config('CONTEXT_TOKENIZER', default=DEFAULT_CONTEXT_TOKENIZER) or None
+        )
+        self.min_segment_tokens = min_segment_tokens
+
+    @staticmethod
+    def _chunk_score(chunk):
+        for key in ("score", "similarity", "lexical_score"):
+            if chunk.get(key) is not None:
+                return chunk[key]
+        return 0.0
+
+    def merge_segments(self, chunks):
+        """Group adjacent chunks of a document into segments with the best score among them"""
+        by_document = {}
+        for chunk in chunks:
+            doc_id = chunk["metadata"].get("document_id", "Unknown")
+            by_document.setdefault(doc_id, []).append(chunk)
+
+        segments = []
+        for doc_id, doc_chunks in by_document.items():
+            doc_chunks.sort(key=lambda c: c["metadata"].get("chunk", 0))
+            current = None
+            for chunk in doc_chunks:
+                index = chunk["metadata"].get("chunk")
+                if current is not None and index is not None and index == current["last_index"] + 1:
+                    current["content"] = _merge_overlap(current["content"], chunk["content"])
+                    current["last_index"] = index
+                    current["score"] = max(current["score"], self._chunk_score(chunk))
+                    continue
+                current = {
+                    "document_id": doc_id,
+                    "title": chunk["metadata"].get("title", "Untitled"),
+                    "content": chunk["content"],
+                    "last_index": index if index is not None else -2,
+                    "score": self._chunk_score(chunk),
+                }
+                segments.append(current)
+
+        # Drop segments whose text is identical to a better one
+        seen = set()
+        unique = []
+        for segment in sorted(segments, key=lambda s: s["score"], reverse=True):
+            digest = hashlib.sha1(" ".join(segment["content"].split()).encode("utf-8")).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            unique.append(segment)
+        return unique
+
+    def pack(self, chunks, token_budget):
+        """Return ``(segments, tokens_used)`` for the best segments fitting ``token_budget``"""
+        packed = []
+        used = 0
+        for segment in self.merge_segments(chunks):
+            header = f"--- DOCUMENT {len(packed) + 1}: {segment['title']} (ID: {segment['document_id']}) ---\n"
+            header_tokens = self.token_counter.count(header)
+            tokens = header_tokens + self.token_counter.count(segment["content"])
+            remaining = token_budget - used
+
+            if tokens <= remaining:
+                packed.append(dict(segment, header=header))
+                used += tokens
+            elif remaining - header_tokens >= self.min_segment_tokens:
+                content = self.token_counter.truncate(segment["content"], remaining - header_tokens)
+                packed.append(dict(segment, header=header, content=content))
+                used += header_tokens + self.token_counter.count(content)
+                break
+            # Otherwise skip it; a smaller, lower-ranked segment may still fit
+        return packed, used
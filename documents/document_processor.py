@@ -1,27 +1,39 @@
 # document_processor.py (without Celery and agents)
+import itertools
 import logging
+import numpy as np
+from decouple import config
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from .models import Document, DocumentChunk
-from .pinecone_vector_store import PineconeVectorStore
+from .services import get_artifact_store, get_chunker, get_page_ocr, get_parse_pool, get_vector_store
+from .artifacts import file_sha256
+from .chunking import iter_chunks
+from .embedding_cache import content_hash
+from .extraction import open_document, open_docx, open_pdf, open_text
+from .ingestion_queue import heartbeat
+from .signals import document_chunks_changed
+from . import vector_gc
 
 logger = logging.getLogger(__name__)
 
+# Metadata refreshed on every run or backfilled after it; differences here alone don't trigger a re-upsert
+VOLATILE_METADATA_KEYS = ('updated_at', 'total_chunks')
+
 
-# Same functions as before...
 def read_text_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
+    return open_text(file_path).text()
 
 
 def read_pdf_file(file_path):
     try:
-        import PyPDF2
-        content = ""
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                content += page.extract_text() + "\n"
-        return content
+        extracted = open_pdf(file_path)
+        ocr = get_page_ocr()
+        if ocr is not None:
+            with open(file_path, 'rb') as file:
+                extracted = ocr.apply(extracted, file_path, file_sha256(file), pool=get_parse_pool())
+        return extracted.text()
     except Exception as e:
         logger.error(f"Error reading PDF: {e}")
         raise
@@ -29,53 +41,28 @@ def read_pdf_file(file_path):
 
 def read_docx_file(file_path):
     try:
-        import docx
-        doc = docx.Document(file_path)
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        return open_docx(file_path).text()
     except Exception as e:
         logger.error(f"Error reading DOCX: {e}")
         raise
 
 
 def get_document_content(document):
-    file_path = document.file.path
-    file_type = document.file_type.lower()
-
-    if file_type == 'txt':
-        return read_text_file(file_path)
-    elif file_type == 'pdf':
-        return read_pdf_file(file_path)
-    elif file_type in ['docx', 'doc']:
-        return read_docx_file(file_path)
-    else:
-        raise ValueError(f"Unsupported file type: {file_type}")
+    return open_document(document.file.path, document.file_type).text()
 
 
 def chunk_text(text, chunk_size=1000, overlap=200):
     """Splits text into overlapping chunks"""
     if not text:
         return []
+    return [chunk.text for chunk in iter_chunks([(None, text)], chunk_size=chunk_size, overlap=overlap)]
 
-    chunks = []
-    start = 0
-    text_length = len(text)
-
-    while start < text_length:
-        end = min(start + chunk_size, text_length)
-
-        # Try to find a sentence break for clean chunking
-        sentence_break = text.rfind('. ', start, end)
-        if sentence_break != -1 and sentence_break > start + chunk_size // 2:
-            end = sentence_break + 2
-
-        chunks.append(text[start:end])
-        start = max(start + chunk_size - overlap, end - overlap)
-
-    return chunks
 
+def extract_metadata(document, extracted=None):
+    """Document metadata shared by all its chunks, plus what the file itself declares
 
-def extract_metadata(document):
-    """Extract metadata from document based on file type"""
+    Pass the ``ExtractedDocument`` being processed to avoid opening the file again.
+    """
     metadata = {
         'filename': document.file.name,
         'file_type': document.file_type,
@@ -85,137 +72,354 @@ def extract_metadata(document):
         'updated_at': str(document.updated_at),
     }
 
-    file_path = document.file.path
-    file_type = document.file_type.lower()
-
     try:
-        if file_type == 'pdf':
-            import PyPDF2
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                if reader.metadata:
-                    for key, value in reader.metadata.items():
-                        if key.startswith('/'):
-                            clean_key = key[1:].lower()
-                            metadata[clean_key] = value
-                metadata['page_count'] = len(reader.pages)
-
-        elif file_type in ['docx', 'doc']:
-            import docx
-            doc = docx.Document(file_path)
-            metadata['paragraph_count'] = len(doc.paragraphs)
-
-            # Try to extract core properties
-            try:
-                core_props = doc.core_properties
-                metadata['author'] = core_props.author
-                metadata['created'] = str(core_props.created) if core_props.created else None
-                metadata['modified'] = str(core_props.modified) if core_props.modified else None
-            except:
-                pass
+        if extracted is None:
+            extracted = open_document(document.file.path, document.file_type)
+        metadata.update(extracted.metadata)
     except Exception as e:
         logger.warning(f"Error extracting metadata from {document.title}: {e}")
 
     return metadata
 
 
-def process_document(document_id):
+def chunk_metadata(metadata, chunk):
+    """Per-chunk metadata: exact character offsets and, for paged formats, the pages spanned"""
+    chunk_meta = metadata.copy()
+    chunk_meta.update({
+        'chunk': chunk.index,
+        'character_start': chunk.start,
+        'character_end': chunk.end,
+    })
+    if chunk.page_start is not None:
+        chunk_meta.update({
+            'page': chunk.page_start,
+            'page_start': chunk.page_start,
+            'page_end': chunk.page_end,
+        })
+    return chunk_meta
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _backfill_total_chunks(document, total_chunks, batch_size=2000):
+    """Record the chunk count, known only once the stream ends, in the metadata of every chunk row
+
+    Vectors are written batch by batch before the count is known, so metadata
+    stored in the vector index does not carry it.
+    """
+    rows = DocumentChunk.objects.filter(document=document).only('id', 'metadata').order_by('id')
+    for batch in batched(rows.iterator(chunk_size=batch_size), batch_size):
+        changed = [row for row in batch if row.metadata.get('total_chunks') != total_chunks]
+        for row in changed:
+            row.metadata['total_chunks'] = total_chunks
+        DocumentChunk.objects.bulk_update(changed, ['metadata'])
+
+
+def _index_metadata(metadata):
+    """Chunk metadata minus keys that change on every run (not worth a re-upsert)"""
+    return {key: value for key, value in (metadata or {}).items() if key not in VOLATILE_METADATA_KEYS}
+
+
+class _ChunkDiff:
+    """Existing chunk rows of a document, matched against new chunks by content hash"""
+
+    def __init__(self, document, incremental=True):
+        # Only light columns: embeddings and text are fetched per batch when needed
+        rows = list(DocumentChunk.objects.filter(document=document).only(
+            'id', 'document_id', 'chunk_index', 'content_hash', 'metadata', 'indexed_namespaces'
+        ).order_by('chunk_index'))
+        self.unembedded = set(
+            DocumentChunk.objects.filter(document=document, embedding__isnull=True).values_list('id', flat=True)
+        )
+        missing_hashes = dict(
+            DocumentChunk.objects.filter(document=document, content_hash='').values_list('id', 'content')
+        )
+
+        self.reusable = {}
+        self.stale = []
+        for row in rows:
+            if not incremental:
+                self.stale.append(row.id)
+                continue
+            digest = row.content_hash or content_hash(missing_hashes[row.id])
+            self.reusable.setdefault(digest, []).append(row)
+
+    def take(self, digest):
+        candidates = self.reusable.get(digest)
+        return candidates.pop(0) if candidates else None
+
+    def stale_ids(self):
+        """Rows no new chunk matched"""
+        return self.stale + [row.id for candidates in self.reusable.values() for row in candidates]
+
+
+def _mark_indexed(rows, namespace):
+    for row in rows:
+        if namespace not in row.indexed_namespaces:
+            row.indexed_namespaces = row.indexed_namespaces + [namespace]
+    DocumentChunk.objects.bulk_update(rows, ['indexed_namespaces'])
+
+
+def _embed_and_index(vector_store, items, namespaces):
+    """Embed ``(row, text)`` items and upsert them, saving progress as each step lands"""
+    rows = [row for row, _ in items]
+
+    def on_embedded(indexes, embeddings):
+        embedded = []
+        for i, embedding in zip(indexes, embeddings):
+            rows[i].embedding = embedding
+            rows[i].indexed_namespaces = []
+            embedded.append(rows[i])
+        DocumentChunk.objects.bulk_update(embedded, ['embedding', 'indexed_namespaces'])
+
+    vector_store.add_documents(
+        [row.id for row in rows],
+        [text for _, text in items],
+        metadatas=[row.metadata for row in rows],
+        namespaces=namespaces,
+        on_embedded=on_embedded,
+        on_indexed=lambda namespace, indexes: _mark_indexed([rows[i] for i in indexes], namespace),
+    )
+
+
+def _index_stored(vector_store, items, namespaces):
+    """Upsert the stored embeddings of ``(row, text)`` items to the namespaces each is missing from"""
+    stored = dict(DocumentChunk.objects.filter(id__in=[row.id for row, _ in items]).values_list('id', 'embedding'))
+    groups = {}
+    for row, text in items:
+        missing = tuple(namespace for namespace in namespaces if namespace not in row.indexed_namespaces)
+        groups.setdefault(missing, []).append((row, text))
+
+    for missing, group in groups.items():
+        rows = [row for row, _ in group]
+        vector_store.add_documents(
+            [row.id for row in rows],
+            [text for _, text in group],
+            metadatas=[row.metadata for row in rows],
+            embeddings=np.stack([stored[row.id] for row in rows]),
+            namespaces=list(missing),
+            on_indexed=lambda namespace, indexes, rows=rows: _mark_indexed([rows[i] for i in indexes], namespace),
+        )
+
+
+def _ingest_batch(document, batch, metadata, diff, vector_store, namespaces):
+    """Write one batch of chunks: reuse unchanged rows, create and embed the rest
+
+    Every step is recorded on the rows as it completes: embeddings are saved
+    as soon as they arrive and ``indexed_namespaces`` lists where each vector
+    has been written. A batch that was interrupted therefore resumes on retry
+    with only its missing embeddings and upserts, and a batch that completed
+    costs no API calls at all.
+    """
+    new_chunks, new_texts = [], []
+    reused, to_embed, to_index = [], [], []
+    stores_metadata = getattr(vector_store, 'stores_metadata', True)
+
+    for chunk in batch:
+        digest = content_hash(chunk.text)
+        meta = chunk_metadata(metadata, chunk)
+        row = diff.take(digest)
+        if row is None:
+            new_chunks.append(DocumentChunk(
+                document=document,
+                content=chunk.text,
+                content_hash=digest,
+                chunk_index=chunk.index,
+                metadata=meta
+            ))
+            new_texts.append(chunk.text)
+            continue
+
+        if row.id in diff.unembedded:
+            to_embed.append((row, chunk.text))
+        else:
+            if stores_metadata and _index_metadata(row.metadata) != _index_metadata(meta):
+                # Unchanged text at a new position: its vectors carry stale metadata
+                row.indexed_namespaces = []
+            if any(namespace not in row.indexed_namespaces for namespace in namespaces):
+                to_index.append((row, chunk.text))
+        row.chunk_index = chunk.index
+        row.content_hash = digest
+        row.metadata = meta
+        reused.append(row)
+
+    with transaction.atomic():
+        if reused:
+            DocumentChunk.objects.bulk_update(reused, ['chunk_index', 'content_hash', 'metadata', 'indexed_namespaces'])
+        # Use bulk_create for efficiency
+        created_chunks = DocumentChunk.objects.bulk_create(new_chunks)
+    to_embed = list(zip(created_chunks, new_texts)) + to_embed
+
+    # Embed only new chunks (and reused rows that never got an embedding),
+    # once, then upsert to the user and global namespaces in parallel
+    if to_embed:
+        _embed_and_index(vector_store, to_embed, namespaces)
+
+    # Rows embedded before whose vectors are missing from a namespace or out of date
+    if to_index:
+        _index_stored(vector_store, to_index, namespaces)
+
+    return len(to_embed), len(reused)
+
+
+def _parse_document(document, ocr):
+    extracted = open_document(document.file.path, document.file_type, pool=get_parse_pool())
+    if ocr is not None and document.file_type.lower() == 'pdf':
+        extracted = ocr.apply(extracted, document.file.path, document.content_hash, pool=get_parse_pool())
+    return extracted
+
+
+def _open_extracted(document):
+    """Replay the document's parsed artifact, or parse the file and store one on the way
+
+    Scanned PDF pages are OCR'd while parsing (see ``PageOcr``).
+    """
+    artifacts = get_artifact_store()
+    ocr = get_page_ocr()
+    if artifacts is None and ocr is None:
+        return open_document(document.file.path, document.file_type, pool=get_parse_pool())
+
+    if not document.content_hash:
+        with document.file.open('rb') as file:
+            document.content_hash = file_sha256(file)
+        document.save(update_fields=['content_hash'])
+
+    if artifacts is None:
+        return _parse_document(document, ocr)
+
+    if artifacts.exists(document.content_hash):
+        extracted = artifacts.open(document.content_hash)
+        if ocr is None or document.file_type.lower() != 'pdf' or extracted.metadata.get('ocr') == ocr.languages:
+            logger.info(f"Reusing parsed artifact for document {document.id}")
+            return extracted
+        # Parsed before OCR was enabled, with other languages, or OCR gave up: its scanned pages are empty
+        artifacts.delete(document.content_hash)
+    return artifacts.record(document.content_hash, _parse_document(document, ocr))
+
+
+def process_document(document_id, incremental=True, raise_errors=False):
+    """Chunk, embed and index a document.
+
+    The file is parsed once and streamed: pages are chunked as they are read
+    (large PDFs are extracted on all cores, see ``ParsePool``; pages without a
+    text layer are OCR'd, see ``PageOcr``; files parsed before are replayed
+    from their ``ParsedArtifactStore`` artifact) and chunks are embedded and
+    written in batches of ``INGEST_BATCH_CHUNKS``,
+    so memory stays bounded regardless of the document size.
+
+    When the document was processed before, ``incremental`` diffs the new
+    chunks against the existing rows by content hash: unchanged chunks keep
+    their rows and embeddings, only new text is embedded, and stale rows and
+    vectors are deleted. Pass ``incremental=False`` to rebuild from scratch.
+
+    Progress is saved batch by batch on the chunk rows (see ``_ingest_batch``),
+    so running again after a crash or a failed API call resumes where the
+    previous run stopped instead of embedding everything again.
+
+    Failures mark the document failed and return a message; with
+    ``raise_errors`` they are re-raised so the ingestion queue can retry them.
+    """
     try:
         document = Document.objects.get(id=document_id)
         document.status = 'processing'
-        document.save(update_fields=['status'])
+        document.started_at = timezone.now()
+        document.save(update_fields=['status', 'started_at'])
 
-        # Get document content
+        # Open the document once; its pages are read lazily while chunking
         try:
-            content = get_document_content(document)
+            extracted = _open_extracted(document)
+            chunks = get_chunker().chunks(extracted.pieces())
+            first_chunk = next(chunks, None)
         except Exception as e:
             logger.error(f"Error reading document content: {e}")
             document.status = 'failed'
             document.save(update_fields=['status'])
+            if raise_errors:
+                raise
             return f"Failed to process document {document_id}: {str(e)}"
 
-        # Extract metadata
-        metadata = extract_metadata(document)
-
-        # Chunk the text
-        chunks = chunk_text(content)
-        total_chunks = len(chunks)
-
-        if total_chunks == 0:
+        if first_chunk is None:
             document.status = 'failed'
             document.save(update_fields=['status'])
+            if raise_errors:
+                raise ValueError("No content chunks generated")
             return f"Failed to process document {document_id}: No content chunks generated"
 
-        # Initialize Pinecone vector store
-        vector_store = PineconeVectorStore()
+        # Extract metadata
+        metadata = extract_metadata(document, extracted)
+
+        # Use the worker's shared Pinecone vector store
+        vector_store = get_vector_store()
+        namespaces = [
+            vector_store._get_user_namespace(document.user.id),
+            vector_store._get_user_namespace()
+        ]
+        batch_size = config('INGEST_BATCH_CHUNKS', default=256, cast=int)
 
         # Process chunks in batches
         try:
-            # First create chunk records in the database
-            chunk_objects = []
-            for i, text_chunk in enumerate(chunks):
-                chunk_metadata = metadata.copy()
-                chunk_metadata.update({
-                    'chunk': i,
-                    'total_chunks': total_chunks,
-                    'character_start': i * (1000 - 200) if i > 0 else 0,
-                    'character_end': min(i * (1000 - 200) + len(text_chunk), len(content))
-                })
-
-                chunk_obj = DocumentChunk(
-                    document=document,
-                    content=text_chunk,
-                    chunk_index=i,
-                    metadata=chunk_metadata
-                )
-                chunk_objects.append(chunk_obj)
-
-            # Use bulk_create for efficiency
             with transaction.atomic():
-                created_chunks = DocumentChunk.objects.bulk_create(chunk_objects)
-
-            # Now process with Pinecone (generate embeddings and store vectors)
-            chunk_ids = [chunk.id for chunk in created_chunks]
-            chunk_texts = [chunk.content for chunk in created_chunks]
-            chunk_metadatas = [chunk.metadata for chunk in created_chunks]
-
-            # Add to user namespace
-            embeddings = vector_store.add_documents(
-                chunk_ids,
-                chunk_texts,
-                user_id=document.user.id,
-                metadatas=chunk_metadatas
-            )
-
-            # Also add to global namespace
-            vector_store.add_documents(
-                chunk_ids,
-                chunk_texts,
-                metadatas=chunk_metadatas
-            )
-
-            # Update embeddings in database
-            for i, embedding in enumerate(embeddings):
-                created_chunks[i].embedding = embedding
-
-            # Bulk update the embedding fields
-            DocumentChunk.objects.bulk_update(created_chunks, ['embedding'])
-
-            # Update document status
+                diff = _ChunkDiff(document, incremental=incremental)
+                # Park existing rows on negative indexes so new chunk indexes
+                # never collide with unique_together (document, chunk_index)
+                DocumentChunk.objects.filter(document=document).update(chunk_index=-F('id'))
+
+            total_chunks = embedded = reused = 0
+            for batch in batched(itertools.chain([first_chunk], chunks), batch_size):
+                batch_embedded, batch_reused = _ingest_batch(
+                    document, batch, metadata, diff, vector_store, namespaces
+                )
+                total_chunks += len(batch)
+                embedded += batch_embedded
+                reused += batch_reused
+                heartbeat(document.id)
+
+            stale_ids = diff.stale_ids()
+            if stale_ids:
+                # The outbox keeps the vector deletes durable; flush them right away
+                with transaction.atomic():
+                    DocumentChunk.objects.filter(id__in=stale_ids).delete()
+                    vector_gc.queue_deletions(stale_ids, namespaces)
+                vector_gc.flush(chunk_ids=stale_ids, vector_store=vector_store)
+            _backfill_total_chunks(document, total_chunks)
+
+            # Update document status; updated_at doubles as the content version for caches
             document.total_chunks = total_chunks
             document.status = 'completed'
-            document.save(update_fields=['total_chunks', 'status'])
+            document.save(update_fields=['total_chunks', 'status', 'updated_at'])
 
-            return f"Successfully processed document {document_id}: {total_chunks} chunks processed"
+            document_chunks_changed.send(sender=Document, document_id=document.id, user_id=document.user.id)
+
+            logger.info(
+                f"Processed document {document_id}: {embedded} embedded, "
+                f"{reused} reused, {len(stale_ids)} removed"
+            )
+            return (
+                f"Successfully processed document {document_id}: {total_chunks} chunks processed "
+                f"({embedded} embedded, {len(stale_ids)} removed)"
+            )
 
         except Exception as e:
             logger.error(f"Error processing chunks for document {document_id}: {e}")
             document.status = 'failed'
             document.save(update_fields=['status'])
+            if raise_errors:
+                raise
             return f"Failed to process document {document_id}: {str(e)}"
 
     except Document.DoesNotExist:
         logger.error(f"Document with ID {document_id} not found")
+        if raise_errors:
+            raise
         return f"Document with ID {document_id} not found"
     except Exception as e:
         logger.error(f"Unexpected error processing document {document_id}: {e}")
@@ -225,4 +429,6 @@ def process_document(document_id):
             document.save(update_fields=['status'])
         except:
             pass
+        if raise_errors:
+            raise
         return f"Failed to process document {document_id}: {str(e)}"
@@ -0,0 +1,229 @@
+# documents/embedding_cache.py
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    """Collapse whitespace and case so trivially different questions share a key"""
+    return " ".join(text.split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache for query embeddings.
+
+    A per-process LRU (bounded by ``max_entries``) answers repeated questions
+    without any I/O; an optional Redis tier shares embeddings between workers.
+    Keys include the model and dimension, so switching models never returns a
+    stale vector. Both tiers expire entries after ``ttl_seconds``.
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=3600, redis_url=None, key_prefix="qemb"):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.2)
+            except Exception as e:
+                logger.warning(f"Embedding cache: Redis tier disabled: {e}")
+
+    @classmethod
+    def from_config(cls):
+        """Build the cache from environment settings; returns None when disabled"""
+        max_entries = config('EMBEDDING_CACHE_SIZE', default=2048, cast=int)
+        if max_entries <= 0:
+            return None
+        return cls(
+            max_entries=max_entries,
+            ttl_seconds=config('EMBEDDING_CACHE_TTL', default=3600, cast=int),
+            redis_url=config('EMBEDDING_CACHE_REDIS_URL', default='') or None,
+        )
+
+    def make_key(self, model, dimension, text):
+        digest = hashlib.sha256(normalize_query(text).encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}:{model}:{dimension}:{digest}"
+
+    def get(self, model, dimension, text):
+        """Return the cached embedding (float32 array) or None"""
+        key = self.make_key(model, dimension, text)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                embedding, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(key)
+            except Exception as e:
+                logger.warning(f"Embedding cache: Redis get failed: {e}")
+                raw = None
+            if raw is not None:
+                embedding = np.frombuffer(raw, dtype=np.float32)
+                self._store_local(key, embedding, now)
+                with self._lock:
+                    self.redis_hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store_local(self, key, embedding, now):
+        with self._lock:
+            self._entries[key] = (embedding, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, model, dimension, text, embedding):
+        key = self.make_key(model, dimension, text)
+        self._store_local(key, embedding, time.monotonic())
+
+        if self._redis is not None:
+            try:
+                self._redis.setex(key, self.ttl_seconds, np.asarray(embedding, dtype=np.float32).tobytes())
+            except Exception as e:
+                logger.warning(f"Embedding cache: Redis set failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+                "redis_enabled": self._redis is not None,
+            }
+
+
+def content_hash(text):
+    """sha256 of the exact chunk text (no normalization: passages embed as-is)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class PersistentEmbeddingCache:
+    """Database-backed cache of passage embeddings keyed by (model, sha256 of text).
+
+    Lookups and write-backs are done in bulk so a document costs a handful of
+    queries regardless of its size. ``prune`` keeps the table under a row limit
+    by dropping the least recently used entries.
+    """
+
+    lookup_batch_size = 500
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        """Build the cache from environment settings; returns None when disabled"""
+        if not config('EMBEDDING_STORE_CACHE', default=True, cast=bool):
+            return None
+        return cls()
+
+    def get_many(self, model, hashes):
+        """Return ``{content_hash: embedding}`` (float32 arrays) for the hashes that are cached"""
+        from django.utils import timezone
+        from .models import EmbeddingCacheEntry
+
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), self.lookup_batch_size):
+            batch = unique[i:i + self.lookup_batch_size]
+            rows = EmbeddingCacheEntry.objects.filter(model=model, content_hash__in=batch).values_list(
+                'id', 'content_hash', 'embedding'
+            )
+            ids = []
+            for row_id, digest, embedding in rows:
+                found[digest] = embedding
+                ids.append(row_id)
+            if ids:
+                EmbeddingCacheEntry.objects.filter(id__in=ids).update(last_used_at=timezone.now())
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        """Store ``{content_hash: embedding}``; rows written concurrently by another worker win"""
+        from .models import EmbeddingCacheEntry
+        EmbeddingCacheEntry.objects.bulk_create(
+            [EmbeddingCacheEntry(model=model, content_hash=digest, embedding=embedding)
+             for digest, embedding in items.items()],
+            batch_size=self.lookup_batch_size,
+            ignore_conflicts=True
+        )
+
+    def prune(self, max_entries):
+        """Delete least recently used rows beyond ``max_entries``; returns the number deleted"""
+        from .models import EmbeddingCacheEntry
+        total = EmbeddingCacheEntry.objects.count()
+        excess = total - max_entries
+        if excess <= 0:
+            return 0
+        deleted = 0
+        while deleted < excess:
+            ids = list(EmbeddingCacheEntry.objects.order_by('last_used_at', 'id').values_list(
+                'id', flat=True
+            )[:min(excess - deleted, 5000)])
+            if not ids:
+                break
+            count, _ = EmbeddingCacheEntry.objects.filter(id__in=ids).delete()
+            deleted += count
+        logger.info(f"Pruned {deleted} embedding cache entries (limit {max_entries})")
+        return deleted
+
+    def stats(self):
+        from django.db.models import Count, Max, Min
+        from .models import EmbeddingCacheEntry
+        per_model = {
+            row['model']: {
+                'entries': row['entries'],
+                'oldest_use': row['oldest'].isoformat() if row['oldest'] else None,
+                'newest_use': row['newest'].isoformat() if row['newest'] else None,
+            }
+            for row in EmbeddingCacheEntry.objects.values('model').annotate(
+                entries=Count('id'), oldest=Min('last_used_at'), newest=Max('last_used_at')
+            )
+        }
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'models': per_model,
+                'entries': sum(model['entries'] for model in per_model.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
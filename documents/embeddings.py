@@ -0,0 +1,132 @@
+# documents/embeddings.py
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from decouple import config
+from .embedding_cache import QueryEmbeddingCache, PersistentEmbeddingCache, content_hash
+from .rate_limit import AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class PineconeEmbedder:
+    """Generates embeddings through Pinecone's hosted inference API.
+
+    Kept separate from the vector stores so every backend (Pinecone, local
+    NumPy index, ...) embeds text with the same model.
+    """
+
+    def __init__(self, pc=None, model="multilingual-e5-large", dimension=1024, query_cache=None,
+                 passage_cache=None):
+        if pc is None:
+            from pinecone import Pinecone
+            pc = Pinecone(api_key=config('PINECONE_API_KEY'))
+        self.pc = pc
+        self.model = model
+        self.dimension = dimension
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache.from_config()
+        self.passage_cache = passage_cache if passage_cache is not None else PersistentEmbeddingCache.from_config()
+        # multilingual-e5-large accepts at most 96 inputs per request
+        self.max_batch_inputs = config('EMBED_MAX_BATCH', default=96, cast=int)
+        self.max_batch_chars = config('EMBED_MAX_BATCH_CHARS', default=200000, cast=int)
+        self.limiter = AdaptiveLimiter(config('EMBED_CONCURRENCY', default=4, cast=int), name="Pinecone inference")
+
+    def _embed(self, texts):
+        """One embedding request as a float32 matrix (a row per text); callers go through ``self.limiter``"""
+        response = self.pc.inference.embed(
+            model=self.model,
+            inputs=texts,
+            parameters={"input_type": "passage", "truncate": "END"}
+        )
+        matrix = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, emb in enumerate(response):
+            matrix[i] = emb['values']
+        return matrix
+
+    def embed_query(self, text):
+        """Embed a single piece of text, going through the query cache when enabled"""
+        if self.query_cache is None:
+            return self.limiter.call(self._embed, [text])[0]
+
+        embedding = self.query_cache.get(self.model, self.dimension, text)
+        if embedding is None:
+            embedding = self.limiter.call(self._embed, [text])[0]
+            self.query_cache.set(self.model, self.dimension, text, embedding)
+        return embedding
+
+    def plan_batches(self, texts, batch_size=None):
+        """Split ``range(len(texts))`` into request-sized batches.
+
+        A batch holds at most ``batch_size`` (default: the model's
+        ``EMBED_MAX_BATCH`` input limit) texts and ``EMBED_MAX_BATCH_CHARS``
+        characters, so large chunks make for smaller requests.
+        """
+        max_inputs = batch_size or self.max_batch_inputs
+        batches, current, chars = [], [], 0
+        for i, text in enumerate(texts):
+            if current and (len(current) >= max_inputs or chars + len(text) > self.max_batch_chars):
+                batches.append(current)
+                current, chars = [], 0
+            current.append(i)
+            chars += len(text)
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_documents(self, texts, batch_size=None, on_batch=None):
+        """Embed many texts with concurrent, adaptively sized requests
+
+        Up to ``EMBED_CONCURRENCY`` requests run at once, fewer while the API
+        is returning 429s. Each distinct text is embedded once and, with the
+        persistent cache enabled, only texts whose (model, sha256) is not cached
+        are sent; new embeddings are written back batch by batch.
+
+        Returns a float32 matrix with a row per text. ``on_batch(indexes,
+        embeddings)`` is called from this thread with a matrix of the rows for
+        those positions of ``texts`` as soon as they are known, so callers can
+        start upserting while later batches are still in flight.
+        """
+        cache_key = f"{self.model}:{self.dimension}"
+        hashes = [content_hash(text) for text in texts]
+        cached = self.passage_cache.get_many(cache_key, hashes) if self.passage_cache is not None else {}
+
+        positions = {}
+        for i, digest in enumerate(hashes):
+            positions.setdefault(digest, []).append(i)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+
+        def emit(digests, vectors):
+            indexes = []
+            for digest, vector in zip(digests, vectors):
+                embeddings[positions[digest]] = vector
+                indexes.extend(positions[digest])
+            if on_batch is not None and indexes:
+                on_batch(indexes, embeddings[indexes])
+
+        emit(list(cached), list(cached.values()))
+
+        missing = [digest for digest in positions if digest not in cached]
+        missing_texts = [texts[positions[digest][0]] for digest in missing]
+        batches = self.plan_batches(missing_texts, batch_size)
+
+        if batches:
+            executor = ThreadPoolExecutor(max_workers=min(self.limiter.max_concurrency, len(batches)))
+            try:
+                futures = {
+                    executor.submit(self.limiter.call, self._embed, [missing_texts[i] for i in batch]): batch
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    digests = [missing[i] for i in futures[future]]
+                    matrix = future.result()
+                    if self.passage_cache is not None:
+                        self.passage_cache.put_many(cache_key, dict(zip(digests, matrix)))
+                    emit(digests, matrix)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        logger.info(
+            f"Embedded {len(missing)} of {len(texts)} chunks in {len(batches)} requests "
+            f"({len(texts) - len(missing)} cached or repeated)"
+        )
+        return embeddings
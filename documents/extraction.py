@@ -0,0 +1,162 @@
+# documents/extraction.py
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+TEXT_BLOCK_SIZE = 64 * 1024
+
+SUPPORTED_FILE_TYPES = ('pdf', 'txt', 'docx', 'doc')
+
+# Bump when extraction output changes so stale parsed artifacts are not reused
+EXTRACTION_VERSION = 1
+
+
+class Piece(NamedTuple):
+    """A run of document text; ``page`` is the 1-based page number (None when the format has no pages)"""
+    page: Optional[int]
+    text: str
+
+
+class ExtractedDocument:
+    """A file opened once: file-level metadata plus a lazy stream of text pieces.
+
+    Concatenating the pieces gives the document text, so consumers can chunk
+    it as it is parsed without holding the whole file in memory.
+    """
+
+    def __init__(self, metadata, pieces):
+        self.metadata = metadata
+        self._pieces = pieces
+
+    @classmethod
+    def from_parsed(cls, metadata, text, pages):
+        """Rebuild a document from ``extract_document``'s ``(metadata, text, pages)``"""
+        def pieces():
+            offset = 0
+            for page, length in pages:
+                yield Piece(page, text[offset:offset + length])
+                offset += length
+
+        return cls(metadata, pieces())
+
+    def pieces(self):
+        return self._pieces
+
+    def text(self):
+        return "".join(piece.text for piece in self._pieces)
+
+
+def _pdf_metadata(reader, file_path):
+    metadata = {}
+    try:
+        if reader.metadata:
+            for key, value in reader.metadata.items():
+                if key.startswith('/'):
+                    metadata[key[1:].lower()] = str(value)
+    except Exception as e:
+        logger.warning(f"Error reading PDF metadata from {file_path}: {e}")
+    metadata['page_count'] = len(reader.pages)
+    return metadata
+
+
+def _page_text(page):
+    return (page.extract_text() or "") + "\n"
+
+
+def extract_pdf_range(file_path, first, last):
+    """Text of pages ``[first, last)`` as one string plus each page's length.
+
+    Runs in parse pool workers; a single string pickles far faster than a
+    list of page strings.
+    """
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        texts = [_page_text(reader.pages[i]) for i in range(first, min(last, len(reader.pages)))]
+    return "".join(texts), [len(text) for text in texts]
+
+
+def open_pdf(file_path, pool=None):
+    """Open a PDF; with a ``ParsePool``, large files have their pages extracted on all cores"""
+    import PyPDF2
+    # Read from the open file rather than a path, which PyPDF2 loads into memory whole
+    file = open(file_path, 'rb')
+    try:
+        reader = PyPDF2.PdfReader(file)
+        metadata = _pdf_metadata(reader, file_path)
+    except Exception:
+        file.close()
+        raise
+
+    if pool is not None and pool.should_split(metadata['page_count']):
+        file.close()
+        return ExtractedDocument(metadata, pool.pdf_pieces(file_path, metadata['page_count']))
+
+    def pieces():
+        try:
+            for number, page in enumerate(reader.pages, start=1):
+                yield Piece(number, _page_text(page))
+        finally:
+            file.close()
+
+    return ExtractedDocument(metadata, pieces())
+
+
+def open_docx(file_path):
+    import docx
+    doc = docx.Document(file_path)
+
+    metadata = {'paragraph_count': len(doc.paragraphs)}
+    try:
+        core_props = doc.core_properties
+        metadata['author'] = core_props.author
+        metadata['created'] = str(core_props.created) if core_props.created else None
+        metadata['modified'] = str(core_props.modified) if core_props.modified else None
+    except Exception:
+        pass
+
+    def pieces():
+        for i, paragraph in enumerate(doc.paragraphs):
+            yield Piece(None, paragraph.text if i == 0 else "\n" + paragraph.text)
+
+    return ExtractedDocument(metadata, pieces())
+
+
+def open_text(file_path):
+    def pieces():
+        with open(file_path, 'r', encoding='utf-8') as file:
+            while True:
+                block = file.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield Piece(None, block)
+
+    return ExtractedDocument({}, pieces())
+
+
+def open_document(file_path, file_type, pool=None):
+    """Open a file for single-pass extraction"""
+    file_type = file_type.lower()
+    if file_type == 'txt':
+        return open_text(file_path)
+    elif file_type == 'pdf':
+        return open_pdf(file_path, pool=pool)
+    elif file_type in ['docx', 'doc']:
+        return open_docx(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def extract_document(file_path, file_type):
+    """Parse a whole file; returns ``(metadata, text, pages)`` where ``pages`` is a
+    list of ``(page, length)`` runs. Used by parse pool workers for batches."""
+    extracted = open_document(file_path, file_type)
+    parts, pages = [], []
+    for piece in extracted.pieces():
+        parts.append(piece.text)
+        if pages and pages[-1][0] == piece.page:
+            pages[-1] = (piece.page, pages[-1][1] + len(piece.text))
+        else:
+            pages.append((piece.page, len(piece.text)))
+    return extracted.metadata, "".join(parts), pages
@@ -0,0 +1,75 @@
+# documents/fields.py
+import struct
+import numpy as np
+from decouple import config
+from django.db import models
+
+# 8-byte header: storage dtype code, 3 pad bytes (keeps the data aligned), float32 scale
+_HEADER = struct.Struct('<B3xf')
+_DTYPES = {'float32': 1, 'float16': 2, 'int8': 3}
+_CODES = {1: np.float32, 2: np.float16, 3: np.int8}
+
+
+def encode_vector(vector, dtype='float32'):
+    """Pack a vector into bytes: float32 as is, float16, or int8 with a per-vector scale"""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == 'int8':
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        data = np.rint(vector / scale).astype(np.int8)
+    else:
+        data = vector.astype(np.dtype(dtype), copy=False)
+    return _HEADER.pack(_DTYPES[dtype], scale) + data.tobytes()
+
+
+def decode_vector(data):
+    """Unpack ``encode_vector`` output into a float32 array.
+
+    float32 vectors are a read-only view of ``data`` (no copy); float16 and
+    int8 ones are widened into a new array.
+    """
+    code, scale = _HEADER.unpack_from(data)
+    stored = np.frombuffer(data, dtype=_CODES[code], offset=_HEADER.size)
+    if code == 1:
+        return stored
+    vector = stored.astype(np.float32)
+    if scale != 1.0:
+        vector *= scale
+    return vector
+
+
+class EmbeddingField(models.BinaryField):
+    """An embedding stored as packed binary and read back as a NumPy float32 array.
+
+    Vectors are written as ``EMBEDDING_STORAGE_DTYPE`` (``float32``, or
+    ``float16`` / ``int8`` to quantize); the dtype is recorded per value, so
+    changing the setting never breaks rows already stored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage_dtype = config('EMBEDDING_STORAGE_DTYPE', default='float32')
+        if self.storage_dtype not in _DTYPES:
+            raise ValueError(f"EMBEDDING_STORAGE_DTYPE must be one of {', '.join(_DTYPES)}")
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decode_vector(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decode_vector(value)
+        return np.asarray(value, dtype=np.float32)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is not None and not isinstance(value, (bytes, bytearray, memoryview)):
+            value = encode_vector(value, self.storage_dtype)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return None if value is None else value.tolist()
@@ -0,0 +1,166 @@
+# documents/ingestion_queue.py
+import itertools
+import logging
+import random
+import traceback
+from datetime import timedelta
+from decouple import config
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from .models import Document, IngestionFailure
+
+logger = logging.getLogger(__name__)
+
+# Errors that will not go away by trying again; these are dead-lettered at once
+PERMANENT_ERRORS = (ValueError, FileNotFoundError, ObjectDoesNotExist)
+
+
+def _settings():
+    return {
+        'max_in_flight': config('INGESTION_MAX_IN_FLIGHT', default=config('CELERY_WORKER_CONCURRENCY', default=4, cast=int), cast=int),
+        'max_per_user': config('INGESTION_MAX_PER_USER', default=2, cast=int),
+        'max_attempts': config('INGESTION_MAX_ATTEMPTS', default=5, cast=int),
+        'retry_base': config('INGESTION_RETRY_BASE_SECONDS', default=30, cast=int),
+        'retry_max': config('INGESTION_RETRY_MAX_SECONDS', default=3600, cast=int),
+        'stale_seconds': config('INGESTION_STALE_SECONDS', default=7200, cast=int),
+    }
+
+
+def request_dispatch(countdown=None):
+    """Ask a worker to run the dispatcher; the periodic beat entry covers a lost request"""
+    from .tasks import dispatch_ingestion
+    try:
+        dispatch_ingestion.apply_async(countdown=countdown)
+    except Exception as e:
+        logger.warning(f"Could not request an ingestion dispatch: {e}")
+
+
+def enqueue_documents(document_ids):
+    """Queue documents for background processing; returns how many were queued.
+
+    Documents already queued or being processed are left alone.
+    """
+    count = Document.objects.filter(id__in=document_ids).exclude(status__in=['queued', 'processing']).update(
+        status='queued', queued_at=timezone.now(), next_attempt_at=None, ingestion_attempts=0
+    )
+    if count:
+        transaction.on_commit(request_dispatch)
+    return count
+
+
+def heartbeat(document_id):
+    """Mark a running ingestion as alive, so ``reclaim_stale`` leaves it alone"""
+    Document.objects.filter(id=document_id, status='processing').update(started_at=timezone.now())
+
+
+def reclaim_stale(now=None):
+    """Requeue documents whose worker vanished mid-run (they hold a slot forever otherwise)
+
+    ``started_at`` is refreshed as a heartbeat while a document is processed;
+    rows without one fall back to ``updated_at``.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=_settings()['stale_seconds'])
+    stale = Q(started_at__lt=cutoff) | Q(started_at__isnull=True, updated_at__lt=cutoff)
+    count = Document.objects.filter(stale, status='processing').update(
+        status='queued', next_attempt_at=None
+    )
+    if count:
+        logger.warning(f"Requeued {count} documents stuck in processing since before {cutoff}")
+    return count
+
+
+def dispatch():
+    """Claim ready documents and hand them to workers; returns the dispatched ids.
+
+    Scheduling is fair per user: at most ``INGESTION_MAX_PER_USER`` documents
+    of one user run at a time, the least busy users go first, and free slots
+    are filled round-robin across users, oldest queued document first. A user
+    with a thousand queued files therefore gets the same share as a user with one.
+    """
+    from .tasks import process_document_task
+
+    settings = _settings()
+    now = timezone.now()
+    reclaim_stale(now)
+
+    running = dict(
+        Document.objects.filter(status='processing').values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+    )
+    free = settings['max_in_flight'] - sum(running.values())
+    if free <= 0:
+        return []
+
+    ready = Document.objects.filter(status='queued').filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+    users = ready.values('user_id').annotate(oldest=Min('queued_at')).values_list('user_id', 'oldest')
+    users = sorted(users, key=lambda row: (running.get(row[0], 0), row[1] or now))
+
+    # Every user gets at least one slot per round, so only the first ``free`` users can be served
+    per_user = []
+    for user_id, _ in users:
+        slots = min(settings['max_per_user'] - running.get(user_id, 0), free)
+        if slots <= 0:
+            continue
+        per_user.append(list(ready.filter(user_id=user_id).order_by('queued_at', 'id').values_list('id', flat=True)[:slots]))
+        if len(per_user) >= free:
+            break
+
+    picked = [document_id for batch in itertools.zip_longest(*per_user) for document_id in batch if document_id is not None]
+
+    dispatched = []
+    for document_id in picked[:free]:
+        # Conditional update so concurrent dispatchers never claim the same document
+        claimed = Document.objects.filter(id=document_id, status='queued').update(
+            status='processing', started_at=timezone.now(), ingestion_attempts=F('ingestion_attempts') + 1
+        )
+        if not claimed:
+            continue
+        try:
+            process_document_task.delay(document_id)
+        except Exception as e:
+            logger.error(f"Could not send document {document_id} to the ingestion queue: {e}")
+            Document.objects.filter(id=document_id).update(status='queued', ingestion_attempts=F('ingestion_attempts') - 1)
+            break
+        dispatched.append(document_id)
+
+    if dispatched:
+        logger.info(f"Dispatched {len(dispatched)} documents for ingestion ({free} slots were free)")
+    return dispatched
+
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter, capped at ``INGESTION_RETRY_MAX_SECONDS``"""
+    settings = _settings()
+    delay = min(settings['retry_max'], settings['retry_base'] * 2 ** max(attempt - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def record_failure(document_id, exc, task_id=''):
+    """Schedule a retry, or dead-letter the document; returns True when dead-lettered"""
+    document = Document.objects.filter(id=document_id).first()
+    if document is None:
+        return True
+
+    attempts = document.ingestion_attempts
+    if not isinstance(exc, PERMANENT_ERRORS) and attempts < _settings()['max_attempts']:
+        delay = retry_delay(attempts)
+        document.status = 'queued'
+        document.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        document.save(update_fields=['status', 'next_attempt_at'])
+        logger.warning(f"Ingestion of document {document_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {exc}")
+        request_dispatch(countdown=delay)
+        return False
+
+    document.status = 'failed'
+    document.save(update_fields=['status'])
+    IngestionFailure.objects.create(
+        document=document,
+        task_id=task_id or '',
+        attempts=attempts,
+        error=f"{type(exc).__name__}: {exc}",
+        traceback="".join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+    )
+    logger.error(f"Ingestion of document {document_id} dead-lettered after {attempts} attempts: {exc}")
+    return True
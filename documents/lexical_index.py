@@ -0,0 +1,223 @@
+# documents/lexical_index.py
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+import numpy as np
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers such as "ERR-1042", "v2.3.1" or "part_no/77" as single tokens
+TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def is_identifier(token):
+    """Tokens that look like codes ("err-1042", "v2.3.1"): letters mixed with digits.
+
+    Plain numbers ("2024") and hyphenated words ("e-mail") are not identifiers.
+    """
+    return any(ch.isdigit() for ch in token) and any(ch.isalpha() for ch in token)
+
+
+class BM25Index:
+    """Okapi BM25 inverted index with array-backed postings.
+
+    Each term maps to two parallel ``array`` buffers (document slot, term
+    frequency) that are viewed as NumPy arrays without copying at query time.
+    Documents are appended to slots; deletes only clear an ``alive`` flag and
+    the index is rebuilt from the live slots once too many are dead.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> (array('q') slots, array('q') term frequencies)
+        self.documents = {}  # document id -> set of chunk ids
+        self.chunk_documents = {}  # chunk id -> document id
+        self.chunk_ids = array('q')
+        self.lengths = array('q')
+        self.alive = bytearray()
+        self.slots = {}  # chunk id -> slot
+        self.live_count = 0
+        self.live_length = 0
+        self.lock = threading.RLock()
+
+    def add(self, chunk_id, text, document_id=None):
+        with self.lock:
+            if chunk_id in self.slots:
+                self.remove(chunk_id)
+            self.documents.setdefault(document_id, set()).add(chunk_id)
+            self.chunk_documents[chunk_id] = document_id
+            tokens = tokenize(text)
+            slot = len(self.chunk_ids)
+            self.chunk_ids.append(chunk_id)
+            self.lengths.append(len(tokens))
+            self.alive.append(1)
+            self.slots[chunk_id] = slot
+            self.live_count += 1
+            self.live_length += len(tokens)
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                entry = self.postings.get(token)
+                if entry is None:
+                    entry = (array('q'), array('q'))
+                    self.postings[token] = entry
+                entry[0].append(slot)
+                entry[1].append(count)
+
+    def remove(self, chunk_id):
+        with self.lock:
+            slot = self.slots.pop(chunk_id, None)
+            if slot is None:
+                return False
+            document_id = self.chunk_documents.pop(chunk_id, None)
+            self.documents.get(document_id, set()).discard(chunk_id)
+            self.alive[slot] = 0
+            self.live_count -= 1
+            self.live_length -= self.lengths[slot]
+            return True
+
+    @property
+    def dead_ratio(self):
+        total = len(self.chunk_ids)
+        return (total - self.live_count) / total if total else 0.0
+
+    def search(self, query, top_k=5):
+        """Return ``[(chunk_id, score)]`` for the best ``top_k`` live chunks"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self.lock:
+            if not terms or self.live_count == 0:
+                return []
+
+            total_slots = len(self.chunk_ids)
+            lengths = np.frombuffer(self.lengths, dtype=np.int64)
+            alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+            avg_length = self.live_length / self.live_count or 1.0
+            norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+
+            scores = np.zeros(total_slots, dtype=np.float64)
+            for term in terms:
+                entry = self.postings.get(term)
+                if entry is None:
+                    continue
+                slots = np.frombuffer(entry[0], dtype=np.int64)
+                freqs = np.frombuffer(entry[1], dtype=np.int64)
+                live = alive[slots]
+                slots, freqs = slots[live], freqs[live]
+                df = len(slots)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (self.live_count - df + 0.5) / (df + 0.5))
+                scores[slots] += idf * freqs * (self.k1 + 1) / (freqs + norm[slots])
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) == 0:
+                return []
+            k = min(top_k, len(candidates))
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [(int(self.chunk_ids[slot]), float(scores[slot])) for slot in top]
+
+
+class LexicalIndex:
+    """Per-namespace BM25 indexes over ``DocumentChunk.content``.
+
+    Namespaces match the vector stores (``user_{id}`` / ``global``). Each is
+    built lazily from the database, updated incrementally when this process
+    handles ``document_chunks_changed``, and rebuilt when the database count or
+    highest chunk id changes (checked at most every ``LEXICAL_INDEX_REFRESH_SECONDS``)
+    so ingestion in other processes is picked up.
+    """
+
+    def __init__(self):
+        self.refresh_seconds = config('LEXICAL_INDEX_REFRESH_SECONDS', default=300, cast=int)
+        self._namespaces = {}
+        self._checked_at = {}
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    def _get_user_namespace(self, user_id=None):
+        if user_id:
+            return f"user_{user_id}"
+        return "global"
+
+    def _namespace_queryset(self, namespace):
+        from .models import DocumentChunk
+        queryset = DocumentChunk.objects.all()
+        if namespace.startswith("user_"):
+            queryset = queryset.filter(document__user_id=int(namespace[len("user_"):]))
+        return queryset
+
+    def _db_signature(self, namespace):
+        from django.db.models import Count, Max
+        stats = self._namespace_queryset(namespace).aggregate(count=Count('id'), max_id=Max('id'))
+        return stats['count'], stats['max_id']
+
+    def _build(self, namespace):
+        started = time.monotonic()
+        signature = self._db_signature(namespace)
+        index = BM25Index()
+        for chunk_id, document_id, content in self._namespace_queryset(namespace).values_list(
+                'id', 'document_id', 'content').iterator(chunk_size=2000):
+            index.add(chunk_id, content, document_id=document_id)
+        logger.info(
+            f"Built BM25 index for {namespace}: {index.live_count} chunks, "
+            f"{len(index.postings)} terms in {time.monotonic() - started:.2f}s"
+        )
+        return index, signature
+
+    def get_namespace(self, namespace):
+        now = time.monotonic()
+        index = self._namespaces.get(namespace)
+        if index is not None and now - self._checked_at.get(namespace, 0) < self.refresh_seconds:
+            return index
+
+        with self._lock:
+            index = self._namespaces.get(namespace)
+            if index is not None and now - self._checked_at.get(namespace, 0) < self.refresh_seconds:
+                return index
+            signature = self._db_signature(namespace)
+            if index is None or index.dead_ratio > 0.25 or signature != self._signatures.get(namespace):
+                index, signature = self._build(namespace)
+                self._namespaces[namespace] = index
+                self._signatures[namespace] = signature
+            self._checked_at[namespace] = now
+            return index
+
+    def sync_document(self, document_id, user_id=None):
+        """Replace a document's chunks in every loaded namespace it belongs to"""
+        from .models import DocumentChunk
+        rows = list(DocumentChunk.objects.filter(document_id=document_id).values_list('id', 'content'))
+        namespaces = ["global"] + ([self._get_user_namespace(user_id)] if user_id else [])
+
+        for namespace in namespaces:
+            index = self._namespaces.get(namespace)
+            if index is None:
+                continue  # built from the database on first use
+            with index.lock:
+                current = {chunk_id for chunk_id, _ in rows}
+                for chunk_id in list(index.documents.get(document_id, ())):
+                    if chunk_id not in current:
+                        index.remove(chunk_id)
+                for chunk_id, content in rows:
+                    index.add(chunk_id, content, document_id=document_id)
+            with self._lock:
+                self._signatures[namespace] = self._db_signature(namespace)
+
+    def on_document_changed(self, sender, document_id, user_id=None, **kwargs):
+        """Receiver for the ``document_chunks_changed`` signal"""
+        self.sync_document(document_id, user_id=user_id)
+
+    def search(self, query, top_k=5, user_id=None):
+        """Return ``[(chunk_id, score)]`` from the namespace's BM25 index"""
+        return self.get_namespace(self._get_user_namespace(user_id)).search(query, top_k)
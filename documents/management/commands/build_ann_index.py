@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from documents.ann_vector_store import AnnVectorStore
+from documents.models import Document
+
+
+class Command(BaseCommand):
+    help = "Build or compact the local ANN (IVF) vector indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--namespace', action='append', default=[],
+                            help="Namespace to rebuild (user_<id> or global); repeatable")
+        parser.add_argument('--all', action='store_true',
+                            help="Rebuild global and every user namespace")
+        parser.add_argument('--nlist', type=int, default=None,
+                            help="Number of IVF lists (default: 4 * sqrt(vectors))")
+        parser.add_argument('--compact', action='store_true',
+                            help="Only compact namespaces whose delta/tombstone logs have grown")
+        parser.add_argument('--ratio', type=float, default=None,
+                            help="Compaction threshold relative to base size (default: ANN_COMPACT_RATIO)")
+
+    def handle(self, *args, **options):
+        store = AnnVectorStore()
+
+        if options['compact']:
+            compacted = store.compact(ratio=options['ratio'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Compacted {len(compacted)} namespace(s): {', '.join(compacted) or 'none'}"
+            ))
+            return
+
+        namespaces = list(options['namespace'])
+        if options['all']:
+            user_ids = Document.objects.values_list('user_id', flat=True).distinct()
+            namespaces = ['global'] + [f"user_{user_id}" for user_id in user_ids]
+        if not namespaces:
+            raise CommandError("Pass --namespace, --all or --compact")
+
+        for namespace in namespaces:
+            generation = store.build_namespace(namespace, nlist=options['nlist'])
+            stats = store.get_index(namespace).stats()
+            self.stdout.write(self.style.SUCCESS(
+                f"{namespace}: {generation} with {stats['base_count']} vectors in {stats['nlist']} lists"
+            ))
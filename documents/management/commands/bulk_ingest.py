@@ -0,0 +1,270 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from documents.artifacts import file_sha256
+from documents.document_processor import process_document
+from documents.extraction import SUPPORTED_FILE_TYPES, ExtractedDocument
+from documents.ingestion_queue import enqueue_documents
+from documents.models import Document
+from documents.services import get_artifact_store, get_page_ocr, get_parse_pool
+
+# Checkpoint states that are never redone on resume (failed ones are, with --retry-failed)
+DONE_STATES = ('completed', 'duplicate')
+# Handed to Celery with --enqueue: on resume the document's own status decides
+ENQUEUED = 'enqueued'
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class Command(BaseCommand):
+    help = "Ingest a directory tree or manifest of files, resuming from a checkpoint after interruptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Files or directories to ingest (directories are walked)")
+        parser.add_argument('--manifest',
+                            help="File listing one path per line, or JSON lines with 'path' and optional 'title'")
+        parser.add_argument('--user', required=True, help="Owner of the documents (email, username or id)")
+        parser.add_argument('--checkpoint', default='bulk_ingest.checkpoint.jsonl',
+                            help="Progress log; rerunning with the same file skips what is already done")
+        parser.add_argument('--batch-size', type=int, default=100, help="Documents created and parsed per batch")
+        parser.add_argument('--workers', type=int, default=config('BULK_INGEST_WORKERS', default=4, cast=int),
+                            help="Documents embedded and upserted in parallel (default: BULK_INGEST_WORKERS)")
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Only create, parse and queue documents; Celery workers embed them")
+        parser.add_argument('--retry-failed', action='store_true', help="Redo files the checkpoint marks failed")
+
+    def handle(self, *args, **options):
+        if not options['paths'] and not options['manifest']:
+            raise CommandError("Pass paths to ingest or --manifest")
+        self.user = self._get_user(options['user'])
+        self.options = options
+        # content hash -> document id of every file this run has taken on, so a
+        # second copy is recorded as a duplicate instead of being processed concurrently
+        self.claimed = {}
+
+        done = self._read_checkpoint(options['checkpoint'], options['retry_failed'])
+        sources = [(path, title) for path, title in self._iter_sources(options) if path not in done]
+        skipped = len(done)
+        self.stdout.write(f"{len(sources)} files to ingest ({skipped} already done per {options['checkpoint']})")
+        if not sources:
+            return
+
+        batches = [sources[i:i + options['batch_size']] for i in range(0, len(sources), options['batch_size'])]
+        stats = {'files': 0, 'chunks': 0, 'failed': 0, 'duplicates': 0}
+        started = time.monotonic()
+
+        # Create and parse the next batch while the current one is embedded
+        with open(options['checkpoint'], 'a') as checkpoint, \
+                ThreadPoolExecutor(1) as preparer, ThreadPoolExecutor(options['workers']) as workers:
+            pending = preparer.submit(self._prepare, batches[0])
+            try:
+                for number in range(len(batches)):
+                    prepared = pending.result()
+                    if number + 1 < len(batches):
+                        pending = preparer.submit(self._prepare, batches[number + 1])
+                    records = self._ingest(prepared, workers)
+
+                    for record in records:
+                        checkpoint.write(json.dumps(record) + "\n")
+                        stats['files'] += 1
+                        stats['chunks'] += record.get('chunks', 0)
+                        stats['failed'] += record['status'] == 'failed'
+                        stats['duplicates'] += record['status'] == 'duplicate'
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+                    self._report(stats, len(sources), started)
+            except KeyboardInterrupt:
+                pending.cancel()
+                self.stdout.write(self.style.WARNING(
+                    f"Interrupted after {stats['files']} files; rerun the same command to resume"
+                ))
+                return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {stats['files']} files ({stats['chunks']} chunks, {stats['duplicates']} duplicates, "
+            f"{stats['failed']} failed) in {_format_duration(time.monotonic() - started)}"
+        ))
+
+    def _get_user(self, value):
+        User = get_user_model()
+        lookup = {'id': int(value)} if value.isdigit() else {'email': value} if '@' in value else {'username': value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"User {value} not found")
+
+    def _read_checkpoint(self, path, retry_failed):
+        latest = {}
+        if not os.path.exists(path):
+            return set()
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line torn by a crash mid-write
+                latest[record['path']] = record
+
+        # Queued documents are done once their task completed, or while it is still pending
+        enqueued = [record['document_id'] for record in latest.values() if record.get('status') == ENQUEUED]
+        statuses = dict(Document.objects.filter(id__in=enqueued).values_list('id', 'status'))
+        failed_tasks = 0
+        done = set()
+        for path, record in latest.items():
+            status = record.get('status')
+            if status == ENQUEUED:
+                document_status = statuses.get(record['document_id'])
+                if document_status is None:
+                    status = None  # deleted since: ingest it again
+                elif document_status in ('completed', 'failed'):
+                    status = document_status
+                failed_tasks += status == 'failed'
+            if status in DONE_STATES or status == ENQUEUED or (status == 'failed' and not retry_failed):
+                done.add(path)
+        if failed_tasks and not retry_failed:
+            self.stdout.write(f"{failed_tasks} queued documents failed in Celery; rerun with --retry-failed to redo them")
+        return done
+
+    def _iter_sources(self, options):
+        """``(absolute path, title)`` of every supported file, in a stable order"""
+        if options['manifest']:
+            with open(options['manifest']) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    if line.startswith('{'):
+                        entry = json.loads(line)
+                        yield os.path.abspath(entry['path']), entry.get('title')
+                    else:
+                        yield os.path.abspath(line), None
+
+        for path in options['paths']:
+            if not os.path.isdir(path):
+                yield os.path.abspath(path), None
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.rsplit('.', 1)[-1].lower() in SUPPORTED_FILE_TYPES:
+                        yield os.path.abspath(os.path.join(root, name)), None
+
+    def _prepare(self, batch):
+        """Create the batch's documents and parse them into artifacts; returns ``(record, document)`` pairs"""
+        try:
+            prepared = []
+            for path, title in batch:
+                record = {'path': path}
+                try:
+                    prepared.append((record, self._create_document(path, title, record)))
+                except Exception as e:
+                    record.update(status='failed', error=f"{type(e).__name__}: {e}")
+                    prepared.append((record, None))
+            self._parse([document for record, document in prepared if document is not None and 'status' not in record])
+            return prepared
+        finally:
+            connection.close()
+
+    def _create_document(self, path, title, record):
+        file_type = path.rsplit('.', 1)[-1].lower()
+        if file_type not in SUPPORTED_FILE_TYPES:
+            raise ValueError(f"Unsupported file type: {file_type}")
+
+        with open(path, 'rb') as f:
+            digest = file_sha256(f)
+            if digest in self.claimed:
+                # Another copy in this run: processing both would race on the same document
+                record.update(status='duplicate', document_id=self.claimed[digest])
+                return None
+            # The same file from an earlier, interrupted run is not created again
+            document = Document.objects.filter(user=self.user, content_hash=digest).order_by('id').first()
+            if document is None:
+                document = Document(user=self.user, title=title or os.path.basename(path),
+                                    file_type=file_type, content_hash=digest)
+                document.file.save(os.path.basename(path), File(f), save=False)
+                document.save()
+            elif document.status in ('completed', 'queued'):
+                record.update(status='duplicate', document_id=document.id)
+        self.claimed[digest] = document.id
+        record['document_id'] = document.id
+        return document
+
+    def _parse(self, documents):
+        """Parse documents on the parse pool and store their artifacts, so ingestion replays them"""
+        artifacts = get_artifact_store()
+        if artifacts is None:
+            return
+        todo = {}
+        for document in documents:
+            if not artifacts.exists(document.content_hash):
+                todo.setdefault(document.content_hash, document)
+        if not todo:
+            return
+
+        pool = get_parse_pool()
+        ocr = get_page_ocr()
+        items = [(digest, document.file.path, document.file_type) for digest, document in todo.items()]
+        parse_items = pool.parse_documents(items) if pool is not None else self._parse_inline(items)
+        for digest, result, error in parse_items:
+            if error is not None:
+                continue  # ingestion parses it again and records the error
+            document = todo[digest]
+            extracted = ExtractedDocument.from_parsed(*result)
+            if ocr is not None and document.file_type == 'pdf':
+                extracted = ocr.apply(extracted, document.file.path, digest, pool=pool)
+            for _ in artifacts.record(digest, extracted).pieces():
+                pass
+
+    def _parse_inline(self, items):
+        from documents.extraction import extract_document
+        for key, file_path, file_type in items:
+            try:
+                yield key, extract_document(file_path, file_type), None
+            except Exception as e:
+                yield key, None, e
+
+    def _ingest(self, prepared, workers):
+        """Embed and upsert the batch's documents (or queue them); returns checkpoint records"""
+        ready = [(record, document) for record, document in prepared if 'status' not in record]
+
+        if self.options['enqueue']:
+            enqueue_documents([document.id for record, document in ready])
+            for record, document in ready:
+                record['status'] = ENQUEUED
+            return [record for record, document in prepared]
+
+        def run(item):
+            record, document = item
+            try:
+                message = process_document(document.id)
+                document.refresh_from_db(fields=['status', 'total_chunks'])
+                record['status'] = 'completed' if document.status == 'completed' else 'failed'
+                if document.status == 'completed':
+                    record['chunks'] = document.total_chunks
+                else:
+                    record['error'] = message
+            finally:
+                connection.close()
+            return record
+
+        list(workers.map(run, ready))
+        return [record for record, document in prepared]
+
+    def _report(self, stats, total, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        files_rate = stats['files'] / elapsed
+        eta = (total - stats['files']) / files_rate if files_rate else 0
+        self.stdout.write(
+            f"[{stats['files']}/{total}] {files_rate:.1f} files/s, {stats['chunks'] / elapsed:.1f} chunks/s, "
+            f"{stats['failed']} failed, ETA {_format_duration(eta)}"
+        )
@@ -0,0 +1,25 @@
+import json
+from django.core.management.base import BaseCommand
+from decouple import config
+from documents.embedding_cache import PersistentEmbeddingCache
+
+
+class Command(BaseCommand):
+    help = "Show stats for, or prune, the persistent embedding cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help="Delete least recently used entries beyond --max-entries")
+        parser.add_argument('--max-entries', type=int,
+                            default=config('EMBEDDING_CACHE_MAX_ROWS', default=500000, cast=int),
+                            help="Row limit used by --prune (default: EMBEDDING_CACHE_MAX_ROWS)")
+
+    def handle(self, *args, **options):
+        cache = PersistentEmbeddingCache()
+
+        if options['prune']:
+            deleted = cache.prune(options['max_entries'])
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} entries"))
+
+        stats = cache.stats()
+        self.stdout.write(json.dumps({'entries': stats['entries'], 'models': stats['models']}, indent=2))
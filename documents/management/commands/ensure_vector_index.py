@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from documents.pinecone_vector_store import PineconeVectorStore
+
+
+class Command(BaseCommand):
+    help = "Create the Pinecone index if it does not exist (run once per deploy)"
+
+    def handle(self, *args, **options):
+        try:
+            store = PineconeVectorStore(ensure_index=True)
+            stats = store.health_check()
+        except Exception as e:
+            raise CommandError(f"Could not ensure index exists: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Index '{store.index_name}' is ready ({stats.get('total_vector_count', 0)} vectors)"
+        ))
@@ -0,0 +1,23 @@
+import json
+from django.core.management.base import BaseCommand
+from documents import vector_gc
+
+
+class Command(BaseCommand):
+    help = "Flush the vector deletion outbox and purge vectors whose chunks no longer exist"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--namespace', action='append', default=[],
+                            help="Namespace to reconcile (user_<id> or global); repeatable, default all")
+        parser.add_argument('--dry-run', action='store_true', help="Only count orphan vectors")
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            flushed = vector_gc.flush()
+            self.stdout.write(f"Flushed {flushed} queued deletions")
+
+        report = vector_gc.reconcile(namespaces=options['namespace'] or None, dry_run=options['dry_run'])
+        self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Found' if options['dry_run'] else 'Deleted'} {sum(report.values())} orphan vectors"
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.19 on 2026-10-18 11:38
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    DocumentChunk = apps.get_model('documents', 'DocumentChunk')
+    batch = []
+    for chunk in DocumentChunk.objects.only('id', 'content').iterator(chunk_size=1000):
+        chunk.content_hash = hashlib.sha256(chunk.content.encode('utf-8')).hexdigest()
+        batch.append(chunk)
+        if len(batch) >= 1000:
+            DocumentChunk.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        DocumentChunk.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_embeddingcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
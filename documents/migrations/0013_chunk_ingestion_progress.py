@@ -0,0 +1,29 @@
+# Generated by Django 4.2.19 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+def backfill_indexed_namespaces(apps, schema_editor):
+    # Chunks with an embedding were upserted to their owner's namespace and the global one
+    Document = apps.get_model('documents', 'Document')
+    DocumentChunk = apps.get_model('documents', 'DocumentChunk')
+    for document_id, user_id in Document.objects.values_list('id', 'user_id').iterator():
+        DocumentChunk.objects.filter(document_id=document_id, embedding__isnull=False).update(
+            indexed_namespaces=[f"user_{user_id}", "global"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='indexed_namespaces',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_indexed_namespaces, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.19 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import documents.fields
+
+BATCH_SIZE = 1000
+
+
+def _convert(model, source, target, convert):
+    last_id = 0
+    while True:
+        rows = list(model.objects.filter(id__gt=last_id).exclude(**{f"{source}__isnull": True})
+                    .only('id', source).order_by('id')[:BATCH_SIZE])
+        if not rows:
+            break
+        for row in rows:
+            setattr(row, target, convert(getattr(row, source)))
+        model.objects.bulk_update(rows, [target])
+        last_id = rows[-1].id
+
+
+def pack_embeddings(apps, schema_editor):
+    # EmbeddingField encodes lists on save (as EMBEDDING_STORAGE_DTYPE)
+    for name in ('DocumentChunk', 'EmbeddingCacheEntry'):
+        _convert(apps.get_model('documents', name), 'embedding', 'embedding_packed', lambda value: value)
+
+
+def unpack_embeddings(apps, schema_editor):
+    for name in ('DocumentChunk', 'EmbeddingCacheEntry'):
+        _convert(apps.get_model('documents', name), 'embedding_packed', 'embedding', lambda value: value.tolist())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0014_vector_deletion_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_packed',
+            field=documents.fields.EmbeddingField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='embeddingcacheentry',
+            name='embedding_packed',
+            field=documents.fields.EmbeddingField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='embeddingcacheentry',
+            name='embedding',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(pack_embeddings, unpack_embeddings),
+    ]
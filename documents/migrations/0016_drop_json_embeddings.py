@@ -0,0 +1,38 @@
+# Generated by Django 4.2.19 on 2026-10-18 15:20
+
+from django.db import migrations
+import documents.fields
+
+
+class Migration(migrations.Migration):
+    # Separate from 0015 so the schema changes do not run in the data migration's transaction
+
+    dependencies = [
+        ('documents', '0015_pack_embeddings'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='documentchunk',
+            name='embedding',
+        ),
+        migrations.RemoveField(
+            model_name='embeddingcacheentry',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='documentchunk',
+            old_name='embedding_packed',
+            new_name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='embeddingcacheentry',
+            old_name='embedding_packed',
+            new_name='embedding',
+        ),
+        migrations.AlterField(
+            model_name='embeddingcacheentry',
+            name='embedding',
+            field=documents.fields.EmbeddingField(),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from accounts.models import User
 import os
 import uuid
+from .fields import EmbeddingField
 
 
 def document_upload_path(instance, filename):
@@ -14,6 +15,7 @@ def document_upload_path(instance, filename):
 class Document(models.Model):
     PROCESSING_STATUS = (
         ('pending', 'Pending'),
+        ('queued', 'Queued'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
@@ -22,6 +24,7 @@ class Document(models.Model):
     title = models.CharField(max_length=255)
     file = models.FileField(upload_to=document_upload_path)
     file_type = models.CharField(max_length=50)  # pdf, txt, docx, etc.
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of the file
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     status = models.CharField(max_length=20, choices=PROCESSING_STATUS, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -30,20 +33,112 @@ class Document(models.Model):
     # Metadata
     total_chunks = models.IntegerField(default=0)
 
+    # Ingestion queue bookkeeping (see documents/ingestion_queue.py)
+    queued_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    ingestion_attempts = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.title
 
 
+class UploadSession(models.Model):
+    """A resumable chunked upload; becomes a Document once all bytes arrive (see documents/uploads.py)"""
+    UPLOAD_STATUS = (
+        ('uploading', 'Uploading'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=50)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)  # bytes received and durably written
+    checksum = models.CharField(max_length=64, blank=True)  # expected sha256, if the client sent one
+    status = models.CharField(max_length=20, choices=UPLOAD_STATUS, default='uploading')
+    document = models.OneToOneField(
+        Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class DocumentChunkManager(models.Manager):
+    """Leaves the embedding out of queries; load it with ``values_list('embedding')`` or ``defer(None)``"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('embedding')
+
+
 class DocumentChunk(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
     content = models.TextField()
     chunk_index = models.IntegerField()
-    embedding = models.JSONField(null=True, blank=True)  # Store embedding as JSON
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of content
+    embedding = EmbeddingField(null=True, blank=True)  # Packed float32 (or quantized), read as a NumPy array
+    # Vector store namespaces holding this embedding with current metadata (ingestion progress)
+    indexed_namespaces = models.JSONField(default=list, blank=True)
     metadata = models.JSONField(default=dict, blank=True)  # For storing page numbers, sections, etc.
 
+    objects = DocumentChunkManager()
+
     class Meta:
         ordering = ['chunk_index']
         unique_together = ['document', 'chunk_index']
 
     def __str__(self):
-        return f"{self.document.title} - Chunk {self.chunk_index}"
\ No newline at end of file
+        return f"{self.document.title} - Chunk {self.chunk_index}"
+
+
+class VectorDeletion(models.Model):
+    """Outbox of chunk vectors to delete from the vector store (see documents/vector_gc.py)"""
+    chunk_id = models.BigIntegerField()
+    namespaces = models.JSONField(default=list)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Chunk {self.chunk_id} in {', '.join(self.namespaces)}"
+
+
+class EmbeddingCacheEntry(models.Model):
+    """Embedding of a piece of text, keyed by model and sha256 of the text"""
+    model = models.CharField(max_length=100)
+    content_hash = models.CharField(max_length=64)
+    embedding = EmbeddingField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        unique_together = ['model', 'content_hash']
+
+    def __str__(self):
+        return f"{self.model}:{self.content_hash[:12]}"
+
+
+class IngestionFailure(models.Model):
+    """Dead-letter record for a document whose ingestion gave up"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='ingestion_failures')
+    task_id = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField()
+    traceback = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.document.title} - {self.error[:50]}"
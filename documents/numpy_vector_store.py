@@ -0,0 +1,328 @@
+# documents/numpy_vector_store.py
+import logging
+import threading
+import time
+import numpy as np
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors):
+    """L2-normalize rows so a dot product is a cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _matches_filter(metadata, filter_dict):
+    """Evaluate the subset of Pinecone's metadata filter syntax we rely on ($eq, $ne, $in, $nin)"""
+    for key, condition in filter_dict.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
+
+
+class NamespaceIndex:
+    """Contiguous float32 matrix of unit vectors for one namespace.
+
+    Rows are kept packed: deletes move the last row into the freed slot, and
+    the backing array doubles in capacity when full, so adds are amortized O(1)
+    and a query is a single matrix-vector product over ``vectors[:size]``.
+    """
+
+    def __init__(self, dimension, capacity=1024):
+        self.dimension = dimension
+        self.vectors = np.empty((capacity, dimension), dtype=np.float32)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.metadatas = []
+        self.positions = {}
+        self.size = 0
+        self.lock = threading.RLock()
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = self.vectors.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        vectors = np.empty((capacity, self.dimension), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        self.vectors, self.ids = vectors, ids
+
+    def upsert(self, ids, vectors, metadatas):
+        """Insert or replace rows; ``vectors`` must already be normalized"""
+        with self.lock:
+            self._reserve(len(ids))
+            for chunk_id, vector, metadata in zip(ids, vectors, metadatas):
+                row = self.positions.get(chunk_id)
+                if row is None:
+                    row = self.size
+                    self.size += 1
+                    self.positions[chunk_id] = row
+                    self.metadatas.append(metadata)
+                else:
+                    self.metadatas[row] = metadata
+                self.vectors[row] = vector
+                self.ids[row] = chunk_id
+
+    def remove(self, chunk_id):
+        with self.lock:
+            row = self.positions.pop(chunk_id, None)
+            if row is None:
+                return False
+            last = self.size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix packed
+                moved_id = int(self.ids[last])
+                self.vectors[row] = self.vectors[last]
+                self.ids[row] = moved_id
+                self.metadatas[row] = self.metadatas[last]
+                self.positions[moved_id] = row
+            self.metadatas.pop()
+            self.size -= 1
+            return True
+
+    def search(self, query_vector, top_k, filter_dict=None):
+        """Return ``[(chunk_id, similarity, metadata)]`` for the best ``top_k`` rows"""
+        with self.lock:
+            if self.size == 0:
+                return []
+            scores = self.vectors[:self.size] @ query_vector
+
+            if filter_dict:
+                allowed = np.fromiter(
+                    (_matches_filter(metadata, filter_dict) for metadata in self.metadatas),
+                    dtype=bool,
+                    count=self.size
+                )
+                scores = np.where(allowed, scores, -np.inf)
+
+            k = min(top_k, self.size)
+            # argpartition is O(n); only the k winners get fully sorted
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                (int(self.ids[row]), float(scores[row]), self.metadatas[row])
+                for row in top
+                if scores[row] != -np.inf
+            ]
+
+
+class NumpyVectorStore:
+    """In-process vector store with the same API as ``PineconeVectorStore``.
+
+    Each namespace (``user_{id}`` / ``global``) is loaded lazily from
+    ``DocumentChunk.embedding`` into a ``NamespaceIndex`` and then maintained
+    incrementally by ``add_documents``/``delete_document``. Other processes
+    (e.g. ingestion workers) write to the database only, so a namespace is
+    reloaded when its chunk count or highest id changes, checked at most once
+    every ``NUMPY_INDEX_REFRESH_SECONDS``.
+    """
+
+    # Searches may (re)load a namespace from DocumentChunk
+    reads_database = True
+
+    def __init__(self, embedder=None, embedding_dimension=1024):
+        if embedder is None:
+            from .embeddings import PineconeEmbedder
+            embedder = PineconeEmbedder(dimension=embedding_dimension)
+        self.embedder = embedder
+        self.embedding_dimension = embedding_dimension
+        self.refresh_seconds = config('NUMPY_INDEX_REFRESH_SECONDS', default=300, cast=int)
+        self._namespaces = {}
+        self._checked_at = {}
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    def _get_user_namespace(self, user_id=None):
+        """Get namespace for user-specific vectors"""
+        if user_id:
+            return f"user_{user_id}"
+        return "global"
+
+    def _namespace_queryset(self, namespace):
+        from .models import DocumentChunk
+        queryset = DocumentChunk.objects.filter(embedding__isnull=False)
+        if namespace.startswith("user_"):
+            queryset = queryset.filter(document__user_id=int(namespace[len("user_"):]))
+        return queryset
+
+    def _db_signature(self, namespace):
+        from django.db.models import Count, Max
+        stats = self._namespace_queryset(namespace).aggregate(count=Count('id'), max_id=Max('id'))
+        return stats['count'], stats['max_id']
+
+    def _load_namespace(self, namespace):
+        """Build a namespace index from the embeddings stored in the database"""
+        started = time.monotonic()
+        signature = self._db_signature(namespace)
+        index = NamespaceIndex(self.embedding_dimension, capacity=max(signature[0] or 0, 1024))
+
+        batch_ids, batch_vectors, batch_metadatas = [], [], []
+        rows = self._namespace_queryset(namespace).values_list(
+            'id', 'embedding', 'content', 'metadata'
+        ).iterator(chunk_size=2000)
+        for chunk_id, embedding, content, metadata in rows:
+            metadata = dict(metadata or {})
+            metadata["chunk_id"] = str(chunk_id)
+            metadata["text"] = content
+            batch_ids.append(chunk_id)
+            batch_vectors.append(embedding)
+            batch_metadatas.append(metadata)
+            if len(batch_ids) >= 2000:
+                index.upsert(batch_ids, _normalize(batch_vectors), batch_metadatas)
+                batch_ids, batch_vectors, batch_metadatas = [], [], []
+        if batch_ids:
+            index.upsert(batch_ids, _normalize(batch_vectors), batch_metadatas)
+
+        logger.info(
+            f"Loaded {index.size} vectors into namespace {namespace} "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return index, signature
+
+    def _get_namespace(self, namespace, create=False):
+        """Return the in-memory index for a namespace, loading or refreshing it as needed"""
+        now = time.monotonic()
+        index = self._namespaces.get(namespace)
+        if index is not None and now - self._checked_at.get(namespace, 0) < self.refresh_seconds:
+            return index
+
+        with self._lock:
+            index = self._namespaces.get(namespace)
+            if index is not None and now - self._checked_at.get(namespace, 0) < self.refresh_seconds:
+                return index
+
+            if index is None or self._db_signature(namespace) != self._signatures.get(namespace):
+                try:
+                    index, signature = self._load_namespace(namespace)
+                except Exception as e:
+                    if index is None and not create:
+                        raise
+                    logger.error(f"Error loading namespace {namespace}, keeping current copy: {e}")
+                else:
+                    self._namespaces[namespace] = index
+                    self._signatures[namespace] = signature
+            self._checked_at[namespace] = now
+            return index
+
+    def generate_embedding(self, text):
+        """Generate an embedding for a query"""
+        try:
+            return self.embedder.embed_query(text)
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            raise
+
+    def add_document(self, chunk_id, text, user_id=None, metadata=None):
+        """Add a single document to the index with generated embedding"""
+        return self.add_documents([chunk_id], [text], user_id=user_id,
+                                  metadatas=[metadata or {}])[0]
+
+    def add_documents(self, chunk_ids, texts, user_id=None, metadatas=None, embeddings=None, namespaces=None,
+                      on_embedded=None, on_indexed=None):
+        """Add multiple documents to the index with generated embeddings
+
+        Pass ``embeddings`` to skip embedding, and ``namespaces`` to add the same
+        vectors to several namespaces instead of the one derived from ``user_id``.
+        ``on_embedded(indexes, embeddings)`` and ``on_indexed(namespace, indexes)``
+        report progress as in ``PineconeVectorStore.add_documents``.
+        """
+        if namespaces is None:
+            namespaces = [self._get_user_namespace(user_id)]
+
+        if metadatas is None:
+            metadatas = [{} for _ in chunk_ids]
+
+        try:
+            if embeddings is None:
+                embeddings = self.embedder.embed_documents(texts, on_batch=on_embedded)
+
+            vector_metadatas = []
+            for i, chunk_id in enumerate(chunk_ids):
+                metadata = metadatas[i].copy()
+                metadata["chunk_id"] = str(chunk_id)
+                metadata["text"] = texts[i]
+                vector_metadatas.append(metadata)
+
+            ids = [int(chunk_id) for chunk_id in chunk_ids]
+            vectors = _normalize(embeddings)
+            for namespace in namespaces:
+                self._get_namespace(namespace, create=True).upsert(ids, vectors, vector_metadatas)
+                if on_indexed is not None:
+                    on_indexed(namespace, list(range(len(ids))))
+
+            return embeddings
+        except Exception as e:
+            logger.error(f"Error batch processing documents: {e}")
+            raise
+
+    def _query_namespace(self, namespace, query_vector, top_k, filter_dict):
+        index = self._get_namespace(namespace)
+        return index.search(query_vector, top_k, filter_dict)
+
+    def search(self, query_text=None, query_embedding=None, top_k=5, user_id=None, filter_dict=None):
+        """Search for similar documents using text or embedding"""
+        # Generate embedding if text is provided
+        if query_text and query_embedding is None:
+            query_embedding = self.generate_embedding(query_text)
+
+        if query_embedding is None:
+            raise ValueError("Either query_text or query_embedding must be provided")
+
+        query_vector = _normalize(query_embedding)
+
+        # First try user-specific namespace, then fall back to global (same as Pinecone)
+        if user_id:
+            results = self._query_namespace(self._get_user_namespace(user_id), query_vector, top_k, filter_dict)
+            if results:
+                return results
+        return self._query_namespace("global", query_vector, top_k, filter_dict)
+
+    def delete_document(self, chunk_id, user_id=None):
+        """Delete a document from the index"""
+        index = self._namespaces.get(self._get_user_namespace(user_id))
+        if index is not None:
+            index.remove(int(chunk_id))
+
+    def delete_documents(self, chunk_ids, user_id=None, namespaces=None):
+        """Delete many documents from the given namespaces"""
+        if namespaces is None:
+            namespaces = [self._get_user_namespace(user_id)]
+        for namespace in namespaces:
+            index = self._namespaces.get(namespace)
+            if index is not None:
+                for chunk_id in chunk_ids:
+                    index.remove(int(chunk_id))
+
+    def delete_user_documents(self, user_id):
+        """Delete all documents for a user"""
+        namespace = self._get_user_namespace(user_id)
+        with self._lock:
+            self._namespaces[namespace] = NamespaceIndex(self.embedding_dimension)
+            # Treat the current database state as seen so the rows are not reloaded
+            self._signatures[namespace] = self._db_signature(namespace)
+            self._checked_at[namespace] = time.monotonic()
+
+    def health_check(self):
+        """Return per-namespace vector counts"""
+        return {
+            "namespaces": {name: {"vector_count": index.size} for name, index in self._namespaces.items()},
+            "total_vector_count": sum(index.size for index in self._namespaces.values()),
+        }
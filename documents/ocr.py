@@ -0,0 +1,193 @@
+# documents/ocr.py
+import logging
+import os
+import tempfile
+from collections import deque
+from decouple import config
+from .extraction import ExtractedDocument, Piece
+
+logger = logging.getLogger(__name__)
+
+# Bump when OCR output changes so cached pages are not reused
+OCR_VERSION = 1
+
+
+def ocr_pdf_page(file_path, page, dpi=300, languages='eng', timeout=0):
+    """Rasterize one PDF page and OCR it; runs in parse pool workers"""
+    import pytesseract
+    from pdf2image import convert_from_path
+    images = convert_from_path(
+        file_path, dpi=dpi, first_page=page, last_page=page, grayscale=True, timeout=timeout or None
+    )
+    return "\n".join(pytesseract.image_to_string(image, lang=languages, timeout=timeout) for image in images)
+
+
+class OcrPageCache:
+    """OCR text of single PDF pages on disk, keyed by file sha256, page and OCR settings"""
+
+    def __init__(self, root, variant):
+        self.root = root
+        self.variant = variant
+
+    def path(self, digest, page):
+        return os.path.join(self.root, digest[:2], digest, f"{page}.{self.variant}.txt")
+
+    def get(self, digest, page):
+        try:
+            with open(self.path(digest, page), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest, page, text):
+        path = self.path(digest, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class PageOcr:
+    """OCR fallback for PDF pages without a text layer.
+
+    Wraps a stream of PDF pages: pages whose extracted text is shorter than
+    ``min_chars`` are rasterized and OCR'd (with ``pdf2image`` and
+    ``pytesseract``) on the ``ParsePool`` while the pages before them are
+    still being consumed, so a mixed document only pays for its scanned
+    pages. Results are cached per (file hash, page), so re-processing a
+    document never OCRs a page twice.
+
+    A page whose OCR fails keeps its extracted text; after ``max_failures``
+    failures in a row (e.g. tesseract is not installed) the rest of the
+    document is not attempted. Such a document is not marked as OCR'd (see
+    ``apply``), so its parsed artifact is not reused and OCR is retried.
+    """
+
+    def __init__(self, cache=None, min_chars=20, dpi=300, languages='eng', page_timeout=120, max_failures=3):
+        self.cache = cache
+        self.min_chars = min_chars
+        self.dpi = dpi
+        self.languages = languages
+        self.page_timeout = page_timeout
+        self.max_failures = max_failures
+
+    @classmethod
+    def from_config(cls):
+        """Build the OCR fallback from environment settings; returns None when disabled"""
+        if not config('OCR_ENABLED', default=True, cast=bool):
+            return None
+        from django.conf import settings
+        dpi = config('OCR_DPI', default=300, cast=int)
+        languages = config('OCR_LANGUAGES', default='eng')
+        artifact_root = config('PARSED_ARTIFACT_ROOT', default=os.path.join(settings.BASE_DIR, 'parsed_artifacts'))
+        cache = OcrPageCache(
+            config('OCR_CACHE_ROOT', default=os.path.join(artifact_root, 'ocr')),
+            f"v{OCR_VERSION}-{languages}-{dpi}"
+        )
+        return cls(
+            cache=cache,
+            min_chars=config('OCR_MIN_CHARS', default=20, cast=int),
+            dpi=dpi,
+            languages=languages,
+            page_timeout=config('OCR_PAGE_TIMEOUT', default=120, cast=int),
+        )
+
+    def needs_ocr(self, piece):
+        return piece.page is not None and len(piece.text.strip()) < self.min_chars
+
+    def apply(self, extracted, file_path, digest=None, pool=None):
+        """Wrap an opened PDF so pages without a text layer are OCR'd as they stream by.
+
+        ``digest`` (the file's sha256) enables the page cache; ``pool`` runs
+        OCR jobs in parallel, otherwise pages are OCR'd in this process.
+        ``metadata['ocr']`` is set once the last page went by, and only when
+        every page that needed OCR got it.
+        """
+        metadata = extracted.metadata
+        metadata.pop('ocr', None)
+
+        def pieces():
+            if (yield from self.pieces(extracted.pieces(), file_path, digest, pool)):
+                metadata['ocr'] = self.languages
+
+        return ExtractedDocument(metadata, pieces())
+
+    def _submit(self, pool, file_path, page):
+        if pool is None:
+            return None, None
+        return pool.generation, pool.submit(
+            self.page_timeout, ocr_pdf_page, file_path, page, self.dpi, self.languages, self.page_timeout
+        )
+
+    def _ocr(self, pool, job, file_path, page):
+        if pool is None:
+            return ocr_pdf_page(file_path, page, self.dpi, self.languages, self.page_timeout)
+        generation, async_result = job
+        if generation != pool.generation:
+            # The pool was rebuilt after a stuck job and this one was lost with it
+            generation, async_result = self._submit(pool, file_path, page)
+        return pool.result(async_result, self.page_timeout, f"OCR of {file_path} page {page}")
+
+    def pieces(self, pieces, file_path, digest=None, pool=None):
+        """Yield ``pieces`` with scanned pages OCR'd; returns True when no page needing OCR was missed"""
+        if pool is not None and not pool.available():
+            pool = None
+        lookahead = pool.lookahead if pool is not None else 1
+        cache = self.cache if digest else None
+        pending = deque()  # (piece, OCR job or None) in page order
+        stats = {'ocr': 0, 'cached': 0, 'failures': 0, 'missed': 0}
+
+        def finish(piece, job):
+            if job is None:
+                return piece
+            if stats['failures'] >= self.max_failures:
+                stats['missed'] += 1
+                return piece
+            try:
+                text = self._ocr(pool, job, file_path, piece.page)
+            except Exception as e:
+                stats['failures'] += 1
+                stats['missed'] += 1
+                logger.warning(f"OCR failed for {file_path} page {piece.page}: {e}")
+                if stats['failures'] == self.max_failures:
+                    logger.error(f"OCR failed {self.max_failures} times in a row for {file_path}; skipping the rest")
+                return piece
+            stats['failures'] = 0
+            stats['ocr'] += 1
+            text = text.strip() + "\n" if text.strip() else piece.text
+            if cache is not None:
+                try:
+                    cache.put(digest, piece.page, text)
+                except OSError as e:
+                    logger.warning(f"Could not cache OCR text for {file_path} page {piece.page}: {e}")
+            return Piece(piece.page, text)
+
+        for piece in pieces:
+            job = None
+            if self.needs_ocr(piece) and stats['failures'] >= self.max_failures:
+                stats['missed'] += 1
+            elif self.needs_ocr(piece):
+                cached = cache.get(digest, piece.page) if cache is not None else None
+                if cached is not None:
+                    stats['cached'] += 1
+                    piece = Piece(piece.page, cached)
+                else:
+                    job = self._submit(pool, file_path, piece.page)
+            pending.append((piece, job))
+            # Hand pages over in order, waiting on an OCR job only once the window is full
+            while pending and (pending[0][1] is None or len(pending) > lookahead):
+                yield finish(*pending.popleft())
+
+        while pending:
+            yield finish(*pending.popleft())
+
+        if stats['ocr'] or stats['cached']:
+            logger.info(f"OCR'd {stats['ocr']} pages of {file_path} ({stats['cached']} from cache)")
+        if stats['missed']:
+            logger.warning(f"{stats['missed']} pages of {file_path} could not be OCR'd; will retry on the next parse")
+        return stats['missed'] == 0
@@ -0,0 +1,200 @@
+# documents/parse_pool.py
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from decouple import config
+from .extraction import Piece, extract_document, extract_pdf_range
+
+logger = logging.getLogger(__name__)
+
+
+class ParseTimeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise ParseTimeout("parse job exceeded its time limit")
+
+
+def _run_with_deadline(timeout, func, *args):
+    """Run ``func`` in a pool worker, interrupting it after ``timeout`` seconds.
+
+    Pure-Python parsing checks for signals between bytecodes, so SIGALRM stops
+    a runaway job and the worker survives to take the next one.
+    """
+    previous = signal.signal(signal.SIGALRM, _alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class ParsePool:
+    """Process pool for CPU-bound text extraction.
+
+    Large PDFs are split into ranges of ``pages_per_job`` pages extracted in
+    parallel and streamed back in page order, with at most ``lookahead``
+    ranges in flight so memory stays bounded. ``parse_documents`` parses whole
+    files of a batch side by side.
+
+    Every job has a time limit: workers interrupt themselves with SIGALRM, and
+    if a worker is stuck in C code past a grace period the whole pool is
+    terminated and rebuilt. Workers are started with ``spawn`` so they never
+    inherit database connections or API clients from the parent.
+    """
+
+    def __init__(self, workers=None, job_timeout=120, document_timeout=900, pages_per_job=16,
+                 min_pages=32, max_tasks_per_child=100, grace_seconds=10):
+        self.workers = workers or os.cpu_count() or 1
+        self.job_timeout = job_timeout
+        self.document_timeout = document_timeout
+        self.pages_per_job = pages_per_job
+        self.min_pages = min_pages
+        self.max_tasks_per_child = max_tasks_per_child
+        self.grace_seconds = grace_seconds
+        self.lookahead = self.workers * 2
+        self.generation = 0  # bumped when the pool is rebuilt and pending jobs are lost
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        """Build the pool from environment settings; returns None when disabled"""
+        workers = config('PARSE_WORKERS', default=os.cpu_count() or 1, cast=int)
+        if workers < 2:
+            return None
+        return cls(
+            workers=workers,
+            job_timeout=config('PARSE_JOB_TIMEOUT', default=120, cast=int),
+            document_timeout=config('PARSE_DOCUMENT_TIMEOUT', default=900, cast=int),
+            pages_per_job=config('PARSE_PAGES_PER_JOB', default=16, cast=int),
+            min_pages=config('PARSE_POOL_MIN_PAGES', default=32, cast=int),
+        )
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if multiprocessing.current_process().daemon:
+                    # e.g. a Celery prefork child: daemonic processes cannot have children
+                    return None
+                self._pool = multiprocessing.get_context('spawn').Pool(
+                    self.workers, maxtasksperchild=self.max_tasks_per_child
+                )
+            return self._pool
+
+    def _terminate(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+                self.generation += 1
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def available(self):
+        return self._get_pool() is not None
+
+    def should_split(self, page_count):
+        return page_count >= self.min_pages and self.available()
+
+    def submit(self, timeout, func, *args):
+        """Run ``func(*args)`` on a worker with a ``timeout``; collect it with ``result``"""
+        return self._get_pool().apply_async(_run_with_deadline, (timeout, func) + args)
+
+    def result(self, async_result, timeout, label):
+        try:
+            return async_result.get(timeout + self.grace_seconds)
+        except multiprocessing.TimeoutError:
+            logger.error(f"Parse job for {label} is stuck past its time limit; restarting the parse pool")
+            self._terminate()
+            raise ParseTimeout(f"parsing {label} exceeded {timeout}s")
+
+    def pdf_pieces(self, file_path, page_count):
+        """Yield the PDF's pages in order while later ranges are still being extracted"""
+        ranges = iter([(first, min(first + self.pages_per_job, page_count))
+                       for first in range(0, page_count, self.pages_per_job)])
+        pending = deque()
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                pending.append((page_range, self.submit(self.job_timeout, extract_pdf_range, file_path, *page_range)))
+
+        for _ in range(self.lookahead):
+            submit_next()
+
+        while pending:
+            (first, last), async_result = pending.popleft()
+            text, lengths = self.result(async_result, self.job_timeout, f"{file_path} pages {first + 1}-{last}")
+            submit_next()
+            offset = 0
+            for number, length in enumerate(lengths, start=first + 1):
+                yield Piece(number, text[offset:offset + length])
+                offset += length
+
+    def parse_documents(self, items):
+        """Parse ``(key, file_path, file_type)`` items in parallel.
+
+        Yields ``(key, result, error)`` as files finish, where ``result`` is
+        ``extract_document``'s ``(metadata, text, pages)``. At most ``workers``
+        files are in flight, so each starts when submitted and its deadline
+        runs from then. A failed or timed out file yields its exception and
+        does not stop the batch.
+        """
+        waiting = deque(items)
+        if self._get_pool() is None:
+            for key, file_path, file_type in waiting:
+                try:
+                    yield key, extract_document(file_path, file_type), None
+                except Exception as e:
+                    yield key, None, e
+            return
+
+        done = queue.Queue()
+        in_flight = {}  # job id -> (item, deadline)
+        job_ids = itertools.count()
+
+        def submit(item):
+            job = next(job_ids)
+            in_flight[job] = (item, time.monotonic() + self.document_timeout + self.grace_seconds)
+            self._get_pool().apply_async(
+                _run_with_deadline, (self.document_timeout, extract_document, item[1], item[2]),
+                callback=lambda result: done.put((job, result, None)),
+                error_callback=lambda error: done.put((job, None, error)),
+            )
+
+        while waiting or in_flight:
+            while waiting and len(in_flight) < self.workers:
+                submit(waiting.popleft())
+            deadline = min(deadline for item, deadline in in_flight.values())
+            try:
+                job, result, error = done.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                now = time.monotonic()
+                stuck = [item for item, deadline in in_flight.values() if deadline <= now]
+                logger.error(f"Parse jobs for {', '.join(item[1] for item in stuck)} are stuck past "
+                             f"their time limit; restarting the parse pool")
+                self._terminate()
+                # The other files in flight were lost with the pool: parse them again
+                for item, deadline in in_flight.values():
+                    if deadline > now:
+                        waiting.appendleft(item)
+                in_flight.clear()
+                for key, file_path, file_type in stuck:
+                    yield key, None, ParseTimeout(f"parsing {file_path} exceeded {self.document_timeout}s")
+                continue
+            if job in in_flight:  # else it finished on a pool that was since terminated
+                (key, file_path, file_type), deadline = in_flight.pop(job)
+                yield key, result, error
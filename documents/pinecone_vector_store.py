@@ -1,24 +1,50 @@
 from pinecone import Pinecone, ServerlessSpec
+from pinecone.exceptions import NotFoundException
 from django.conf import settings
 import logging
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 import backoff
+import numpy as np
 from decouple import config
+from .embeddings import PineconeEmbedder
+from .rate_limit import AdaptiveLimiter
 
 logger = logging.getLogger(__name__)
 
 
 class PineconeVectorStore:
-    def __init__(self):
-        """Initialize Pinecone vector store"""
+    def __init__(self, ensure_index=False):
+        """Initialize Pinecone vector store
+
+        The index existence check costs a control-plane round trip, so it is
+        skipped by default and run at deploy time through the
+        ``ensure_vector_index`` management command instead.
+        """
         # Initialize Pinecone client
-        self.pc = Pinecone(api_key=config('PINECONE_API_KEY'))
+        self.pc = Pinecone(
+            api_key=config('PINECONE_API_KEY'),
+            pool_threads=config('PINECONE_POOL_THREADS', default=4, cast=int)
+        )
         self.index_name = config('PINECONE_INDEX_NAME')
         self.embedding_dimension = 1024  # Dimension for e5-base (update based on your model)
         self.embedding_model = "multilingual-e5-large"  # Default model
+        self.embedder = PineconeEmbedder(
+            pc=self.pc,
+            model=self.embedding_model,
+            dimension=self.embedding_dimension
+        )
 
-        # Ensure index exists
-        self._ensure_index_exists()
+        # Pinecone caps upserts at 1000 vectors and 2MB per request
+        self.upsert_max_vectors = config('PINECONE_UPSERT_MAX_VECTORS', default=1000, cast=int)
+        self.upsert_max_bytes = config('PINECONE_UPSERT_MAX_BYTES', default=1_500_000, cast=int)
+        self.upsert_limiter = AdaptiveLimiter(
+            config('PINECONE_UPSERT_CONCURRENCY', default=4, cast=int), name="Pinecone upsert"
+        )
+
+        if ensure_index:
+            self._ensure_index_exists()
 
         # Get index reference
         self.index = self.pc.Index(self.index_name)
@@ -53,6 +79,14 @@ class PineconeVectorStore:
             logger.error(f"Error ensuring index exists: {e}")
             raise
 
+    def ensure_index_exists(self):
+        """Public wrapper used by the deploy-time management command"""
+        self._ensure_index_exists()
+
+    def health_check(self):
+        """Return index stats; raises if the data plane is unreachable"""
+        return self.index.describe_index_stats()
+
     def _get_user_namespace(self, user_id=None):
         """Get namespace for user-specific vectors"""
         if user_id:
@@ -63,12 +97,7 @@ class PineconeVectorStore:
     def generate_embedding(self, text):
         """Generate embedding using Pinecone's inference service"""
         try:
-            embedding_response = self.pc.inference.embed(
-                model=self.embedding_model,
-                inputs=[text],
-                parameters={"input_type": "passage", "truncate": "END"}
-            )
-            return embedding_response[0]['values']
+            return self.embedder.embed_query(text)
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise
@@ -94,56 +123,109 @@ class PineconeVectorStore:
 
         return embedding
 
-    def add_documents(self, chunk_ids, texts, user_id=None, metadatas=None):
-        """Add multiple documents to the index with generated embeddings"""
-        namespace = self._get_user_namespace(user_id)
+    def _upsert_batches(self, vectors):
+        """Split vectors into upserts under Pinecone's request limits (count and payload size)"""
+        batch, size = [], 0
+        for vector in vectors:
+            # JSON floats take ~12 bytes each; metadata is sent as JSON too
+            vector_size = len(vector[0]) + 12 * len(vector[1]) + len(json.dumps(vector[2], default=str))
+            if batch and (len(batch) >= self.upsert_max_vectors or size + vector_size > self.upsert_max_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(vector)
+            size += vector_size
+        if batch:
+            yield batch
+
+    def add_documents(self, chunk_ids, texts, user_id=None, metadatas=None, embeddings=None, namespaces=None,
+                      on_embedded=None, on_indexed=None):
+        """Add multiple documents to the index with generated embeddings
+
+        Pass ``embeddings`` to skip embedding, and ``namespaces`` to write the same
+        vectors to several namespaces instead of the one derived from ``user_id``.
+
+        Embedding and upserting overlap: each embedding batch is queued for
+        upsert to every namespace as soon as it arrives, on up to
+        ``PINECONE_UPSERT_CONCURRENCY`` threads that back off on 429s.
+
+        Progress is reported from the calling thread: ``on_embedded(indexes,
+        embeddings)`` as embeddings arrive and ``on_indexed(namespace, indexes)``
+        as upserts complete, including those that finished before a failure.
+        """
+        if namespaces is None:
+            namespaces = [self._get_user_namespace(user_id)]
 
         if metadatas is None:
             metadatas = [{} for _ in chunk_ids]
 
-        # Generate embeddings in batch
-        try:
-            embeddings = []
-            # Process in batches of 5 to avoid overloading the API
-            batch_size = 5
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                batch_embeddings = self.pc.inference.embed(
-                    model=self.embedding_model,
-                    inputs=batch_texts,
-                    parameters={"input_type": "passage", "truncate": "END"}
-                )
-                embeddings.extend([emb['values'] for emb in batch_embeddings])
-
+        positions = {str(chunk_id): i for i, chunk_id in enumerate(chunk_ids)}
+        executor = ThreadPoolExecutor(max_workers=self.upsert_limiter.max_concurrency)
+        pending = []  # (namespace, indexes, future) in submission order
+        errors = []
+
+        def report(wait=False):
+            # Hand completed upserts to on_indexed; keep the rest pending
+            while pending and (wait or pending[0][2].done()):
+                namespace, indexes, future = pending.pop(0)
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if on_indexed is not None:
+                    on_indexed(namespace, indexes)
+
+        def upsert_ready(indexes, batch_embeddings):
             # Prepare vector tuples (id, vector, metadata)
             vectors = []
-            for i, (chunk_id, embedding) in enumerate(zip(chunk_ids, embeddings)):
+            for i, embedding in zip(indexes, batch_embeddings):
                 metadata = metadatas[i].copy()
-                metadata["chunk_id"] = str(chunk_id)
+                metadata["chunk_id"] = str(chunk_ids[i])
                 metadata["text"] = texts[i]  # Add the text content to metadata
-                vectors.append((str(chunk_id), embedding, metadata))
-
-            # Upsert in batches to avoid payload size limits
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                self.index.upsert(vectors=batch, namespace=namespace)
+                vectors.append((str(chunk_ids[i]), embedding, metadata))
+            for namespace in namespaces:
+                for batch in self._upsert_batches(vectors):
+                    pending.append((namespace, [positions[vector[0]] for vector in batch], executor.submit(
+                        self.upsert_limiter.call, self.index.upsert, vectors=batch, namespace=namespace
+                    )))
+            report()
+
+        def embedded(indexes, batch_embeddings):
+            if on_embedded is not None:
+                on_embedded(indexes, batch_embeddings)
+            upsert_ready(indexes, batch_embeddings)
 
+        try:
+            try:
+                if embeddings is None:
+                    embeddings = self.embedder.embed_documents(texts, on_batch=embedded)
+                else:
+                    upsert_ready(range(len(chunk_ids)), embeddings)
+            finally:
+                # Record every upsert that landed, even when embedding failed midway
+                report(wait=True)
+
+            if errors:
+                raise errors[0]
             return embeddings
         except Exception as e:
             logger.error(f"Error batch processing documents: {e}")
             raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
 
     def search(self, query_text=None, query_embedding=None, top_k=5, user_id=None, filter_dict=None):
         """Search for similar documents using text or embedding"""
         namespace = self._get_user_namespace(user_id)
 
         # Generate embedding if text is provided
-        if query_text and not query_embedding:
+        if query_text and query_embedding is None:
             query_embedding = self.generate_embedding(query_text)
 
-        if not query_embedding:
+        if query_embedding is None:
             raise ValueError("Either query_text or query_embedding must be provided")
+        # The query API only serializes lists (upserts convert arrays themselves)
+        query_embedding = np.asarray(query_embedding, dtype=np.float32).tolist()
 
         # First try user-specific namespace if user_id
         if user_id:
@@ -192,18 +274,27 @@ class PineconeVectorStore:
         namespace = self._get_user_namespace(user_id)
         self.index.delete(ids=[str(chunk_id)], namespace=namespace)
 
+    def delete_documents(self, chunk_ids, user_id=None, namespaces=None, batch_size=1000):
+        """Delete many documents, in batches of at most 1000 ids per request"""
+        if namespaces is None:
+            namespaces = [self._get_user_namespace(user_id)]
+        ids = [str(chunk_id) for chunk_id in chunk_ids]
+        for namespace in namespaces:
+            for i in range(0, len(ids), batch_size):
+                self.index.delete(ids=ids[i:i + batch_size], namespace=namespace)
+
     def delete_user_documents(self, user_id):
         """Delete all documents for a user"""
         namespace = self._get_user_namespace(user_id)
+        try:
+            self.index.delete(delete_all=True, namespace=namespace)
+        except NotFoundException:
+            pass  # nothing was ever written to this namespace
 
-        # Get all vectors in the namespace (may need pagination for large collections)
-        fetch_response = self.index.fetch(
-            ids=[],
-            namespace=namespace
-        )
+    def list_namespaces(self):
+        stats = self.index.describe_index_stats()
+        return sorted((stats.get('namespaces') or {}).keys())
 
-        if fetch_response and 'vectors' in fetch_response and fetch_response['vectors']:
-            self.index.delete(
-                ids=list(fetch_response['vectors'].keys()),
-                namespace=namespace
-            )
\ No newline at end of file
+    def list_ids(self, namespace, page_size=100):
+        """Yield pages of the vector ids in ``namespace``"""
+        yield from self.index.list(namespace=namespace, limit=page_size)
@@ -0,0 +1,132 @@
+# documents/rate_limit.py
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = (429, 503)
+
+
+def _header(headers, name):
+    if not headers:
+        return None
+    for key, value in dict(headers).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _parse_delay(value):
+    """Seconds from a Retry-After style header: a number, a duration like "1.5s"/"200ms", or an HTTP date"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        if value.endswith("ms"):
+            return float(value[:-2]) / 1000
+        return float(value.rstrip("s"))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(exc, attempt, max_delay=60.0):
+    """How long to wait before retrying ``exc``, or None when it is not a rate limit / overload error.
+
+    Honors ``Retry-After`` and ``x-ratelimit-reset*`` headers (Pinecone and
+    Groq exceptions expose them) and falls back to jittered exponential backoff.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status not in RETRYABLE_STATUSES:
+        return None
+
+    headers = getattr(exc, "headers", None) or getattr(response, "headers", None)
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "x-ratelimit-reset"):
+        delay = _parse_delay(_header(headers, name))
+        if delay is not None:
+            return min(delay, max_delay)
+
+    backoff = min(max_delay, 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for calls to a rate-limited API, adjusted AIMD style.
+
+    Each throttled call halves the limit and pauses every caller until the
+    server's retry delay has passed; each run of ``limit`` successful calls
+    raises it by one again, up to ``max_concurrency``. Other failures leave
+    the limit alone.
+    """
+
+    def __init__(self, max_concurrency, name="api", max_retries=6):
+        self.max_concurrency = max(1, max_concurrency)
+        self.name = name
+        self.max_retries = max_retries
+        self.limit = self.max_concurrency
+        self.active = 0
+        self.throttled = 0
+        self._successes = 0
+        self._pause_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._pause_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.active >= self.limit:
+                    self._cond.wait()
+                else:
+                    break
+            self.active += 1
+
+    def release(self, retry_after=None, succeeded=True):
+        """Free a slot; ``retry_after`` reports a throttled call, ``succeeded=False`` any other failure"""
+        with self._cond:
+            self.active -= 1
+            if retry_after is not None:
+                self.throttled += 1
+                self._successes = 0
+                if self.limit > 1:
+                    self.limit = max(1, self.limit // 2)
+                    logger.warning(f"{self.name}: throttled, concurrency lowered to {self.limit}")
+                self._pause_until = max(self._pause_until, time.monotonic() + retry_after)
+            elif succeeded:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn`` within the limit, retrying rate-limited attempts"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                self.release(retry_after=delay, succeeded=False)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                continue
+            self.release()
+            return result
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "throttled": self.throttled,
+            }
@@ -1,8 +1,21 @@
 # documents/serializers.py
 from rest_framework import serializers
-from .models import Document
+from .models import Document, UploadSession
 
 class DocumentListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = ['id', 'title', 'file_type', 'status', 'created_at']
\ No newline at end of file
+        fields = ['id', 'title', 'file_type', 'status', 'created_at']
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    title = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)  # sha256 of the file
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'title', 'filename', 'file_type', 'size', 'offset', 'status', 'document', 'created_at', 'updated_at']
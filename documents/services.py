@@ -0,0 +1,200 @@
+# documents/services.py
+"""Process-wide registry of long-lived service clients.
+
+Building a ``PineconeVectorStore`` or ``Groq`` client is expensive (TLS
+handshakes, fresh connection pools), so each worker process creates them once
+and every request reuses the same instances. Instances are created lazily after
+the worker has forked, so gunicorn pre-fork workers never share sockets.
+"""
+import logging
+import threading
+import time
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Factories must not resolve other services while it is held (see get_rag_service);
+# re-entrant anyway so one that does cannot deadlock the worker
+_lock = threading.RLock()
+_instances = {}
+
+
+def _get_or_create(name, factory):
+    """Return the cached instance for ``name``, creating it at most once"""
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                logger.info(f"Initializing shared service: {name}")
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def _build_vector_store():
+    backend = config('VECTOR_STORE_BACKEND', default='pinecone')
+    if backend == 'pinecone':
+        from .pinecone_vector_store import PineconeVectorStore
+        return PineconeVectorStore()
+    if backend == 'numpy':
+        from .numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore()
+    if backend == 'ann':
+        from .ann_vector_store import AnnVectorStore
+        return AnnVectorStore()
+    raise ValueError(f"Unsupported VECTOR_STORE_BACKEND: {backend}")
+
+
+def get_vector_store():
+    """Shared vector store for this worker, selected by ``VECTOR_STORE_BACKEND``"""
+    return _get_or_create('vector_store', _build_vector_store)
+
+
+def get_groq_client():
+    """Shared Groq client (keeps its HTTP connection pool alive between requests)"""
+    from groq import Groq
+    return _get_or_create('groq_client', lambda: Groq(api_key=config('GROQ_API_KEY')))
+
+
+def get_async_groq_client():
+    """Shared async Groq client for the ASGI chat pipeline"""
+    from groq import AsyncGroq
+    return _get_or_create('async_groq_client', lambda: AsyncGroq(api_key=config('GROQ_API_KEY')))
+
+
+def get_rag_service():
+    """Shared RAG service built on the shared clients"""
+    instance = _instances.get('rag_service')
+    if instance is not None:
+        return instance
+
+    from .RAGService import RAGService
+    # Resolve dependencies before taking the registry lock for the service itself
+    dependencies = dict(
+        vector_store=get_vector_store(),
+        groq_client=get_groq_client(),
+        async_groq_client=get_async_groq_client(),
+        answer_cache=get_answer_cache(),
+        lexical_index=get_lexical_index()
+    )
+    return _get_or_create('rag_service', lambda: RAGService(**dependencies))
+
+
+def _build_answer_cache():
+    from .answer_cache import SemanticAnswerCache
+    from .signals import document_chunks_changed
+    cache = SemanticAnswerCache.from_config()
+    if cache is not None:
+        document_chunks_changed.connect(cache.on_document_changed, weak=False)
+    # False (not None) marks a disabled cache so the registry does not rebuild it
+    return cache or False
+
+
+def get_answer_cache():
+    """Shared semantic answer cache, or None when ``ANSWER_CACHE_SIZE`` is 0"""
+    return _get_or_create('answer_cache', _build_answer_cache) or None
+
+
+def _build_lexical_index():
+    from .lexical_index import LexicalIndex
+    from .signals import document_chunks_changed
+    if not config('LEXICAL_SEARCH_ENABLED', default=True, cast=bool):
+        return False
+    index = LexicalIndex()
+    document_chunks_changed.connect(index.on_document_changed, weak=False)
+    return index
+
+
+def get_lexical_index():
+    """Shared BM25 index for hybrid retrieval, or None when ``LEXICAL_SEARCH_ENABLED`` is off"""
+    return _get_or_create('lexical_index', _build_lexical_index) or None
+
+
+def _build_parse_pool():
+    from .parse_pool import ParsePool
+    return ParsePool.from_config() or False
+
+
+def get_parse_pool():
+    """Shared document parsing process pool, or None when ``PARSE_WORKERS`` is below 2"""
+    return _get_or_create('parse_pool', _build_parse_pool) or None
+
+
+def _build_artifact_store():
+    from .artifacts import ParsedArtifactStore
+    return ParsedArtifactStore.from_config() or False
+
+
+def get_artifact_store():
+    """Shared parsed-artifact cache, or None when ``PARSED_ARTIFACTS`` is off"""
+    return _get_or_create('artifact_store', _build_artifact_store) or None
+
+
+def _build_page_ocr():
+    from .ocr import PageOcr
+    return PageOcr.from_config() or False
+
+
+def get_page_ocr():
+    """Shared OCR fallback for scanned PDF pages, or None when ``OCR_ENABLED`` is off"""
+    return _get_or_create('page_ocr', _build_page_ocr) or None
+
+
+def get_chunker():
+    """Shared chunker for ``CHUNK_STRATEGY`` (keeps its tokenizer loaded)"""
+    from .chunking import Chunker
+    return _get_or_create('chunker', Chunker.from_config)
+
+
+def warm_up():
+    """Create all shared clients up front, e.g. from a gunicorn ``post_worker_init`` hook"""
+    started = time.monotonic()
+    get_rag_service()
+    logger.info(f"Shared services warmed up in {time.monotonic() - started:.2f}s")
+
+
+def health_check(deep=False):
+    """Report which services are initialized; with ``deep`` also ping the remote APIs"""
+    report = {
+        'initialized': sorted(_instances.keys()),
+        'checks': {},
+    }
+    vector_store = _instances.get('vector_store')
+    query_cache = getattr(getattr(vector_store, 'embedder', None), 'query_cache', None)
+    if query_cache is not None:
+        report['embedding_cache'] = query_cache.stats()
+    answer_cache = _instances.get('answer_cache')
+    if answer_cache:
+        report['answer_cache'] = answer_cache.stats()
+
+    if not deep:
+        return report
+
+    checks = {
+        'vector_store': lambda: get_vector_store().health_check(),
+        'groq': lambda: get_groq_client().models.list(),
+    }
+    for name, check in checks.items():
+        started = time.monotonic()
+        try:
+            check()
+            report['checks'][name] = {
+                'ok': True,
+                'latency_ms': round((time.monotonic() - started) * 1000, 1),
+            }
+        except Exception:
+            # The error text stays in the logs: the endpoint is public
+            logger.exception(f"Health check failed for {name}")
+            report['checks'][name] = {'ok': False}
+    return report
+
+
+def reset():
+    """Drop all cached instances (used after settings changes or in tests)"""
+    with _lock:
+        parse_pool = _instances.get('parse_pool')
+        if parse_pool:
+            parse_pool.close()
+        _instances.clear()
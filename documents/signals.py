@@ -0,0 +1,6 @@
+# documents/signals.py
+from django.dispatch import Signal
+
+# Sent by process_document after a document's chunks were (re)written.
+# Receivers get ``document_id`` and ``user_id`` keyword arguments.
+document_chunks_changed = Signal()
@@ -0,0 +1,64 @@
+# documents/tasks.py
+import logging
+from celery import shared_task
+from .document_processor import process_document
+from .ingestion_queue import dispatch, record_failure, request_dispatch
+from .uploads import expire_sessions
+from . import vector_gc
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True)
+def process_document_task(self, document_id, incremental=True):
+    """Process one document claimed by the dispatcher; failures are retried or dead-lettered"""
+    try:
+        return process_document(document_id, incremental=incremental, raise_errors=True)
+    except Exception as e:
+        record_failure(document_id, e, task_id=self.request.id)
+    finally:
+        # A slot just freed up. Eager runs are driven by the dispatcher's own loop.
+        if not self.request.is_eager:
+            request_dispatch()
+
+
+@shared_task(bind=True)
+def dispatch_ingestion(self):
+    """Hand queued documents to workers, fairly across users"""
+    dispatched = dispatch()
+    if self.request.is_eager:
+        # Tasks ran inline, so their slots are free again
+        while dispatched:
+            dispatched = dispatch()
+
+
+@shared_task
+def expire_upload_sessions():
+    """Abort abandoned resumable uploads and free their staged bytes"""
+    return expire_sessions()
+
+
+@shared_task
+def flush_vector_deletions():
+    """Delete the vectors queued in the deletion outbox"""
+    return vector_gc.flush()
+
+
+@shared_task
+def reconcile_vectors():
+    """Purge vectors whose chunks no longer exist"""
+    return vector_gc.reconcile()
+
+
+@shared_task
+def compact_ann_indexes():
+    """Fold grown delta/tombstone logs of the local ANN indexes into new generations"""
+    from .services import get_vector_store
+    vector_store = get_vector_store()
+    if not hasattr(vector_store, 'compact'):
+        logger.info(f"{type(vector_store).__name__} has no local indexes to compact")
+        return []
+    compacted = vector_store.compact()
+    if compacted:
+        logger.info(f"Compacted ANN namespaces: {', '.join(compacted)}")
+    return compacted
@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from documents.ann_index import IVFIndex
+
+DIMENSION = 8
+
+
+class IVFIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        rng = np.random.default_rng(7)
+        self.vectors = rng.normal(size=(300, DIMENSION)).astype(np.float32)
+        self.ids = np.arange(1, 201)
+        self.index = self.open()
+        self.index.build(self.ids, self.vectors[:200], nlist=8)
+
+    def open(self):
+        return IVFIndex(self.path, DIMENSION, refresh_seconds=0)
+
+    def top(self, vector, index=None):
+        return (index or self.index).search(vector, 1, nprobe=8)[0][0]
+
+    def test_deltas_and_tombstones_apply_immediately(self):
+        self.index.insert([201], self.vectors[200:201])
+        self.assertEqual(self.top(self.vectors[200]), 201)
+
+        self.index.delete([5, 201])
+        self.assertNotEqual(self.top(self.vectors[4]), 5)
+        self.assertNotEqual(self.top(self.vectors[200]), 201)
+
+        # A write after a tombstone brings the id back; a rewrite replaces the base vector
+        self.index.insert([5, 7], [self.vectors[4], self.vectors[250]])
+        self.assertEqual(self.top(self.vectors[4]), 5)
+        self.assertEqual(self.top(self.vectors[250]), 7)
+        self.assertNotEqual(self.top(self.vectors[6]), 7)
+
+        expected = set(range(1, 201))
+        self.assertEqual(set(self.index.live_ids().tolist()), expected)
+        # Other processes tail the same logs
+        self.assertEqual(set(self.open().live_ids().tolist()), expected)
+
+    def test_compaction_folds_the_logs_into_a_new_generation(self):
+        self.index.insert([201, 202], self.vectors[200:202])
+        self.index.delete([1, 2, 201])
+        self.assertTrue(self.index.needs_compaction(0.001))
+        self.assertFalse(self.index.needs_compaction(10))
+        live = self.index.live_ids()
+
+        generation = self.index.compact()
+
+        stats = self.index.stats()
+        self.assertEqual(stats["generation"], generation)
+        self.assertEqual((stats["delta_count"], stats["tombstone_count"]), (0, 0))
+        self.assertEqual(stats["base_count"], 199)
+        np.testing.assert_array_equal(self.index.live_ids(), live)
+        self.assertEqual(self.top(self.vectors[201]), 202)
+        self.assertFalse(self.index.needs_compaction(0.001))
+
+    def test_rebuild_replays_writes_made_while_it_ran(self):
+        since = self.index.log_position()
+        # Arrive after the database snapshot was read
+        self.index.insert([201], self.vectors[200:201])
+        self.index.delete([10])
+
+        self.index.build(self.ids, self.vectors[:200], nlist=8, since=since)
+
+        self.assertEqual(self.top(self.vectors[200]), 201)
+        self.assertNotIn(10, self.index.live_ids().tolist())
+        self.assertEqual(len(self.index.live_ids()), 200)
+
+    def test_rebuild_replays_across_a_concurrent_compaction(self):
+        since = self.index.log_position()
+        self.index.insert([201], self.vectors[200:201])
+        self.index.compact()
+        self.index.insert([202], self.vectors[201:202])
+        self.index.delete([201, 20])
+
+        self.index.build(self.ids, self.vectors[:200], nlist=8, since=since)
+
+        live = set(self.index.live_ids().tolist())
+        self.assertEqual(live, (set(range(1, 201)) | {202}) - {20})
+        self.assertEqual(self.top(self.vectors[201]), 202)
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from documents.answer_cache import SemanticAnswerCache
+from documents.context_builder import ContextBuilder
+from documents.models import Document
+from documents.RAGService import RAGService
+
+
+class WordCounter:
+    """Deterministic token counter: one token per whitespace-separated word"""
+
+    def count(self, text):
+        return len(text.split())
+
+
+def completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache(max_entries=2, ttl_seconds=60, max_distance=0.05)
+
+    def test_near_duplicates_hit_within_their_scope(self):
+        self.cache.store("alice", [1.0, 0.0], "cached", {"1": "v1"})
+        self.assertEqual(self.cache.lookup("alice", [0.99, 0.05])["answer"], "cached")
+        self.assertIsNone(self.cache.lookup("alice", [0.7, 0.7]))
+        self.assertIsNone(self.cache.lookup("bob", [1.0, 0.0]))
+
+    def test_entries_expire_and_evict_least_recently_used(self):
+        self.cache.store("alice", [1.0, 0.0], "first", {})
+        self.cache.store("alice", [0.0, 1.0], "second", {})
+        self.cache.lookup("alice", [1.0, 0.0])
+        self.cache.store("bob", [1.0, 0.0], "third", {})
+        self.assertIsNone(self.cache.lookup("alice", [0.0, 1.0]))
+        self.assertEqual(self.cache.lookup("alice", [1.0, 0.0])["answer"], "first")
+
+        expiring = SemanticAnswerCache(ttl_seconds=0)
+        expiring.store("alice", [1.0, 0.0], "gone", {})
+        self.assertIsNone(expiring.lookup("alice", [1.0, 0.0]))
+
+    def test_invalidation_drops_answers_that_used_the_document(self):
+        self.cache.store("alice", [1.0, 0.0], "uses 1", {"1": "v1"})
+        self.cache.store("alice", [0.0, 1.0], "uses 2", {"2": "v1"})
+        self.cache.invalidate_document(1)
+        self.assertIsNone(self.cache.lookup("alice", [1.0, 0.0]))
+        self.assertIsNotNone(self.cache.lookup("alice", [0.0, 1.0]))
+
+
+class CachedResponseTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='cache', email='cache@example.com', password='x')
+        self.document = Document.objects.create(user=user, title='Manual', file='documents/manual.txt',
+                                                file_type='txt')
+        self.vector_store = mock.Mock()
+        self.vector_store.generate_embedding.return_value = [1.0, 0.0, 0.0]
+        self.groq_client = mock.Mock()
+        self.groq_client.chat.completions.create.side_effect = [completion("first"), completion("second")]
+        self.service = RAGService(vector_store=self.vector_store, groq_client=self.groq_client,
+                                  async_groq_client=mock.Mock(), answer_cache=SemanticAnswerCache())
+        self.service.context_builder = ContextBuilder(token_counter=WordCounter())
+        chunks = [{"chunk_id": "1", "similarity": 0.9, "content": "The pump runs at 40 bar.",
+                   "metadata": {"document_id": str(self.document.id), "title": "Manual", "chunk": 0}}]
+        patcher = mock.patch.object(self.service, "retrieve_relevant_chunks", return_value=chunks)
+        self.retrieve = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_question_is_answered_from_the_cache(self):
+        self.assertEqual(self.service.generate_response("pump pressure?", scope=1), "first")
+        self.assertEqual(self.service.generate_response("pump pressure?", scope=1), "first")
+        self.assertEqual(self.groq_client.chat.completions.create.call_count, 1)
+        # The cache lookup's embedding is reused for retrieval
+        self.retrieve.assert_called_once_with("pump pressure?", query_embedding=[1.0, 0.0, 0.0])
+
+        self.assertEqual(self.service.generate_response("pump pressure?", scope=1, use_cache=False), "second")
+
+    def test_reprocessed_document_invalidates_the_answer(self):
+        self.service.generate_response("pump pressure?", scope=1)
+        self.document.save()  # bumps updated_at, the document version
+
+        self.assertEqual(self.service.generate_response("pump pressure?", scope=1), "second")
+
+    def test_embedding_failure_answers_without_the_cache(self):
+        self.vector_store.generate_embedding.side_effect = RuntimeError("embedding API down")
+
+        self.assertEqual(self.service.generate_response("pump pressure?", scope=1), "first")
+        self.retrieve.assert_called_once_with("pump pressure?", query_embedding=None)
+        self.assertEqual(self.service.answer_cache.stats()["entries"], 0)
@@ -0,0 +1,106 @@
+from django.test import SimpleTestCase
+
+from documents.chunking import Chunker, iter_chunks
+
+
+class WordCounter:
+    """Deterministic token counter: one token per whitespace-separated word"""
+
+    def count(self, text):
+        return len(text.split())
+
+    def count_many(self, texts):
+        return [self.count(text) for text in texts]
+
+
+def make_pages():
+    """Three pages of prose with headings; returns ``(pieces, full_text, page_starts)``"""
+    pages = []
+    for page in range(1, 4):
+        paragraphs = [f"SECTION {page}\n\n"]
+        for paragraph in range(4):
+            sentences = [f"Page {page} paragraph {paragraph} sentence {n} talks about item-{page}{paragraph}{n}."
+                         for n in range(5)]
+            paragraphs.append(" ".join(sentences) + "\n\n")
+        pages.append((page, "".join(paragraphs)))
+    page_starts, offset = [], 0
+    for page, text in pages:
+        page_starts.append((offset, page))
+        offset += len(text)
+    return pages, "".join(text for _, text in pages), page_starts
+
+
+def page_at(page_starts, offset):
+    return [page for start, page in page_starts if start <= offset][-1]
+
+
+def split_small(pieces, size=7):
+    """The same pages streamed in many small pieces"""
+    for page, text in pieces:
+        for start in range(0, len(text), size):
+            yield page, text[start:start + size]
+
+
+class ChunkOffsetTests(SimpleTestCase):
+    def assertOffsets(self, chunks, full_text, page_starts):
+        self.assertTrue(chunks)
+        for number, chunk in enumerate(chunks):
+            self.assertEqual(chunk.index, number)
+            self.assertEqual(chunk.text, full_text[chunk.start:chunk.end])
+            self.assertEqual(chunk.page_start, page_at(page_starts, chunk.start))
+            self.assertEqual(chunk.page_end, page_at(page_starts, chunk.end - 1))
+        # Only whitespace may fall between chunks, and the last one reaches the end
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(full_text[previous.end:chunk.start].strip(), "")
+        self.assertEqual(full_text[chunks[-1].end:].strip(), "")
+
+    def test_characters(self):
+        pieces, full_text, page_starts = make_pages()
+        chunks = list(iter_chunks(pieces, chunk_size=300, overlap=50))
+        self.assertOffsets(chunks, full_text, page_starts)
+        self.assertTrue(all(len(chunk.text) <= 300 for chunk in chunks))
+        self.assertTrue(any(chunk.page_start != chunk.page_end for chunk in chunks))
+
+    def test_token_strategies(self):
+        pieces, full_text, page_starts = make_pages()
+        counter = WordCounter()
+        for strategy in ('tokens', 'sentences', 'structure'):
+            with self.subTest(strategy=strategy):
+                chunks = list(Chunker(strategy, chunk_size=40, overlap=8, token_counter=counter).chunks(pieces))
+                self.assertOffsets(chunks, full_text, page_starts)
+                self.assertTrue(all(counter.count(chunk.text) <= 40 for chunk in chunks))
+
+    def test_piece_boundaries_do_not_change_chunks(self):
+        pieces, full_text, page_starts = make_pages()
+        counter = WordCounter()
+        for strategy in Chunker.strategies:
+            with self.subTest(strategy=strategy):
+                chunker = Chunker(strategy, chunk_size=40 if strategy != 'characters' else 300,
+                                  overlap=8 if strategy != 'characters' else 50, token_counter=counter)
+                self.assertEqual(list(chunker.chunks(split_small(pieces))), list(chunker.chunks(pieces)))
+
+    def test_sentences_end_on_sentence_boundaries(self):
+        pieces, full_text, page_starts = make_pages()
+        chunks = list(Chunker('sentences', chunk_size=40, overlap=0, token_counter=WordCounter()).chunks(pieces))
+        for chunk in chunks:
+            self.assertRegex(chunk.text, r"([.]|SECTION \d)$")
+
+    def test_overlap_repeats_trailing_units(self):
+        pieces, full_text, page_starts = make_pages()
+        chunks = list(Chunker('tokens', chunk_size=40, overlap=8, token_counter=WordCounter()).chunks(pieces))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLess(chunk.start, previous.end)
+
+    def test_headings_start_chunks(self):
+        pieces, full_text, page_starts = make_pages()
+        chunks = list(Chunker('structure', chunk_size=200, overlap=20, token_counter=WordCounter()).chunks(pieces))
+        heading_chunks = [chunk for chunk in chunks if "SECTION" in chunk.text]
+        self.assertEqual([chunk.text.split("\n")[0] for chunk in heading_chunks],
+                         ["SECTION 1", "SECTION 2", "SECTION 3"])
+        self.assertEqual([chunk.page_start for chunk in heading_chunks], [1, 2, 3])
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            Chunker('paragraphs')
+        with self.assertRaises(ValueError):
+            Chunker('tokens', chunk_size=50, overlap=50, token_counter=WordCounter())
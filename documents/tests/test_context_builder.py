@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from documents.context_builder import ContextBuilder, TokenCounter
+from documents.RAGService import RAGService
+
+SEAM = "This sentence is repeated at the end of one chunk and the start of the next."
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{n}" for n in range(count))
+
+
+def chunk(document_id, index, content, similarity):
+    return {
+        "chunk_id": f"{document_id}-{index}",
+        "similarity": similarity,
+        "metadata": {"document_id": document_id, "title": f"Doc {document_id}", "chunk": index},
+        "content": content,
+    }
+
+
+class WordTokenizerMixin:
+    """Writes a whitespace word-level ``tokenizer.json``: one token per word, no download needed"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+        self.tokenizer_path = os.path.join(directory, "tokenizer.json")
+        tokenizer.save(self.tokenizer_path)
+        self.counter = TokenCounter(self.tokenizer_path)
+
+
+class TokenCounterTests(WordTokenizerMixin, SimpleTestCase):
+    def test_counts_with_the_tokenizer(self):
+        self.assertEqual(self.counter.count("one two  three"), 3)
+        self.assertEqual(self.counter.count_many(["one", "one two", ""]), [1, 2, 0])
+
+    def test_truncate_keeps_the_longest_fitting_prefix(self):
+        self.assertEqual(self.counter.truncate("one two three four five", 3), "one two three")
+        self.assertEqual(self.counter.truncate("one two", 3), "one two")
+
+    def test_estimate_is_a_logged_fallback(self):
+        for counter in (TokenCounter(None), TokenCounter(os.path.join(os.path.dirname(self.tokenizer_path), "x.json"))):
+            with self.assertLogs("documents.context_builder", level="WARNING"):
+                self.assertEqual(counter.count("x" * 35), 11)
+            self.assertEqual(counter.truncate("x" * 35, 2), "x" * 7)
+
+
+class ContextBuilderTests(WordTokenizerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.builder = ContextBuilder(token_counter=self.counter)
+        self.header_tokens = self.counter.count("--- DOCUMENT 1: Doc 1 (ID: 1) ---\n")
+
+    def test_adjacent_chunks_merge_and_duplicates_drop(self):
+        segments = self.builder.merge_segments([
+            chunk(1, 1, SEAM + " Closing words.", 0.75),
+            chunk(1, 0, "Opening words. " + SEAM, 0.8),
+            chunk(2, 0, "Same text uploaded twice.", 0.72),
+            chunk(3, 0, "Same  text uploaded twice.", 0.9),
+        ])
+
+        self.assertEqual([segment["document_id"] for segment in segments], [3, 1])
+        self.assertEqual(segments[1]["content"], "Opening words. " + SEAM + " Closing words.")
+        self.assertEqual(segments[1]["score"], 0.8)
+
+    def test_pack_skips_segments_that_do_not_fit(self):
+        chunks = [chunk(1, 0, words("a", 30), 0.9), chunk(2, 0, words("b", 200), 0.8), chunk(3, 0, words("c", 20), 0.7)]
+        budget = 2 * self.header_tokens + 30 + 20 + 5
+
+        segments, used = self.builder.pack(chunks, budget)
+
+        self.assertEqual([segment["document_id"] for segment in segments], [1, 3])
+        self.assertEqual(used, 2 * self.header_tokens + 50)
+        self.assertTrue(segments[1]["header"].startswith("--- DOCUMENT 2: Doc 3"))
+
+    def test_pack_truncates_the_last_segment_to_the_budget(self):
+        chunks = [chunk(1, 0, words("a", 30), 0.9), chunk(2, 0, words("b", 200), 0.8), chunk(3, 0, words("c", 20), 0.7)]
+        budget = 2 * self.header_tokens + 30 + 100
+
+        segments, used = self.builder.pack(chunks, budget)
+
+        self.assertEqual([segment["document_id"] for segment in segments], [1, 2])
+        self.assertEqual(segments[1]["content"], words("b", 100))
+        self.assertEqual(used, budget)
+
+
+class CompletionBudgetTests(WordTokenizerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = RAGService(vector_store=mock.Mock(), groq_client=mock.Mock(), async_groq_client=mock.Mock())
+        self.service.context_builder = ContextBuilder(token_counter=self.counter)
+        self.service.context_window = 8192
+        self.service.max_tokens = 4096
+
+    def test_completion_fills_the_rest_of_the_window(self):
+        self.assertEqual(self.service.completion_max_tokens([{"role": "user", "content": "hello there"}]), 4096)
+        long_prompt = [{"role": "user", "content": words("w", 6000)}]
+        self.assertEqual(self.service.completion_max_tokens(long_prompt), 8192 - 6004)
+        huge_prompt = [{"role": "user", "content": words("w", 9000)}]
+        self.assertEqual(self.service.completion_max_tokens(huge_prompt), 256)
+
+    def test_prompt_and_answer_fit_the_window(self):
+        chunks = [chunk(n, 0, words(f"d{n}-", 1500), 0.9 - n / 100) for n in range(6)]
+        messages = self.service.build_messages("what do the documents say?", chunks)
+
+        prompt_tokens = sum(self.counter.count(message["content"]) + 4 for message in messages)
+        self.assertLessEqual(prompt_tokens + self.service.completion_max_tokens(messages), self.service.context_window)
+        self.assertIn("DOCUMENT 2: Doc 1", messages[1]["content"])
@@ -0,0 +1,68 @@
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from documents.fields import decode_vector, encode_vector
+from documents.models import Document, DocumentChunk
+
+VECTOR = np.random.default_rng(3).normal(size=1024).astype(np.float32)
+
+
+class VectorEncodingTests(SimpleTestCase):
+    def test_float32_round_trips_exactly_without_a_copy(self):
+        data = encode_vector(VECTOR)
+        self.assertEqual(len(data), 8 + 4 * VECTOR.size)
+        decoded = decode_vector(data)
+        self.assertEqual(decoded.dtype, np.float32)
+        np.testing.assert_array_equal(decoded, VECTOR)
+        self.assertFalse(decoded.flags.writeable)
+
+    def test_quantized_dtypes_stay_close(self):
+        half = decode_vector(encode_vector(VECTOR, 'float16'))
+        np.testing.assert_allclose(half, VECTOR, rtol=1e-3, atol=1e-3)
+
+        data = encode_vector(VECTOR, 'int8')
+        self.assertEqual(len(data), 8 + VECTOR.size)
+        quarter = decode_vector(data)
+        self.assertEqual(quarter.dtype, np.float32)
+        self.assertLessEqual(np.abs(quarter - VECTOR).max(), np.abs(VECTOR).max() / 127)
+
+    def test_zero_and_empty_vectors(self):
+        np.testing.assert_array_equal(decode_vector(encode_vector(np.zeros(4), 'int8')), np.zeros(4))
+        self.assertEqual(decode_vector(encode_vector([])).size, 0)
+
+
+class EmbeddingFieldTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='fields', email='fields@example.com', password='x')
+        self.document = Document.objects.create(user=user, title='Manual', file='documents/manual.txt',
+                                                file_type='txt')
+        self.field = DocumentChunk._meta.get_field('embedding')
+
+    def save_chunk(self, index, embedding):
+        chunk = DocumentChunk.objects.create(document=self.document, content="text", chunk_index=index,
+                                             embedding=embedding)
+        return DocumentChunk.objects.get(id=chunk.id)
+
+    def test_round_trip_through_the_database(self):
+        chunk = self.save_chunk(0, VECTOR.tolist())
+        self.assertIsInstance(chunk.embedding, np.ndarray)
+        np.testing.assert_array_equal(chunk.embedding, VECTOR)
+        self.assertIsNone(self.save_chunk(1, None).embedding)
+
+        stored = dict(DocumentChunk.objects.values_list('chunk_index', 'embedding'))
+        np.testing.assert_array_equal(stored[0], VECTOR)
+        self.assertEqual(self.field.value_to_string(chunk), VECTOR.tolist())
+
+    def test_rows_keep_the_dtype_they_were_written_with(self):
+        with mock.patch.object(self.field, 'storage_dtype', 'int8'):
+            quantized = self.save_chunk(0, VECTOR)
+        full = self.save_chunk(1, VECTOR)
+        quantized = DocumentChunk.objects.get(id=quantized.id)
+
+        # Read back after the setting changed: still decoded as int8
+        self.assertFalse(np.array_equal(quantized.embedding, VECTOR))
+        np.testing.assert_allclose(quantized.embedding, VECTOR, atol=np.abs(VECTOR).max() / 127)
+        np.testing.assert_array_equal(full.embedding, VECTOR)
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from documents.lexical_index import BM25Index, tokenize
+from documents.RAGService import RAGService
+
+
+class BM25IndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add(1, "The pump manual covers pressure and flow.", document_id=10)
+        self.index.add(2, "Pressure pressure pressure: the relief valve opens at 8 bar.", document_id=10)
+        self.index.add(3, "Error ERR-1042 means the pressure sensor is disconnected.", document_id=11)
+        self.index.add(4, "Invoices are due within thirty days.", document_id=12)
+
+    def test_tokenize_keeps_identifiers(self):
+        self.assertEqual(tokenize("See ERR-1042 in v2.3.1, part_no/77"), ["see", "err-1042", "in", "v2.3.1", "part_no/77"])
+
+    def test_ranks_by_term_frequency(self):
+        results = self.index.search("pressure", top_k=5)
+        self.assertEqual([chunk_id for chunk_id, _ in results][0], 2)
+        self.assertEqual({chunk_id for chunk_id, _ in results}, {1, 2, 3})
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_rare_terms_outweigh_common_ones(self):
+        results = self.index.search("pressure err-1042", top_k=1)
+        self.assertEqual(results[0][0], 3)
+
+    def test_top_k_and_no_match(self):
+        self.assertEqual(len(self.index.search("pressure", top_k=2)), 2)
+        self.assertEqual(self.index.search("turbine"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_removed_and_replaced_chunks(self):
+        self.index.remove(2)
+        self.assertNotIn(2, [chunk_id for chunk_id, _ in self.index.search("pressure")])
+        self.index.add(1, "Relief valve settings.", document_id=10)
+        self.assertNotIn(1, [chunk_id for chunk_id, _ in self.index.search("pressure")])
+        self.assertEqual(self.index.search("relief")[0][0], 1)
+        self.assertEqual(self.index.live_count, 3)
+        self.assertEqual(self.index.dead_ratio, 2 / 5)
+
+
+def hit(chunk_id, similarity=None, content=""):
+    return {"chunk_id": chunk_id, "similarity": similarity, "metadata": {}, "content": content}
+
+
+class FusionTests(SimpleTestCase):
+    def setUp(self):
+        self.vector_store = mock.Mock()
+        self.service = RAGService(vector_store=self.vector_store, groq_client=mock.Mock(),
+                                  async_groq_client=mock.Mock(), lexical_index=mock.Mock())
+
+    def test_reciprocal_rank_fusion(self):
+        vector = [hit("a", 0.9), hit("b", 0.8), hit("c", 0.75)]
+        lexical = [hit("c"), hit("a"), hit("d")]
+        fused = self.service._fuse(vector, lexical)
+
+        k = self.service.rrf_k
+        self.assertEqual([chunk["chunk_id"] for chunk in fused], ["a", "c", "b", "d"])
+        self.assertAlmostEqual(fused[0]["score"], 1 / (k + 1) + 1 / (k + 2))
+        self.assertAlmostEqual(fused[1]["score"], 1 / (k + 3) + 1 / (k + 1))
+        self.assertAlmostEqual(fused[2]["score"], 1 / (k + 2))
+        self.assertAlmostEqual(fused[3]["score"], 1 / (k + 3))
+        # Vector similarity survives fusion; lexical-only hits have none
+        self.assertEqual(fused[1]["similarity"], 0.75)
+        self.assertIsNone(fused[3]["similarity"])
+
+    def test_fusion_keeps_top_k(self):
+        vector = [hit(f"v{n}", 0.9) for n in range(4)]
+        lexical = [hit(f"l{n}") for n in range(4)]
+        self.assertEqual(len(self.service._fuse(vector, lexical)), self.service.top_k)
+
+    def test_exact_identifier_match_skips_vector_search(self):
+        lexical = [hit(3, content="Error ERR-1042 means the pressure sensor is disconnected.")]
+        with mock.patch.object(self.service, "_lexical_chunks", return_value=lexical):
+            self.assertEqual(self.service.retrieve_relevant_chunks("what is ERR-1042?"), lexical)
+        self.vector_store.generate_embedding.assert_not_called()
+        self.vector_store.search.assert_not_called()
+
+    def test_vector_and_lexical_results_are_fused(self):
+        self.vector_store.generate_embedding.return_value = [1.0, 0.0]
+        self.vector_store.search.return_value = [("b", 0.9, {"text": "b"}), ("x", 0.5, {"text": "x"})]
+        with mock.patch.object(self.service, "_lexical_chunks", return_value=[hit("a"), hit("b")]):
+            chunks = self.service.retrieve_relevant_chunks("relief valve pressure")
+        # "x" is below the similarity threshold; "b" is ranked by both retrievers
+        self.assertEqual([chunk["chunk_id"] for chunk in chunks], ["b", "a"])
+
+    def test_lexical_results_survive_vector_failure(self):
+        self.vector_store.generate_embedding.side_effect = RuntimeError("pinecone is down")
+        with mock.patch.object(self.service, "_lexical_chunks", return_value=[hit("a")]), \
+                self.assertLogs("documents.RAGService", "ERROR"):
+            self.assertEqual([chunk["chunk_id"] for chunk in self.service.retrieve_relevant_chunks("valve")], ["a"])
+
+    def test_numbers_and_hyphenated_words_still_reach_the_vector_store(self):
+        self.vector_store.generate_embedding.return_value = [1.0, 0.0]
+        self.vector_store.search.return_value = []
+        for query, content in (("revenue in 2024", "Revenue in 2024 grew by 12 percent."),
+                               ("e-mail policy", "The e-mail policy covers retention.")):
+            with mock.patch.object(self.service, "_lexical_chunks", return_value=[hit(3, content=content)]):
+                self.service.retrieve_relevant_chunks(query)
+            self.vector_store.generate_embedding.assert_called_with(query)
+        self.assertEqual(self.vector_store.search.call_count, 2)
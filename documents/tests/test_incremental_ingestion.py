@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from documents.chunking import Chunker
+from documents.document_processor import process_document
+from documents.models import Document, DocumentChunk
+
+
+class RecordingVectorStore:
+    """Stands in for the vector store and records every embed, upsert and delete"""
+
+    def __init__(self):
+        self.embedded = []
+        self.upserted = []
+        self.deleted = []
+
+    def _get_user_namespace(self, user_id=None):
+        return f"user_{user_id}" if user_id else "global"
+
+    def add_documents(self, chunk_ids, texts, user_id=None, metadatas=None, embeddings=None, namespaces=None,
+                      on_embedded=None, on_indexed=None):
+        indexes = list(range(len(chunk_ids)))
+        if embeddings is None:
+            self.embedded.extend(texts)
+            embeddings = np.ones((len(texts), 4), dtype=np.float32)
+            if on_embedded:
+                on_embedded(indexes, embeddings)
+        for namespace in namespaces:
+            self.upserted.extend((namespace, chunk_id) for chunk_id in chunk_ids)
+            if on_indexed:
+                on_indexed(namespace, indexes)
+
+    def delete_documents(self, chunk_ids, namespaces=None):
+        self.deleted.extend((namespace, chunk_id) for namespace in namespaces for chunk_id in chunk_ids)
+
+    def reset(self):
+        self.embedded, self.upserted, self.deleted = [], [], []
+
+
+def make_text(edited=None):
+    sentences = [f"Sentence {n} describes the maintenance of unit {n:03d} in detail." for n in range(120)]
+    if edited is not None:
+        sentences[edited] = sentences[edited].replace("maintenance", "inspection ")
+    return " ".join(sentences)
+
+
+class IncrementalIngestionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.store = RecordingVectorStore()
+        for name, value in (('get_vector_store', lambda: self.store),
+                            ('get_chunker', lambda: Chunker('characters', chunk_size=300, overlap=60)),
+                            ('get_artifact_store', lambda: None),
+                            ('get_page_ocr', lambda: None)):
+            patcher = mock.patch(f'documents.document_processor.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        user = get_user_model().objects.create_user(username='ingest', email='ingest@example.com', password='x')
+        self.document = Document.objects.create(
+            user=user, title='Manual', file=ContentFile(make_text().encode(), name='manual.txt'), file_type='txt'
+        )
+
+    def replace_file(self, text):
+        self.document.file.delete(save=False)
+        self.document.file.save('manual.txt', ContentFile(text.encode()))
+        self.document.content_hash = ''
+        self.document.save(update_fields=['content_hash'])
+
+    def chunk_rows(self):
+        return dict(DocumentChunk.objects.filter(document=self.document).values_list('content', 'id'))
+
+    def test_first_run_embeds_every_chunk_once(self):
+        process_document(self.document.id)
+        self.document.refresh_from_db()
+
+        self.assertEqual(self.document.status, 'completed')
+        rows = self.chunk_rows()
+        self.assertEqual(len(rows), self.document.total_chunks)
+        self.assertEqual(
+            set(DocumentChunk.objects.filter(document=self.document).values_list('metadata__total_chunks', flat=True)),
+            {self.document.total_chunks}
+        )
+        self.assertEqual(sorted(self.store.embedded), sorted(rows))
+        # One embedding per chunk, upserted to the user and global namespaces
+        self.assertEqual(len(self.store.upserted), 2 * len(rows))
+
+    def test_unchanged_rerun_embeds_nothing(self):
+        process_document(self.document.id)
+        before = self.chunk_rows()
+        self.store.reset()
+
+        process_document(self.document.id)
+
+        self.assertEqual(self.store.embedded, [])
+        self.assertEqual(self.store.upserted, [])
+        self.assertEqual(self.store.deleted, [])
+        self.assertEqual(self.chunk_rows(), before)
+
+    def test_edit_reembeds_only_changed_chunks(self):
+        process_document(self.document.id)
+        before = self.chunk_rows()
+        self.store.reset()
+
+        self.replace_file(make_text(edited=60))
+        process_document(self.document.id)
+        after = self.chunk_rows()
+
+        changed = set(after) - set(before)
+        removed = set(before) - set(after)
+        self.assertTrue(0 < len(changed) <= 2)
+        self.assertLess(len(changed), len(after) // 10)
+        self.assertEqual(sorted(self.store.embedded), sorted(changed))
+        # Unchanged chunks keep their rows; replaced ones are deleted along with their vectors
+        for text in set(after) & set(before):
+            self.assertEqual(after[text], before[text])
+        self.assertEqual(sorted(self.store.deleted),
+                         sorted((namespace, before[text]) for text in removed
+                                for namespace in (f"user_{self.document.user_id}", "global")))
+
+    def test_full_rebuild_reembeds_everything(self):
+        process_document(self.document.id)
+        count = len(self.store.embedded)
+        self.store.reset()
+
+        process_document(self.document.id, incremental=False)
+
+        self.assertEqual(len(self.store.embedded), count)
+        self.assertEqual(len(self.store.deleted), 2 * count)
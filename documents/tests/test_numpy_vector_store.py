@@ -0,0 +1,109 @@
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from documents.models import Document, DocumentChunk
+from documents.numpy_vector_store import NamespaceIndex, NumpyVectorStore, _normalize
+
+
+def unit(*values):
+    return _normalize(np.array(values, dtype=np.float32))
+
+
+class NamespaceIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = NamespaceIndex(3, capacity=2)
+        self.index.upsert(
+            [1, 2, 3],
+            _normalize([[1, 0, 0], [0, 1, 0], [0, 0, 1]]),
+            [{"lang": "en"}, {"lang": "de"}, {"lang": "fr"}],
+        )
+
+    def assert_consistent(self):
+        for chunk_id, row in self.index.positions.items():
+            self.assertEqual(int(self.index.ids[row]), chunk_id)
+        self.assertEqual(len(self.index.metadatas), self.index.size)
+        self.assertEqual(sorted(self.index.positions.values()), list(range(self.index.size)))
+
+    def test_upsert_grows_and_replaces_in_place(self):
+        self.assertEqual(self.index.size, 3)
+        self.assertGreaterEqual(self.index.vectors.shape[0], 3)
+
+        self.index.upsert([2], unit(1, 1, 0)[None], [{"lang": "nl"}])
+
+        self.assertEqual(self.index.size, 3)
+        self.assert_consistent()
+        chunk_id, score, metadata = self.index.search(unit(1, 1, 0), 1)[0]
+        self.assertEqual((chunk_id, metadata), (2, {"lang": "nl"}))
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+    def test_remove_moves_the_last_row_into_the_hole(self):
+        self.assertTrue(self.index.remove(1))
+        self.assertFalse(self.index.remove(1))
+
+        self.assertEqual(self.index.size, 2)
+        self.assertEqual(self.index.positions[3], 0)
+        self.assert_consistent()
+        # The moved row keeps its vector and metadata
+        self.assertEqual(self.index.search(unit(0, 0, 1), 1), [(3, mock.ANY, {"lang": "fr"})])
+        self.assertNotIn(1, [chunk_id for chunk_id, _, _ in self.index.search(unit(1, 0, 0), 3)])
+
+        self.assertTrue(self.index.remove(3))
+        self.assertTrue(self.index.remove(2))
+        self.assertEqual(self.index.search(unit(1, 0, 0), 3), [])
+
+    def test_search_applies_metadata_filters(self):
+        query = unit(1, 0.5, 0.2)
+        self.assertEqual([hit[0] for hit in self.index.search(query, 3)], [1, 2, 3])
+        self.assertEqual([hit[0] for hit in self.index.search(query, 3, {"lang": "de"})], [2])
+        self.assertEqual([hit[0] for hit in self.index.search(query, 3, {"lang": {"$in": ["fr", "en"]}})], [1, 3])
+        self.assertEqual([hit[0] for hit in self.index.search(query, 3, {"lang": {"$nin": ["en"]}})], [2, 3])
+        self.assertEqual([hit[0] for hit in self.index.search(query, 1, {"lang": {"$ne": "en"}})], [2])
+        self.assertEqual(self.index.search(query, 3, {"lang": "it"}), [])
+
+
+class NamespaceReloadTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='vectors', email='vectors@example.com', password='x')
+        self.document = Document.objects.create(user=user, title='Manual', file='documents/manual.txt',
+                                                file_type='txt')
+        self.namespace = f"user_{user.id}"
+        self.add_chunk(0, [1, 0, 0, 0])
+        self.add_chunk(1, [0, 1, 0, 0])
+
+        self.store = NumpyVectorStore(embedder=mock.Mock(), embedding_dimension=4)
+        self.store.refresh_seconds = 0
+
+    def add_chunk(self, index, embedding):
+        return DocumentChunk.objects.create(document=self.document, content=f"chunk {index}", chunk_index=index,
+                                            embedding=np.array(embedding, dtype=np.float32))
+
+    def test_reloads_only_when_the_signature_changes(self):
+        with mock.patch.object(self.store, '_load_namespace', wraps=self.store._load_namespace) as load:
+            self.assertEqual(self.store._get_namespace(self.namespace).size, 2)
+            self.store._get_namespace(self.namespace)
+            self.assertEqual(load.call_count, 1)
+
+            # Written by another process: a new row raises the count and the highest id
+            added = self.add_chunk(2, [0, 0, 1, 0])
+            index = self.store._get_namespace(self.namespace)
+            self.assertEqual(load.call_count, 2)
+            self.assertEqual(index.search(unit(0, 0, 1, 0), 1)[0][0], added.id)
+
+            # Same count, higher id: a replaced row is picked up too
+            DocumentChunk.objects.filter(chunk_index=0).delete()
+            replaced = self.add_chunk(3, [0, 0, 0, 1])
+            index = self.store._get_namespace(self.namespace)
+            self.assertEqual(load.call_count, 3)
+            self.assertEqual(index.size, 3)
+            self.assertEqual(index.search(unit(0, 0, 0, 1), 1)[0][0], replaced.id)
+
+    def test_refresh_interval_limits_signature_checks(self):
+        self.store.refresh_seconds = 3600
+        self.store._get_namespace(self.namespace)
+        self.add_chunk(2, [0, 0, 1, 0])
+        with mock.patch.object(self.store, '_db_signature') as signature:
+            self.assertEqual(self.store._get_namespace(self.namespace).size, 2)
+        signature.assert_not_called()
@@ -0,0 +1,110 @@
+import threading
+import time
+from email.utils import formatdate
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from documents.rate_limit import AdaptiveLimiter, _parse_delay, retry_delay
+
+
+class ApiError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class RetryDelayTests(SimpleTestCase):
+    def test_parses_header_formats(self):
+        self.assertEqual(_parse_delay("3"), 3.0)
+        self.assertEqual(_parse_delay("1.5s"), 1.5)
+        self.assertEqual(_parse_delay("200ms"), 0.2)
+        self.assertAlmostEqual(_parse_delay(formatdate(time.time() + 30, usegmt=True)), 30, delta=2)
+        self.assertIsNone(_parse_delay("soon"))
+        self.assertIsNone(_parse_delay(None))
+
+    def test_only_throttling_is_retried(self):
+        self.assertIsNone(retry_delay(ApiError(500), 0))
+        self.assertIsNone(retry_delay(ValueError("bad input"), 0))
+        self.assertEqual(retry_delay(ApiError(429, {"Retry-After": "2"}), 0), 2.0)
+        self.assertEqual(retry_delay(ApiError(503, {"x-ratelimit-reset-requests": "250ms"}), 0), 0.25)
+        self.assertEqual(retry_delay(ApiError(429, {"retry-after": "600"}), 0), 60.0)
+        for attempt in range(4):
+            delay = retry_delay(ApiError(429), attempt)
+            self.assertTrue(2 ** attempt / 2 <= delay <= 2 ** attempt)
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_throttling_halves_and_successes_restore_the_limit(self):
+        limiter = AdaptiveLimiter(8)
+        for expected in (4, 2, 1, 1):
+            limiter.acquire()
+            limiter.release(retry_after=0)
+            self.assertEqual(limiter.limit, expected)
+        self.assertEqual(limiter.throttled, 4)
+
+        # Other failures leave the limit alone and do not count as successes
+        limiter.acquire()
+        limiter.release(succeeded=False)
+        self.assertEqual(limiter.limit, 1)
+
+        for expected in (2, 2, 3):
+            limiter.acquire()
+            limiter.release()
+            self.assertEqual(limiter.limit, expected)
+
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(limiter.limit, 8)
+
+    def test_concurrency_never_exceeds_the_limit(self):
+        limiter = AdaptiveLimiter(3)
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def work():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+
+        threads = [threading.Thread(target=limiter.call, args=(work,)) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(peak), 12)
+        self.assertLessEqual(max(peak), 3)
+        self.assertEqual(limiter.stats()["active"], 0)
+
+    def test_throttle_pauses_every_caller(self):
+        limiter = AdaptiveLimiter(4)
+        limiter.acquire()
+        limiter.release(retry_after=0.2)
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        limiter.release()
+
+    def test_call_retries_only_rate_limited_attempts(self):
+        limiter = AdaptiveLimiter(4, max_retries=2)
+        fn = mock.Mock(side_effect=[ApiError(429, {"retry-after": "0"}), "ok"])
+        self.assertEqual(limiter.call(fn, "x"), "ok")
+        self.assertEqual(fn.call_count, 2)
+
+        fn = mock.Mock(side_effect=ApiError(500))
+        with self.assertRaises(ApiError):
+            limiter.call(fn)
+        self.assertEqual(fn.call_count, 1)
+
+        fn = mock.Mock(side_effect=ApiError(429, {"retry-after": "0"}))
+        with self.assertRaises(ApiError):
+            limiter.call(fn)
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(limiter.stats()["active"], 0)
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase
+
+from documents.answer_cache import SemanticAnswerCache
+from documents.context_builder import ContextBuilder
+from documents.RAGService import RAGService
+
+
+class WordCounter:
+    """Deterministic token counter: one token per whitespace-separated word"""
+
+    def count(self, text):
+        return len(text.split())
+
+
+def delta(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class StreamingAnswerCacheTests(TestCase):
+    def setUp(self):
+        self.vector_store = mock.Mock()
+        self.vector_store.generate_embedding.return_value = [1.0, 0.0, 0.0]
+        self.groq_client = mock.Mock()
+        self.groq_client.chat.completions.create.return_value = [delta("Hello"), delta(" world")]
+        self.service = RAGService(vector_store=self.vector_store, groq_client=self.groq_client,
+                                  async_groq_client=mock.Mock(), answer_cache=SemanticAnswerCache())
+        self.service.context_builder = ContextBuilder(token_counter=WordCounter())
+        patcher = mock.patch.object(self.service, "retrieve_relevant_chunks", return_value=[])
+        self.retrieve = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_completed_stream_is_cached_and_replayed_as_one_delta(self):
+        events = list(self.service.stream_response("hi", scope=1))
+        self.assertEqual(events, [("sources", []), ("token", "Hello"), ("token", " world")])
+
+        events = list(self.service.stream_response("hi", scope=1))
+        self.assertEqual(events, [("sources", []), ("token", "Hello world")])
+        self.assertEqual(self.groq_client.chat.completions.create.call_count, 1)
+        self.assertEqual(self.retrieve.call_count, 1)
+
+    def test_cache_is_scoped_and_can_be_bypassed(self):
+        list(self.service.stream_response("hi", scope=1))
+        list(self.service.stream_response("hi", scope=2))
+        list(self.service.stream_response("hi", scope=1, use_cache=False))
+        self.assertEqual(self.groq_client.chat.completions.create.call_count, 3)
+
+    def test_failed_stream_is_not_cached(self):
+        self.groq_client.chat.completions.create.side_effect = RuntimeError("rate limited")
+        events = list(self.service.stream_response("hi", scope=1))
+        self.assertEqual(events[-1][0], "error")
+        self.assertIsNone(self.service.answer_cache.lookup(1, [1.0, 0.0, 0.0]))
+
+    def test_embedding_failure_streams_without_the_cache(self):
+        self.vector_store.generate_embedding.side_effect = RuntimeError("embedding API down")
+        events = list(self.service.stream_response("hi", scope=1))
+        self.assertEqual(events, [("sources", []), ("token", "Hello"), ("token", " world")])
+        self.retrieve.assert_called_once_with("hi", query_embedding=None)
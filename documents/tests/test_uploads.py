@@ -0,0 +1,118 @@
+import fcntl
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from documents.models import UploadSession
+from documents.uploads import (
+    UploadError, abort_session, append_chunk, create_session, expire_sessions, staging_path
+)
+
+PAYLOAD = b"".join(f"line {n}: resumable uploads keep every byte that arrived\n".encode() for n in range(200))
+
+
+class BrokenStream(io.BytesIO):
+    """A request body whose connection drops after ``limit`` bytes"""
+
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise ConnectionResetError("client went away")
+        return super().read(min(size, self.limit - self.tell()))
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=os.path.join(root, 'media'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        environ = mock.patch.dict(os.environ, {'UPLOAD_STAGING_ROOT': os.path.join(root, 'staging')})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        self.user = get_user_model().objects.create_user(username='uploader', email='up@example.com', password='x')
+
+    def send(self, session, start, end):
+        return append_chunk(session, start, io.BytesIO(PAYLOAD[start:end]), end - start)
+
+    def test_chunks_assemble_into_a_queued_document(self):
+        session = create_session(self.user, 'manual.txt', len(PAYLOAD),
+                                 checksum=hashlib.sha256(PAYLOAD).hexdigest())
+        session = self.send(session, 0, 4000)
+        self.assertEqual((session.status, session.offset), ('uploading', 4000))
+
+        session = self.send(session, 4000, len(PAYLOAD))
+        self.assertEqual(session.status, 'completed')
+        document = session.document
+        document.refresh_from_db()
+        self.assertEqual(document.status, 'queued')
+        self.assertEqual(document.content_hash, hashlib.sha256(PAYLOAD).hexdigest())
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), PAYLOAD)
+        self.assertFalse(os.path.exists(staging_path(session)))
+
+    def test_interrupted_chunk_keeps_its_bytes_and_resumes(self):
+        session = create_session(self.user, 'manual.txt', len(PAYLOAD))
+        with self.assertRaises(UploadError):
+            append_chunk(session, 0, BrokenStream(PAYLOAD, 2500), len(PAYLOAD))
+        session.refresh_from_db()
+        self.assertEqual(session.offset, 2500)
+
+        with self.assertRaises(UploadError) as raised:
+            self.send(session, 0, len(PAYLOAD))
+        self.assertEqual(raised.exception.status, 409)
+
+        session = self.send(session, 2500, len(PAYLOAD))
+        self.assertEqual(session.status, 'completed')
+        self.assertEqual(session.document.content_hash, hashlib.sha256(PAYLOAD).hexdigest())
+
+    def test_checksum_mismatch_aborts(self):
+        session = create_session(self.user, 'manual.txt', len(PAYLOAD), checksum='0' * 64)
+        with self.assertRaises(UploadError) as raised:
+            self.send(session, 0, len(PAYLOAD))
+        self.assertEqual(raised.exception.status, 422)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'aborted')
+        self.assertIsNone(session.document)
+        self.assertFalse(os.path.exists(staging_path(session)))
+
+    def test_abort_is_refused_while_a_chunk_is_written(self):
+        session = create_session(self.user, 'manual.txt', len(PAYLOAD))
+        with open(staging_path(session), 'r+b') as writer:
+            fcntl.flock(writer, fcntl.LOCK_EX)
+            with self.assertRaises(UploadError) as raised:
+                abort_session(session)
+            self.assertEqual(raised.exception.status, 409)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'uploading')
+
+        abort_session(session)
+        self.assertEqual(session.status, 'aborted')
+        with self.assertRaises(UploadError) as raised:
+            self.send(session, 0, 10)
+        self.assertEqual(raised.exception.status, 409)
+
+    def test_expiry_skips_sessions_receiving_a_chunk(self):
+        idle = create_session(self.user, 'idle.txt', len(PAYLOAD))
+        busy = create_session(self.user, 'busy.txt', len(PAYLOAD))
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        with open(staging_path(busy), 'r+b') as writer:
+            fcntl.flock(writer, fcntl.LOCK_EX)
+            self.assertEqual(expire_sessions(), 1)
+        idle.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((idle.status, busy.status), ('aborted', 'uploading'))
@@ -0,0 +1,117 @@
+import os
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from documents import vector_gc
+from documents.models import Document, DocumentChunk, VectorDeletion
+
+
+class FakeVectorStore:
+    """Namespaced id sets with the deletion and listing API of the vector stores"""
+
+    def __init__(self, namespaces=None, fail=False):
+        self.namespaces = {name: set(ids) for name, ids in (namespaces or {}).items()}
+        self.fail = fail
+        self.calls = []
+
+    def delete_documents(self, chunk_ids, user_id=None, namespaces=None):
+        if self.fail:
+            raise ConnectionError("vector store unavailable")
+        for namespace in namespaces:
+            self.calls.append((namespace, sorted(chunk_ids)))
+            self.namespaces.get(namespace, set()).difference_update(chunk_ids)
+
+    def list_namespaces(self):
+        return sorted(self.namespaces)
+
+    def list_ids(self, namespace, page_size=2):
+        ids = sorted(self.namespaces[namespace], key=str)
+        for i in range(0, len(ids), page_size):
+            yield ids[i:i + page_size]
+
+
+class VectorGcTests(TestCase):
+    def setUp(self):
+        users = get_user_model().objects
+        self.owner = users.create_user(username='owner', email='owner@example.com', password='x')
+        self.other = users.create_user(username='other', email='other@example.com', password='x')
+        self.document = self.make_document(self.owner, 3)
+        self.others_document = self.make_document(self.other, 1)
+
+    def make_document(self, user, chunks):
+        document = Document.objects.create(user=user, title='Manual', file='documents/manual.txt', file_type='txt')
+        DocumentChunk.objects.bulk_create(
+            [DocumentChunk(document=document, content=f"chunk {n}", chunk_index=n) for n in range(chunks)]
+        )
+        return document
+
+    def chunk_ids(self, document):
+        return sorted(DocumentChunk.objects.filter(document=document).values_list('id', flat=True))
+
+    def test_deleting_a_document_queues_its_vectors(self):
+        chunk_ids = self.chunk_ids(self.document)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.document.delete()
+
+        entries = VectorDeletion.objects.all()
+        self.assertEqual(sorted(entry.chunk_id for entry in entries), chunk_ids)
+        self.assertEqual({tuple(entry.namespaces) for entry in entries}, {(f"user_{self.owner.id}", "global")})
+        self.assertEqual(callbacks, [vector_gc.request_flush])
+
+    def test_flush_deletes_in_batches_and_empties_the_outbox(self):
+        chunk_ids = self.chunk_ids(self.document)
+        self.document.delete()
+        store = FakeVectorStore({f"user_{self.owner.id}": chunk_ids, "global": chunk_ids})
+
+        with mock.patch.dict(os.environ, {'VECTOR_GC_BATCH_SIZE': '2'}):
+            self.assertEqual(vector_gc.flush(vector_store=store), 3)
+
+        self.assertFalse(VectorDeletion.objects.exists())
+        self.assertEqual(store.namespaces, {f"user_{self.owner.id}": set(), "global": set()})
+        # One request per namespace and batch
+        self.assertEqual(len(store.calls), 4)
+
+    def test_failed_flush_keeps_entries_for_the_next_run(self):
+        self.document.delete()
+
+        self.assertEqual(vector_gc.flush(vector_store=FakeVectorStore(fail=True)), 0)
+
+        entries = VectorDeletion.objects.all()
+        self.assertEqual(len(entries), 3)
+        self.assertTrue(all(entry.attempts == 1 for entry in entries))
+        self.assertIn("vector store unavailable", entries[0].last_error)
+        self.assertEqual(vector_gc.flush(vector_store=FakeVectorStore()), 3)
+
+    def test_flush_can_be_limited_to_some_chunks(self):
+        first, *rest = self.chunk_ids(self.document)
+        vector_gc.queue_deletions([first, *rest], ["global"])
+        store = FakeVectorStore()
+
+        self.assertEqual(vector_gc.flush(chunk_ids=[first], vector_store=store), 1)
+
+        self.assertEqual(store.calls, [("global", [first])])
+        self.assertEqual(sorted(VectorDeletion.objects.values_list('chunk_id', flat=True)), rest)
+
+    def test_reconcile_deletes_orphans_per_namespace(self):
+        live = self.chunk_ids(self.document)
+        foreign = self.chunk_ids(self.others_document)
+        orphan = max(live + foreign) + 100
+        store = FakeVectorStore({
+            f"user_{self.owner.id}": live + foreign + [orphan],
+            "global": live + foreign + [orphan],
+            "scratch": [orphan],
+        })
+
+        self.assertEqual(vector_gc.reconcile(vector_store=store, dry_run=True),
+                         {f"user_{self.owner.id}": 2, "global": 1})
+        self.assertEqual(store.calls, [])
+
+        vector_gc.reconcile(vector_store=store)
+        self.assertEqual(store.namespaces[f"user_{self.owner.id}"], set(live))
+        self.assertEqual(store.namespaces["global"], set(live + foreign))
+        self.assertEqual(store.namespaces["scratch"], {orphan})
+
+    def test_reconcile_skips_stores_that_rebuild_from_the_database(self):
+        self.assertEqual(vector_gc.reconcile(vector_store=mock.Mock(spec=['delete_documents'])), {})
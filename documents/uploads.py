@@ -0,0 +1,244 @@
+# documents/uploads.py
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from decouple import config
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .extraction import SUPPORTED_FILE_TYPES
+from .ingestion_queue import enqueue_documents
+from .models import Document, UploadSession
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024
+MAX_CACHED_HASHERS = 64
+
+
+class UploadError(Exception):
+    """A request the upload cannot accept; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _settings():
+    from django.conf import settings
+    return {
+        'max_bytes': config('UPLOAD_MAX_BYTES', default=2 * 1024 ** 3, cast=int),
+        'max_chunk_bytes': config('UPLOAD_MAX_CHUNK_BYTES', default=64 * 1024 ** 2, cast=int),
+        'ttl_seconds': config('UPLOAD_SESSION_TTL_SECONDS', default=86400, cast=int),
+        'staging_root': config('UPLOAD_STAGING_ROOT', default=os.path.join(settings.BASE_DIR, 'upload_staging')),
+    }
+
+
+def staging_path(session):
+    return os.path.join(_settings()['staging_root'], f"{session.id}.part")
+
+
+class _StagedFile(File):
+    """A fully staged upload handed to storage; FileSystemStorage moves it instead of copying"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+# sha256 state of in-progress uploads, so consecutive chunks are hashed as they
+# stream in. hashlib state cannot be persisted: a chunk landing on another
+# worker process re-hashes the staged bytes once to catch up.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def _take_hasher(session_id, offset, file):
+    with _hashers_lock:
+        entry = _hashers.pop(session_id, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    hasher = hashlib.sha256()
+    file.seek(0)
+    remaining = offset
+    while remaining:
+        block = file.read(min(BLOCK_SIZE, remaining))
+        if not block:
+            break
+        hasher.update(block)
+        remaining -= len(block)
+    return hasher
+
+
+def _keep_hasher(session_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        while len(_hashers) > MAX_CACHED_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def create_session(user, filename, size, title=None, checksum=''):
+    """Start a resumable upload of ``size`` bytes"""
+    settings = _settings()
+    file_type = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if file_type not in SUPPORTED_FILE_TYPES:
+        raise UploadError(f"Unsupported file type: {file_type or filename}")
+    if size > settings['max_bytes']:
+        raise UploadError(f"File is larger than the {settings['max_bytes']} byte limit", status=413)
+
+    session = UploadSession.objects.create(
+        user=user,
+        title=title or filename,
+        filename=os.path.basename(filename),
+        file_type=file_type,
+        size=size,
+        checksum=(checksum or '').lower(),
+    )
+    os.makedirs(settings['staging_root'], exist_ok=True)
+    open(staging_path(session), 'wb').close()
+    return session
+
+
+def append_chunk(session, offset, stream, length):
+    """Write ``length`` bytes read from ``stream`` at ``offset`` of the upload.
+
+    Bytes are written straight to the staging file and hashed on the way;
+    nothing is buffered beyond one block. A chunk cut short by a dropped
+    connection still keeps the bytes that arrived, so the client resumes
+    from the new ``offset`` instead of resending the whole chunk. When the
+    last byte arrives the upload becomes a ``Document`` queued for processing.
+    """
+    settings = _settings()
+    if length > settings['max_chunk_bytes']:
+        raise UploadError(f"Chunks may be at most {settings['max_chunk_bytes']} bytes", status=413)
+
+    path = staging_path(session)
+    try:
+        file = open(path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError(f"Upload is {session.status}", status=409)
+
+    with file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another request is writing to this upload", status=409)
+
+        # Only the lock holder writes, so the stored offset is authoritative now
+        session.refresh_from_db(fields=['offset', 'status'])
+        if session.status != 'uploading':
+            raise UploadError(f"Upload is {session.status}", status=409)
+        if offset != session.offset:
+            raise UploadError(f"Expected offset {session.offset}", status=409)
+        if offset + length > session.size:
+            raise UploadError(f"Chunk ends past the declared size of {session.size} bytes")
+
+        hasher = _take_hasher(session.id, offset, file)
+        # Drop anything left past the offset by a write that never got recorded
+        file.seek(offset)
+        file.truncate()
+
+        written = 0
+        error = None
+        try:
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written)) if stream is not None else b''
+                if not block:
+                    break
+                file.write(block)
+                hasher.update(block)
+                written += len(block)
+        except Exception as e:
+            error = e
+        file.flush()
+        os.fsync(file.fileno())
+
+        session.offset = offset + written
+        session.updated_at = timezone.now()
+        UploadSession.objects.filter(id=session.id).update(offset=session.offset, updated_at=session.updated_at)
+
+        if error is not None or written < length:
+            _keep_hasher(session.id, session.offset, hasher)
+            logger.warning(f"Upload {session.id} chunk interrupted at byte {session.offset}: {error or 'short body'}")
+            raise UploadError(f"Chunk interrupted; resume from offset {session.offset}")
+
+        if session.offset < session.size:
+            _keep_hasher(session.id, session.offset, hasher)
+            return session
+        return _complete(session, path, hasher.hexdigest())
+
+
+def _complete(session, path, digest):
+    if session.checksum and session.checksum != digest:
+        _discard(session)  # the caller holds the staging file lock
+        raise UploadError("Checksum mismatch: the uploaded file is corrupt, start a new upload", status=422)
+
+    with transaction.atomic():
+        document = Document(
+            user=session.user,
+            title=session.title,
+            file_type=session.file_type,
+            content_hash=digest,
+        )
+        with open(path, 'rb') as staged:
+            document.file.save(session.filename, _StagedFile(staged, name=session.filename), save=False)
+        document.save()
+        session.status = 'completed'
+        session.document = document
+        session.save(update_fields=['status', 'document', 'updated_at'])
+        enqueue_documents([document.id])
+
+    if os.path.exists(path):
+        os.remove(path)  # non-filesystem storages copy rather than move
+    logger.info(f"Upload {session.id} completed as document {document.id} ({session.size} bytes)")
+    return session
+
+
+def abort_session(session):
+    """Cancel an upload and discard its staged bytes
+
+    Takes the staging file lock, so a chunk being written (possibly the last
+    one) finishes first; raises ``UploadError`` (409) instead of waiting.
+    """
+    try:
+        file = open(staging_path(session), 'r+b')
+    except FileNotFoundError:
+        _discard(session)
+        return
+    with file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another request is writing to this upload", status=409)
+        _discard(session)
+
+
+def _discard(session):
+    """Mark a still-uploading session aborted and delete its staging file; call with the lock held"""
+    UploadSession.objects.filter(id=session.id, status='uploading').update(status='aborted', updated_at=timezone.now())
+    session.refresh_from_db(fields=['status', 'updated_at'])
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    try:
+        os.remove(staging_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expire_sessions(now=None):
+    """Abort uploads that saw no bytes for ``UPLOAD_SESSION_TTL_SECONDS``; returns how many"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=_settings()['ttl_seconds'])
+    expired = 0
+    for session in UploadSession.objects.filter(status='uploading', updated_at__lt=cutoff):
+        try:
+            abort_session(session)
+        except UploadError:
+            continue  # a chunk is arriving right now, so it is not abandoned
+        expired += 1
+    if expired:
+        logger.info(f"Expired {expired} abandoned uploads")
+    return expired
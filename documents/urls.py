@@ -1,11 +1,14 @@
 # documents/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DocumentViewSet
+from .views import DocumentViewSet, create_upload, health_check, upload_detail
 
 router = DefaultRouter()
 router.register(r'documents', DocumentViewSet, basename='document')
 
 urlpatterns = [
+    path('health/', health_check, name='health_check'),
+    path('uploads/', create_upload, name='create_upload'),
+    path('uploads/<uuid:upload_id>/', upload_detail, name='upload_detail'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
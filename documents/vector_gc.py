@@ -0,0 +1,135 @@
+# documents/vector_gc.py
+import logging
+from decouple import config
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from .models import Document, DocumentChunk, VectorDeletion
+
+logger = logging.getLogger(__name__)
+
+
+def owner_namespaces(user_id):
+    """Namespaces a user's chunks are indexed in (see ``_get_user_namespace`` on the vector stores)"""
+    return [f"user_{user_id}", "global"]
+
+
+def request_flush():
+    """Ask a worker to flush the deletion outbox; the periodic beat entry covers a lost request"""
+    from .tasks import flush_vector_deletions
+    try:
+        flush_vector_deletions.apply_async()
+    except Exception as e:
+        logger.warning(f"Could not request a vector deletion flush: {e}")
+
+
+def queue_deletions(chunk_ids, namespaces):
+    """Record vectors to delete in the outbox, in the caller's transaction"""
+    VectorDeletion.objects.bulk_create(
+        [VectorDeletion(chunk_id=chunk_id, namespaces=namespaces) for chunk_id in chunk_ids], batch_size=1000
+    )
+    transaction.on_commit(request_flush)
+
+
+@receiver(pre_delete, sender=Document)
+def capture_document_vectors(sender, instance, **kwargs):
+    """Queue a document's vectors for deletion before its chunks cascade away"""
+    chunk_ids = list(DocumentChunk.objects.filter(document_id=instance.id).values_list('id', flat=True))
+    if chunk_ids:
+        queue_deletions(chunk_ids, owner_namespaces(instance.user_id))
+
+
+def flush(chunk_ids=None, vector_store=None):
+    """Delete queued vectors from the vector store; returns how many chunks were purged.
+
+    Entries are taken oldest first in batches of ``VECTOR_GC_BATCH_SIZE`` and
+    deleted with one batched request per namespace. An entry is removed from
+    the outbox only after its vectors are gone, so a failure just leaves it
+    for the next run. Pass ``chunk_ids`` to flush only those entries.
+    """
+    from .services import get_vector_store
+    vector_store = vector_store or get_vector_store()
+    batch_size = config('VECTOR_GC_BATCH_SIZE', default=5000, cast=int)
+    pending = VectorDeletion.objects.all()
+    if chunk_ids is not None:
+        pending = pending.filter(chunk_id__in=chunk_ids)
+
+    purged = 0
+    last_id = 0
+    while True:
+        entries = list(pending.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not entries:
+            break
+        last_id = entries[-1].id
+
+        by_namespace = {}
+        for entry in entries:
+            for namespace in entry.namespaces:
+                by_namespace.setdefault(namespace, []).append(entry.chunk_id)
+        try:
+            for namespace, ids in by_namespace.items():
+                vector_store.delete_documents(ids, namespaces=[namespace])
+        except Exception as e:
+            VectorDeletion.objects.filter(id__in=[entry.id for entry in entries]).update(
+                attempts=F('attempts') + 1, last_error=f"{type(e).__name__}: {e}"
+            )
+            logger.warning(f"Could not delete {len(entries)} queued vectors, will retry: {e}")
+            break
+
+        VectorDeletion.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        purged += len(entries)
+        if len(entries) < batch_size:
+            break
+
+    if purged:
+        logger.info(f"Deleted the vectors of {purged} chunks")
+    return purged
+
+
+def reconcile(namespaces=None, vector_store=None, dry_run=False):
+    """Find and delete orphan vectors; returns ``{namespace: orphans found}``.
+
+    Pages through the ids in each namespace and checks every page against
+    ``DocumentChunk`` with one query. A vector is an orphan when its chunk no
+    longer exists or, in a ``user_<id>`` namespace, belongs to another user.
+    Chunk rows are written before their vectors, so vectors of documents
+    being ingested are never mistaken for orphans.
+    """
+    from .services import get_vector_store
+    vector_store = vector_store or get_vector_store()
+    if not hasattr(vector_store, 'list_ids'):
+        logger.info(f"{type(vector_store).__name__} rebuilds from the database; nothing to reconcile")
+        return {}
+
+    batch_size = config('VECTOR_GC_BATCH_SIZE', default=5000, cast=int)
+    report = {}
+    for namespace in namespaces or vector_store.list_namespaces():
+        owner = namespace[len('user_'):] if namespace.startswith('user_') else None
+        if namespace != 'global' and not (owner or '').isdigit():
+            logger.warning(f"Skipping namespace {namespace}: not written by document ingestion")
+            continue
+        found = 0
+        orphans = []
+
+        def purge():
+            if orphans and not dry_run:
+                vector_store.delete_documents(orphans, namespaces=[namespace])
+            orphans.clear()
+
+        for page in vector_store.list_ids(namespace):
+            ids = {int(chunk_id) for chunk_id in page if str(chunk_id).isdigit()}
+            alive = DocumentChunk.objects.filter(id__in=ids)
+            if owner is not None:
+                alive = alive.filter(document__user_id=owner)
+            missing = ids - set(alive.values_list('id', flat=True))
+            found += len(missing)
+            orphans.extend(missing)
+            if len(orphans) >= batch_size:
+                purge()
+        purge()
+
+        report[namespace] = found
+        if found:
+            logger.info(f"{'Found' if dry_run else 'Deleted'} {found} orphan vectors in {namespace}")
+    return report
@@ -1,9 +1,15 @@
 # documents/views.py
-from rest_framework import viewsets, permissions
+import logging
+from django.shortcuts import get_object_or_404
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from .models import Document
-from .serializers import DocumentListSerializer
+from .models import Document, UploadSession
+from .serializers import DocumentListSerializer, UploadSessionCreateSerializer, UploadSessionSerializer
+from .uploads import UploadError, abort_session, append_chunk, create_session
+from . import services
 
+logger = logging.getLogger(__name__)
 
 class DocumentViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = DocumentListSerializer
@@ -11,4 +17,83 @@ class DocumentViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         # Return only documents owned by the requesting user
-        return Document.objects.filter(user=self.request.user)
\ No newline at end of file
+        return Document.objects.filter(user=self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def health_check(request):
+    """Warm up shared service clients and report their status"""
+    try:
+        services.warm_up()
+    except Exception:
+        # Backend errors can carry hosts or keys; anonymous callers only get a status
+        logger.exception("Health check: shared services failed to initialize")
+        return Response({'initialized': [], 'ok': False}, status=503)
+
+    # Pinging the remote APIs costs real requests, so only staff can ask for it
+    deep = request.query_params.get('deep') == '1' and request.user.is_staff
+    report = services.health_check(deep=deep)
+
+    healthy = all(check['ok'] for check in report['checks'].values())
+    return Response(report, status=200 if healthy else 503)
+
+
+def _upload_response(session, status_code=status.HTTP_200_OK, error=None):
+    data = UploadSessionSerializer(session).data
+    if error is not None:
+        data['error'] = error
+    return Response(data, status=status_code, headers={'Upload-Offset': str(session.offset)})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def create_upload(request):
+    """Start a resumable upload: ``filename``, ``size`` in bytes and optionally ``title`` and ``checksum`` (sha256)"""
+    serializer = UploadSessionCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        session = create_session(request.user, **serializer.validated_data)
+    except UploadError as e:
+        return Response({'error': str(e)}, status=e.status)
+    return _upload_response(session, status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def upload_detail(request, upload_id):
+    """Resumable upload: GET reports the offset to resume from, PUT appends a chunk, DELETE cancels.
+
+    A chunk is the raw request body, sent with an ``Upload-Offset`` header
+    equal to the current offset. Chunks are written as they arrive, so an
+    interrupted chunk keeps the bytes that made it; ask for the offset and
+    continue from there. The upload becomes a document queued for processing
+    as soon as its last byte arrives.
+    """
+    session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+
+    if request.method == 'GET':
+        return _upload_response(session)
+
+    if request.method == 'DELETE':
+        if session.status == 'uploading':
+            try:
+                abort_session(session)
+            except UploadError as e:
+                return _upload_response(session, e.status, str(e))
+        return _upload_response(session)
+
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        length = int(request.headers.get('Content-Length') or 0)
+    except (KeyError, ValueError):
+        return _upload_response(session, status.HTTP_400_BAD_REQUEST, "Upload-Offset and Content-Length headers are required")
+
+    # Read the raw body as a stream; request.data would buffer the whole chunk
+    try:
+        session = append_chunk(session, offset, request.stream, length)
+    except UploadError as e:
+        return _upload_response(session, e.status, str(e))
+    return _upload_response(session, status.HTTP_201_CREATED if session.status == 'completed' else status.HTTP_200_OK)